@@ -0,0 +1,263 @@
+# bench_geninv.py
+#
+# Benchmarks for the generation and history hot paths, on synthetic data.
+# Results are written as JSON so runs can be compared across commits:
+#
+#   python bench_geninv.py --output bench.json
+#   python bench_geninv.py --compare bench.json
+#
+# The GUI startup benchmark also fails the run (exit 1) when launching the
+# app and painting its first frame takes longer than home_page.STARTUP_BUDGET.
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from unittest.mock import patch, PropertyMock
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE = os.path.join(APP_DIR, 'Invoice Master.pdf')
+
+# A benchmark regresses when its median is this much slower than the baseline's
+REGRESSION_THRESHOLD = 1.25
+
+def make_properties(n_properties, n_tenants, n_invoices, n_line_items):
+    """Synthetic properties_data.json contents: one record per tenant of each property"""
+    records = []
+    invoice_no = 1
+    for p in range(n_properties):
+        for t in range(n_tenants):
+            line_items = [[f"Metered charge {i}", f"${(i % 97) + 10:,.2f}"] for i in range(n_line_items)]
+            records.append({
+                "date": f"{(p % 12) + 1:02d}-01-2024",
+                "invoice_no": {"ranges": [[invoice_no, invoice_no + n_invoices - 1]],
+                               "high_water": invoice_no + n_invoices - 1},
+                "property_address1": f"{1000 + p} Synthetic Ave",
+                "property_address2": "Lynwood, CA 90262",
+                "from_company": "GenInv Property Management",
+                "from_email": "billing@example.com",
+                "from_phone": "(555) 555-0100",
+                "to_renter": f"Tenant {p}-{t}",
+                "to_address": f"{1000 + p} Synthetic Ave, Unit {t}",
+                "to_city_state": "Lynwood, CA",
+                "to_zip": "90262",
+                "to_phone": "(555) 555-0199",
+                "to_email": f"tenant{p}-{t}@example.com",
+                "line_items": line_items,
+                "subtotal": "$1,312.50",
+                "tax": "$0.00",
+                "total": "$1,368.00"
+            })
+            invoice_no += n_invoices
+    return {"properties": records}
+
+def timed(fn, repeat):
+    """Run fn `repeat` times and summarize the wall-clock timings in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'runs': repeat,
+        'min': timings[0],
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'p95': timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))],
+    }
+
+def bench_fill_invoice(workdir, data, repeat):
+    from invoice_generator import fill_invoice
+
+    invoice_data = dict(data['properties'][0], invoice_no="1")
+    output_pdf = os.path.join(workdir, "single.pdf")
+    return timed(lambda: fill_invoice(TEMPLATE, output_pdf, invoice_data), repeat)
+
+def bench_batch(workdir, data, repeat, workers):
+    from invoice_batch import generate_batch
+    from invoice_store import JsonStore
+
+    data_file = os.path.join(workdir, 'batch_data.json')
+    output_dir = os.path.join(workdir, 'batch')
+    os.makedirs(output_dir, exist_ok=True)
+
+    def run():
+        with open(data_file, 'w') as f:
+            json.dump(data, f)
+        generate_batch(TEMPLATE, datetime(2024, 10, 1), output_dir, store=JsonStore(data_file), max_workers=workers)
+
+    result = timed(run, repeat)
+    result['invoices'] = len(data['properties'])
+    return result
+
+def bench_allocation(data, repeat):
+    from invoice_handler import update_invoice_numbers
+
+    def run():
+        for prop in data['properties']:
+            update_invoice_numbers({'invoice_no': dict(prop['invoice_no'])})
+
+    return timed(run, repeat)
+
+def bench_history_load(workdir, data, repeat):
+    from invoice_store import JsonStore
+
+    data_file = os.path.join(workdir, 'history_data.json')
+    with open(data_file, 'w') as f:
+        json.dump(data, f, indent=4)
+    store = JsonStore(data_file)
+    return timed(store.history, repeat)
+
+def bench_submit(workdir, data, repeat):
+    """End-to-end PropertyApp.submit, with the tenant list and calendar mocked"""
+    from test_home_page import PropertyApp, MockCalendar
+    from tenant_index import TenantIndex
+
+    # The calendar is built lazily; stand in for the property so submit reads a fixed date
+    calendar = MockCalendar()
+    calendar.selection_set("10/01/24")
+
+    tenant = data['properties'][0]['to_renter']
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        with open('properties_data.json', 'w') as f:
+            json.dump(data, f, indent=4)
+        with patch.object(TenantIndex, 'tenants', return_value=[tenant]), \
+             patch.object(PropertyApp, 'cal', new_callable=PropertyMock, return_value=calendar):
+            app = PropertyApp()
+            app.withdraw()
+            try:
+                app.property_combo.set("3175 Seminole Ave, SouthGate Property")
+                app.on_property_select()
+                app.tenant_combo.set(tenant)
+
+                def run():
+                    app.submit()
+                    app.finish_jobs()
+
+                return timed(run, repeat)
+            finally:
+                app.finish_jobs()
+                app.destroy()
+    finally:
+        os.chdir(cwd)
+
+# Launch the app, paint the first frame and quit
+STARTUP_SCRIPT = "import home_page; app = home_page.PropertyApp(); app.update(); app.destroy()"
+
+def app_startup_time():
+    """Seconds from launching a fresh interpreter to the app's first painted frame"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], cwd=APP_DIR, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+def bench_startup(repeat):
+    timings = []
+    result = timed(lambda: timings.append(app_startup_time()), repeat)
+    # timed() measures the wrapper; report the subprocess timings themselves
+    timings.sort()
+    result.update(min=timings[0], median=statistics.median(timings), mean=statistics.fmean(timings))
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=APP_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(args):
+    data = make_properties(args.properties, args.tenants, args.invoices, args.line_items)
+    workdir = tempfile.mkdtemp(prefix='geninv-bench-')
+    results = {}
+    benchmarks = [
+        ('fill_invoice_single', lambda: bench_fill_invoice(workdir, data, args.repeat)),
+        ('fill_invoice_batch', lambda: bench_batch(workdir, data, max(1, args.repeat // 5), args.workers)),
+        ('invoice_number_allocation', lambda: bench_allocation(data, args.repeat)),
+        ('history_load_and_sort', lambda: bench_history_load(workdir, data, args.repeat)),
+        ('submit_end_to_end', lambda: bench_submit(workdir, data, args.repeat)),
+        ('app_startup', lambda: bench_startup(max(1, args.repeat // 2))),
+    ]
+    try:
+        for name, bench in benchmarks:
+            if args.only and name not in args.only:
+                continue
+            try:
+                results[name] = bench()
+            except Exception as e:
+                # e.g. no display for the GUI benchmark
+                results[name] = {'skipped': f"{type(e).__name__}: {e}"}
+            print(f"{name}: {results[name]}", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {k: getattr(args, k) for k in ('properties', 'tenants', 'invoices', 'line_items', 'repeat', 'workers')},
+        'results': results,
+    }
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    """Names of the benchmarks whose median regressed beyond threshold against baseline"""
+    regressions = []
+    for name, result in report['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base or 'median' not in base or 'median' not in result:
+            continue
+        if result['median'] > base['median'] * threshold:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark invoice generation and history hot paths.")
+    parser.add_argument('--properties', type=int, default=20)
+    parser.add_argument('--tenants', type=int, default=2, help="tenants per property")
+    parser.add_argument('--invoices', type=int, default=200, help="past invoices per tenant")
+    parser.add_argument('--line-items', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None, help="process pool size for the batch benchmark")
+    parser.add_argument('--only', action='append', help="run only this benchmark (repeatable)")
+    parser.add_argument('--output', help="write the JSON report here (default: stdout)")
+    parser.add_argument('--compare', help="baseline JSON report; exit 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument('--startup-budget', type=float, default=None,
+                        help="fail when app_startup's median exceeds this many seconds (default: home_page.STARTUP_BUDGET)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args)
+    if args.compare:
+        with open(args.compare) as f:
+            report['regressions'] = compare(report, json.load(f), args.threshold)
+
+    startup = report['results'].get('app_startup', {})
+    if 'median' in startup:
+        if args.startup_budget is None:
+            from home_page import STARTUP_BUDGET
+            args.startup_budget = STARTUP_BUDGET
+        if startup['median'] > args.startup_budget:
+            report.setdefault('regressions', []).append('app_startup')
+            print(f"app_startup: {startup['median']:.3f}s is over the {args.startup_budget:.3f}s budget",
+                  file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+    return 1 if report.get('regressions') else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
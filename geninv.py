@@ -0,0 +1,388 @@
+# geninv.py
+#
+# Headless command-line entry point. Never imports the GUI; the PDF stack
+# (PyPDF2/reportlab) is only imported by the subcommands that render.
+
+import argparse
+import os
+import sys
+import sqlite3
+from datetime import datetime
+from invoice_data import DATA_FILE, DATE_FORMAT, invoice_file_name, tenant_key
+from invoice_store import DB_FILE, SqliteStore, open_store
+from invoice_ledger import LEDGER_FILE, RECORD_FIELDS, open_ledger, ledger_record
+from invoice_reports import REPORTS_FILE, open_reports
+from invoice_data import format_cents
+from invoice_charges import RATES_FILE, load_rates
+
+# Startup budget for commands that don't render (seconds, interpreter start included)
+STARTUP_BUDGET = 0.5
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_TEMPLATE = os.path.join(APP_DIR, 'Invoice Master.pdf')
+
+def parse_date(value):
+    """argparse type for billing dates given as MM-DD-YYYY"""
+    try:
+        return datetime.strptime(value, DATE_FORMAT)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{value}', expected MM-DD-YYYY")
+
+def parse_optimizations(value):
+    """argparse type for --optimize: a comma-separated list of optimizations, or 'all'"""
+    from invoice_optimize import OPTIMIZATIONS
+
+    if value == 'all':
+        return OPTIMIZATIONS
+    names = tuple(name.strip() for name in value.split(',') if name.strip())
+    unknown = [name for name in names if name not in OPTIMIZATIONS]
+    if unknown or not names:
+        raise argparse.ArgumentTypeError(
+            f"invalid optimization '{value}', expected 'all' or some of: {', '.join(OPTIMIZATIONS)}")
+    return names
+
+def parse_megabytes(value):
+    """argparse type for sizes given in MiB"""
+    try:
+        megabytes = float(value)
+    except ValueError:
+        megabytes = 0
+    if megabytes <= 0:
+        raise argparse.ArgumentTypeError(f"invalid size '{value}', expected a positive number of MiB")
+    return int(megabytes * 2**20)
+
+def report_sizes(before, after):
+    saved = before - after
+    percent = 100 * saved / before if before else 0
+    print(f"Output size: {before:,} bytes before optimization, {after:,} after ({saved:,} saved, {percent:.1f}%).")
+
+def output_cache(args):
+    """The rendered-PDF cache the command line asks for, or None"""
+    if not args.output_cache:
+        return None
+    from invoice_output_cache import OutputCache, OUTPUT_CACHE_SIZE
+    return OutputCache(args.output_cache, args.output_cache_size or OUTPUT_CACHE_SIZE)
+
+def cmd_generate(args):
+    store = open_store(args.data_file, args.db, args.rates)
+    ledger = open_ledger(store, args.ledger)
+    reports = open_reports(ledger, args.reports)
+    invoice_data = store.allocate_one(args.tenant, args.date)
+    if not invoice_data:
+        print(f"No matching tenant data found for '{args.tenant}'.", file=sys.stderr)
+        return 1
+
+    # Only now pull in the PDF stack
+    from invoice_generator import invoice_template, template_cache
+    from invoice_batch import render_invoice
+
+    output_pdf = os.path.join(args.output_dir, invoice_file_name(invoice_data))
+    ok, before, after = render_invoice(args.template, output_pdf, invoice_data, args.optimize, args.engine,
+                                       output_cache(args))
+    if not ok:
+        print(f"Failed to generate invoice {invoice_data['invoice_no']}.", file=sys.stderr)
+        return 1
+    ledger.append(ledger_record(invoice_data, output_pdf, template_cache.template_hash(invoice_template(args.template, invoice_data))))
+    reports.save()
+    if args.optimize:
+        report_sizes(before, after)
+    print(output_pdf)
+    return 0
+
+def cmd_batch(args):
+    from invoice_batch import generate_batch, generate_statement, generate_stream, STREAM_MAX_MEMORY
+
+    def report_progress(done, total, invoice_no, ok):
+        print(f"[{done}/{total or '?'}] Invoice {invoice_no} {'generated' if ok else 'failed'}")
+
+    store = open_store(args.data_file, args.db, args.rates)
+    ledger = open_ledger(store, args.ledger)
+    # Follows the ledger, so the report totals take in each invoice as it is generated
+    reports = open_reports(ledger, args.reports)
+    if args.stream:
+        jobs = store.allocate(args.date, args.property, args.tenant)
+        results = generate_stream(args.template, iter(jobs), args.output_dir,
+                                  max_memory=args.max_memory or STREAM_MAX_MEMORY, ledger=ledger, progress=report_progress,
+                                  optimize=args.optimize, engine=args.engine, output_cache=output_cache(args))
+        reports.save()
+        print(f"Generated {results['generated']} invoices, {results['failed']} failed "
+              f"(peak memory {results['peak_memory'] / 2**20:.1f} MiB).")
+        if args.optimize:
+            report_sizes(results['bytes_before'], results['bytes_after'])
+        if results['stopped']:
+            print(f"Stopped early: {results['stopped']}", file=sys.stderr)
+        return 1 if results['failed'] or results['stopped'] else 0
+    if args.combined:
+        results = generate_statement(args.template, args.date, os.path.join(args.output_dir, args.combined),
+                                     properties=args.property, tenants=args.tenant, store=store,
+                                     ledger=ledger, optimize=args.optimize,
+                                     engine=args.engine)
+    else:
+        results = generate_batch(args.template, args.date, args.output_dir, properties=args.property,
+                                 tenants=args.tenant, store=store, ledger=ledger,
+                                 max_workers=args.workers, progress=report_progress, optimize=args.optimize,
+                                 engine=args.engine, output_cache=output_cache(args))
+    reports.save()
+    for tenant, invoice_no, error in results['failed']:
+        print(f"Invoice {invoice_no} for {tenant} failed: {error}", file=sys.stderr)
+    print(f"Generated {len(results['generated'])} invoices, {len(results['failed'])} failed.")
+    if args.optimize:
+        report_sizes(results['bytes_before'], results['bytes_after'])
+    return 1 if results['failed'] else 0
+
+def cmd_reprint(args):
+    store = open_store(args.data_file, args.db, args.rates)
+    tenant = tenant_key(args.tenant)
+    record = next((r for r in open_ledger(store, args.ledger).records()
+                   if r['tenant'] == tenant and r['invoice_no'] == args.invoice_no), None)
+    current = store.next_invoices().get(tenant)
+    if record is None or current is None:
+        print(f"No invoice {args.invoice_no} on record for '{args.tenant}'.", file=sys.stderr)
+        return 1
+
+    # The tenant's details as they stand, with the date, number and amounts the invoice was issued with
+    invoice_data = dict(current, date=record['date'], invoice_no=str(record['invoice_no']))
+    invoice_data.update({field: record[field] for field in RECORD_FIELDS if field in record})
+
+    from invoice_batch import render_invoice
+
+    output_pdf = os.path.join(args.output_dir, invoice_file_name(invoice_data))
+    ok, _, _ = render_invoice(args.template, output_pdf, invoice_data, args.optimize, args.engine, output_cache(args))
+    if not ok:
+        print(f"Failed to reprint invoice {args.invoice_no}.", file=sys.stderr)
+        return 1
+    print(output_pdf)
+    return 0
+
+def cmd_cache(args):
+    cache = output_cache(args)
+    if cache is None:
+        print("No output cache; give --output-cache or set GENINV_OUTPUT_CACHE.", file=sys.stderr)
+        return 1
+    if args.purge:
+        print(f"Removed {cache.purge()} cached invoices from {cache.path}.")
+        return 0
+    stats = cache.stats()
+    entries, size = cache.size()
+    lookups = stats['hits'] + stats['misses']
+    rate = 100 * stats['hits'] / lookups if lookups else 0
+    print(f"{entries} cached invoices, {size:,} of {cache.max_bytes:,} bytes; "
+          f"{stats['hits']} hits, {stats['misses']} misses ({rate:.1f}% hit rate).")
+    return 0
+
+def cmd_history(args):
+    invoices = open_ledger(open_store(args.data_file, args.db, args.rates), args.ledger).history()
+    if args.tenant:
+        invoices = [i for i in invoices if i['tenant'].strip() == args.tenant.split(',')[0].strip()]
+    if args.limit:
+        invoices = invoices[:args.limit]
+
+    for invoice in invoices:
+        print("\t".join([invoice['date'], str(invoice['invoice_no']), invoice['property'],
+                         invoice['tenant'], invoice['amount']]))
+    return 0
+
+def cmd_next_number(args):
+    next_number = open_store(args.data_file, args.db, args.rates).next_invoice_number(args.tenant)
+    if next_number is None:
+        print(f"No matching tenant data found for '{args.tenant}'.", file=sys.stderr)
+        return 1
+    print(next_number)
+    return 0
+
+def cmd_report(args):
+    ledger = open_ledger(open_store(args.data_file, args.db, args.rates), args.ledger)
+    reports = open_reports(ledger, args.reports)
+    if args.by == 'property-month':
+        rows = [(prop, month, count, format_cents(cents))
+                for prop, month, count, cents in reports.property_months(args.property)]
+    elif args.by == 'tenant-year':
+        rows = [(tenant, year, count, format_cents(cents))
+                for tenant, year, count, cents in reports.tenant_years(args.tenant)]
+    else:
+        rows = [(tenant, count, format_cents(cents)) for tenant, count, cents in reports.outstanding_by_tenant()
+                if not args.tenant or tenant == args.tenant]
+
+    for row in rows:
+        print("\t".join(str(value) for value in row))
+    return 0
+
+def cmd_export_csv(args):
+    ledger = open_ledger(open_store(args.data_file, args.db, args.rates), args.ledger)
+    reports = open_reports(ledger, args.reports)
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            rows = reports.export_csv(ledger, f)
+        print(f"Exported {rows} invoices to {args.output}.")
+    else:
+        reports.export_csv(ledger, sys.stdout)
+    return 0
+
+def cmd_mark_paid(args):
+    ledger = open_ledger(open_store(args.data_file, args.db, args.rates), args.ledger)
+    reports = open_reports(ledger, args.reports)
+    tenant = args.tenant.split(',')[0].strip()
+    if not reports.mark_paid(tenant, args.invoice_no):
+        print(f"No outstanding invoice {args.invoice_no} for '{tenant}'.", file=sys.stderr)
+        return 1
+    reports.save()
+    print(f"Invoice {args.invoice_no} marked paid; {reports.outstanding_count(tenant)} outstanding for {tenant}.")
+    return 0
+
+def cmd_scan_pdfs(args):
+    from invoice_crawler import open_pdf_index
+
+    index = open_pdf_index(args.root, args.index)
+    stats = index.scan(max_workers=args.workers)
+    print(f"{stats['files']} PDFs: {stats['extracted']} read, {stats['unchanged']} unchanged, "
+          f"{stats['failed']} failed, {stats['removed']} removed.")
+
+    for entry in index.search(tenant=args.tenant) if args.tenant else []:
+        print("\t".join(str(entry.get(field) or '') for field in ('date', 'invoice_no', 'total', 'path')))
+
+    if args.reconcile:
+        for tenant, problems in sorted(index.reconcile(open_store(args.data_file, args.db, args.rates).issued_numbers()).items()):
+            missing = ", ".join(f"{s}-{e}" if s != e else str(s) for s, e in problems['missing'])
+            if missing:
+                print(f"{tenant}: no PDF on file for {missing}")
+            if problems['unexpected']:
+                print(f"{tenant}: PDFs for numbers never issued: {', '.join(map(str, problems['unexpected']))}")
+    return 0
+
+def cmd_charges(args):
+    table = load_rates(args.rates)
+    if table is None:
+        print(f"No rate table at {args.rates}.", file=sys.stderr)
+        return 1
+    charges = table.month(args.date)
+    vacant = table.vacant(args.date)
+    total = 0
+    for tenant in sorted(charges):
+        if args.tenant and tenant != args.tenant.split(',')[0].strip():
+            continue
+        if tenant in vacant:
+            print(f"{tenant}: not billed (no days in residence)")
+            continue
+        tenant_charges = charges[tenant]
+        print(f"{tenant}: {tenant_charges['total']}")
+        for desc, amount in tenant_charges['line_items']:
+            print(f"    {desc:<30} {str(amount):>12}")
+        total += tenant_charges['total']
+    print(f"Total: {format_cents(total)}")
+    return 0
+
+def cmd_import_json(args):
+    if os.path.exists(args.db):
+        print(f"{args.db} already exists; the import only runs once.", file=sys.stderr)
+        return 1
+    count = SqliteStore(args.db).import_json(args.data_file)
+    print(f"Imported {count} records from {args.data_file} into {args.db}.")
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='geninv', description="Generate invoices without the GUI.")
+    parser.add_argument('--data-file', default=DATA_FILE, help="properties data file (default: %(default)s)")
+    parser.add_argument('--db', default=DB_FILE,
+                        help="SQLite store, used instead of the data file once it exists (default: %(default)s)")
+    parser.add_argument('--ledger', default=LEDGER_FILE, help="append-only invoice ledger (default: %(default)s)")
+    parser.add_argument('--reports', default=REPORTS_FILE, help="report aggregates snapshot (default: %(default)s)")
+    parser.add_argument('--rates', default=RATES_FILE,
+                        help="rate table for computed line items and totals (default: %(default)s)")
+    parser.add_argument('--output-cache', default=os.environ.get('GENINV_OUTPUT_CACHE'), metavar='DIR',
+                        help="reuse PDFs already rendered from the same template, layout and data, kept in DIR "
+                             "(default: $GENINV_OUTPUT_CACHE, or off)")
+    parser.add_argument('--output-cache-size', type=parse_megabytes, metavar='MB',
+                        help="size cap of the output cache in MiB; least recently used PDFs go first (default: 256)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    render_args = argparse.ArgumentParser(add_help=False)
+    render_args.add_argument('--date', type=parse_date, default=datetime.today(),
+                             help="billing date as MM-DD-YYYY (default: today)")
+    render_args.add_argument('--template', default=DEFAULT_TEMPLATE, help="invoice template PDF")
+    render_args.add_argument('--output-dir', default=APP_DIR, help="where to write the PDFs")
+    render_args.add_argument('--optimize', nargs='?', const='all', type=parse_optimizations, metavar='LIST',
+                             help="optimize the written PDFs: 'all' (the default when given without a value) "
+                                  "or a comma-separated list of compress, dedupe, drop_unused, drop_fields")
+    render_args.add_argument('--engine', choices=['direct', 'reportlab'],
+                             help="how invoice text is drawn: written straight into the page (direct) or "
+                                  "rendered and merged with reportlab (default: direct, or $GENINV_ENGINE)")
+
+    generate = subparsers.add_parser('generate', parents=[render_args], help="generate one invoice for a tenant")
+    generate.add_argument('tenant')
+    generate.set_defaults(func=cmd_generate)
+
+    batch = subparsers.add_parser('batch', parents=[render_args], help="generate invoices for many properties")
+    batch.add_argument('--property', action='append', help="limit to a property (repeatable)")
+    batch.add_argument('--tenant', action='append', help="limit to a tenant (repeatable)")
+    batch.add_argument('--workers', type=int, default=None, help="process pool size")
+    batch.add_argument('--combined', metavar='FILE',
+                       help="write every invoice into this one statement PDF (in --output-dir) instead of one file each")
+    batch.add_argument('--stream', action='store_true',
+                       help="render one invoice at a time in this process, in bounded memory, for very large runs")
+    batch.add_argument('--max-memory', type=parse_megabytes, metavar='MB',
+                       help="memory limit for --stream runs in MiB (default: 512)")
+    batch.set_defaults(func=cmd_batch)
+
+    reprint = subparsers.add_parser('reprint', parents=[render_args],
+                                    help="render an issued invoice again from the ledger, without a new number")
+    reprint.add_argument('--tenant', required=True)
+    reprint.add_argument('invoice_no', type=int)
+    reprint.set_defaults(func=cmd_reprint)
+
+    cache = subparsers.add_parser('cache', help="show the output cache's size and hit rate")
+    cache.add_argument('--purge', action='store_true', help="remove every cached PDF and reset the counters")
+    cache.set_defaults(func=cmd_cache)
+
+    history = subparsers.add_parser('history', help="list generated invoices, newest first")
+    history.add_argument('--tenant')
+    history.add_argument('--limit', type=int)
+    history.set_defaults(func=cmd_history)
+
+    next_number = subparsers.add_parser('next-number', help="show the next invoice number without allocating it")
+    next_number.add_argument('--tenant', required=True)
+    next_number.set_defaults(func=cmd_next_number)
+
+    report = subparsers.add_parser('report', help="revenue totals from the incremental report aggregates")
+    report.add_argument('--by', choices=('property-month', 'tenant-year', 'outstanding'), default='property-month')
+    report.add_argument('--property', help="only this property (property-month)")
+    report.add_argument('--tenant', help="only this tenant (tenant-year, outstanding)")
+    report.set_defaults(func=cmd_report)
+
+    export_csv = subparsers.add_parser('export-csv', help="stream every invoice in the ledger as CSV")
+    export_csv.add_argument('--output', help="CSV file to write (default: stdout)")
+    export_csv.set_defaults(func=cmd_export_csv)
+
+    mark_paid = subparsers.add_parser('mark-paid', help="record that an invoice has been paid")
+    mark_paid.add_argument('--tenant', required=True)
+    mark_paid.add_argument('invoice_no', type=int)
+    mark_paid.set_defaults(func=cmd_mark_paid)
+
+    scan_pdfs = subparsers.add_parser('scan-pdfs', help="index the invoice PDFs filed under <root>/<property>/tenants/<tenant>")
+    scan_pdfs.add_argument('--root', required=True, help="invoice directory holding the property folders")
+    scan_pdfs.add_argument('--index', default='invoice_pdf_index.json', help="index file (default: %(default)s)")
+    scan_pdfs.add_argument('--workers', type=int, default=None, help="process pool size for text extraction")
+    scan_pdfs.add_argument('--tenant', help="list this tenant's indexed invoices")
+    scan_pdfs.add_argument('--reconcile', action='store_true', help="compare the PDFs with the issued invoice numbers")
+    scan_pdfs.set_defaults(func=cmd_scan_pdfs)
+
+    charges = subparsers.add_parser('charges', help="show a month's computed charges from the rate table")
+    charges.add_argument('--date', type=parse_date, default=datetime.today(),
+                         help="any date in the billing month, as MM-DD-YYYY (default: today)")
+    charges.add_argument('--tenant', help="only this tenant")
+    charges.set_defaults(func=cmd_charges)
+
+    import_json = subparsers.add_parser('import-json', help="one-shot import of the data file into the SQLite store")
+    import_json.set_defaults(func=cmd_import_json)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+# history_index.py
+#
+# In-memory indexes over the invoice history for the filter bar: an inverted
+# index from tenant/property/invoice-number tokens to rows, plus rows sorted by
+# billing date and by amount. A filter starts from whichever index narrows it
+# down most and only checks the other conditions on those rows. New invoices
+# are added to the indexes in place rather than rebuilding them.
+
+import bisect
+import re
+from itertools import compress
+from invoice_data import parse_billing_date, parse_cents
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# A smaller candidate set is only sorted instead of walking the date order
+# when it is at least this many times smaller
+SORT_FACTOR = 2
+
+def tokens(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+class HistoryFilter:
+    """What the filter bar asks for; every part is optional"""
+
+    def __init__(self, text='', start=None, end=None, min_cents=None, max_cents=None):
+        self.terms = tokens(text)
+        self.start = start.toordinal() if start else None
+        self.end = end.toordinal() if end else None
+        self.min_cents = min_cents
+        self.max_cents = max_cents
+
+    @classmethod
+    def parse(cls, text='', start='', end='', min_amount='', max_amount=''):
+        """Build a filter from the filter bar's entries; raises ValueError on a malformed date or amount"""
+        return cls(text,
+                   parse_billing_date(start.strip()) if start.strip() else None,
+                   parse_billing_date(end.strip()) if end.strip() else None,
+                   parse_cents(min_amount) if min_amount.strip() else None,
+                   parse_cents(max_amount) if max_amount.strip() else None)
+
+    @property
+    def amount_filtered(self):
+        return self.min_cents is not None or self.max_cents is not None
+
+    def __bool__(self):
+        return bool(self.terms) or self.start is not None or self.end is not None or self.amount_filtered
+
+class HistoryIndex:
+    """History rows with the indexes the filter bar searches.
+
+    Rows are numbered in the order they were added. Text terms match the start
+    of any tenant, property or invoice-number token, and every term has to
+    match. Rows whose amount can't be parsed never match an amount filter.
+    """
+
+    def __init__(self, rows=()):
+        self.rows = []
+        self._ordinals = []
+        self._keys = []           # (ordinal, invoice_no) sort key of each row
+        self._cents = []
+        self._dates = {}          # billing date string -> ordinal
+        self._postings = {}       # token -> set of row ids
+        self._tokens = []         # every distinct token, sorted, for prefix lookups
+        for row in rows:
+            self._index(row)
+        self._tokens.sort()
+
+        # Date index, oldest first: sort keys, with the row ids and rows in the same order
+        order = sorted(range(len(self.rows)), key=self._keys.__getitem__)
+        self._date_keys = [self._keys[row_id] for row_id in order]
+        self._date_ids = order
+        self._date_rows = [self.rows[row_id] for row_id in order]
+
+        # Amount index: cents ascending, with the row ids in the same order
+        self._amount_ids = sorted((row_id for row_id, cents in enumerate(self._cents) if cents is not None),
+                                  key=self._cents.__getitem__)
+        self._amount_keys = [self._cents[row_id] for row_id in self._amount_ids]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _index(self, row):
+        """Record a row and its tokens; the sorted indexes are kept by the caller"""
+        row_id = len(self.rows)
+        ordinal = self._dates.get(row['date'])
+        if ordinal is None:
+            ordinal = self._dates[row['date']] = parse_billing_date(row['date']).toordinal()
+        try:
+            cents = parse_cents(row['amount'])
+        except ValueError:
+            cents = None
+
+        self.rows.append(row)
+        self._ordinals.append(ordinal)
+        self._keys.append((ordinal, int(row['invoice_no'])))
+        self._cents.append(cents)
+        for token in set(tokens(row['tenant']) + tokens(row['property']) + tokens(row['invoice_no'])):
+            if token not in self._postings:
+                self._postings[token] = set()
+                self._tokens.append(token)
+            self._postings[token].add(row_id)
+        return row_id
+
+    def add(self, row):
+        """Index one new history row in place; returns its row id"""
+        token_count = len(self._tokens)
+        row_id = self._index(row)
+        if len(self._tokens) != token_count:
+            self._tokens.sort()
+
+        key = self._keys[row_id]
+        position = bisect.bisect_right(self._date_keys, key)
+        self._date_keys.insert(position, key)
+        self._date_ids.insert(position, row_id)
+        self._date_rows.insert(position, row)
+
+        cents = self._cents[row_id]
+        if cents is not None:
+            position = bisect.bisect_right(self._amount_keys, cents)
+            self._amount_keys.insert(position, cents)
+            self._amount_ids.insert(position, row_id)
+        return row_id
+
+    def _term_ids(self, term):
+        """Ids of the rows with a token starting with `term`"""
+        ids = set()
+        for position in range(bisect.bisect_left(self._tokens, term), len(self._tokens)):
+            token = self._tokens[position]
+            if not token.startswith(term):
+                break
+            ids |= self._postings[token]
+        return ids
+
+    def _text_ids(self, terms):
+        ids = None
+        for term in sorted(set(terms), key=len, reverse=True):
+            term_ids = self._term_ids(term)
+            ids = term_ids if ids is None else ids & term_ids
+            if not ids:
+                break
+        return ids
+
+    def _tests(self, query, text_ids, skip):
+        """Per-row tests for the conditions the candidates still have to be checked against"""
+        tests = []
+        if skip != 'date' and (query.start is not None or query.end is not None):
+            ordinals = self._ordinals
+            first = float('-inf') if query.start is None else query.start
+            last = float('inf') if query.end is None else query.end
+            tests.append(lambda row_id: first <= ordinals[row_id] <= last)
+        if skip != 'amount' and query.amount_filtered:
+            cents = self._cents
+            low = float('-inf') if query.min_cents is None else query.min_cents
+            high = float('inf') if query.max_cents is None else query.max_cents
+            tests.append(lambda row_id: cents[row_id] is not None and low <= cents[row_id] <= high)
+        if skip != 'text' and text_ids is not None:
+            tests.append(text_ids.__contains__)
+        return tests
+
+    def matches(self, row_id, query):
+        """Whether one indexed row passes the filter (used for rows added after a search)"""
+        text_ids = self._text_ids(query.terms) if query.terms else None
+        return all(test(row_id) for test in self._tests(query, text_ids, skip=None))
+
+    def search(self, query=None):
+        """Rows passing the filter, newest first (billing date, then invoice number)"""
+        query = query or HistoryFilter()
+        date_lo = 0 if query.start is None else bisect.bisect_left(self._date_keys, (query.start,))
+        date_hi = (len(self._date_keys) if query.end is None
+                   else bisect.bisect_left(self._date_keys, (query.end + 1,)))
+        date_hi = max(date_lo, date_hi)
+        text_ids = self._text_ids(query.terms) if query.terms else None
+        if text_ids is not None and not text_ids:
+            return []
+
+        # Start from the smallest candidate set
+        sizes = {'date': date_hi - date_lo}
+        if text_ids is not None:
+            sizes['text'] = len(text_ids)
+        if query.amount_filtered:
+            amount_lo = 0 if query.min_cents is None else bisect.bisect_left(self._amount_keys, query.min_cents)
+            amount_hi = (len(self._amount_keys) if query.max_cents is None
+                         else bisect.bisect_right(self._amount_keys, query.max_cents))
+            sizes['amount'] = max(0, amount_hi - amount_lo)
+        driver = min(sizes, key=sizes.get)
+        # Walking the date order avoids a sort, which wins unless the other set is much smaller
+        if sizes[driver] * SORT_FACTOR > sizes['date']:
+            driver = 'date'
+        tests = self._tests(query, text_ids, skip=driver)
+
+        if driver == 'date':
+            ids = self._date_ids[date_lo:date_hi]
+            rows = self._date_rows[date_lo:date_hi]
+            for test in tests:
+                keep = list(map(test, ids))
+                ids = list(compress(ids, keep))
+                rows = list(compress(rows, keep))
+            rows.reverse()
+            return rows
+
+        found = list(text_ids) if driver == 'text' else self._amount_ids[amount_lo:amount_hi]
+        for test in tests:
+            found = list(compress(found, map(test, found)))
+        found.sort(key=self._keys.__getitem__, reverse=True)
+        return [self.rows[row_id] for row_id in found]
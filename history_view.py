@@ -0,0 +1,141 @@
+# history_view.py
+
+import bisect
+import customtkinter as ctk
+from invoice_data import history_key
+
+# Height of one history row in pixels
+ROW_HEIGHT = 30
+
+COLUMNS = ('date', 'invoice_no', 'property', 'tenant', 'amount')
+
+def sort_key(row):
+    """Ascending key that puts the newest invoice first"""
+    date, invoice_no = history_key(row)
+    return (-date.toordinal(), -invoice_no)
+
+def insert_sorted(rows, keys, row):
+    """Insert `row` into newest-first `rows` (with matching `keys`) in place; returns its index"""
+    key = sort_key(row)
+    index = bisect.bisect_left(keys, key)
+    keys.insert(index, key)
+    rows.insert(index, row)
+    return index
+
+def visible_window(first, visible, total):
+    """(first, row indexes) for `visible` slots starting near row `first` of `total`.
+
+    `first` is clamped so the window stays full where there are enough rows;
+    slot i shows the i-th index, and slots past the end of the list are hidden.
+    """
+    first = max(0, min(first, total - visible))
+    return first, range(first, min(total, first + visible))
+
+def scrollbar_span(first, visible, total):
+    """(top, bottom) fractions of the list the window covers, for the scrollbar"""
+    if not total:
+        return 0, 1
+    return first / total, min(1.0, (first + visible) / total)
+
+class HistoryView(ctk.CTkFrame):
+    """Virtualized invoice history list.
+
+    Only enough row widgets to fill the visible area are created; scrolling just
+    re-labels them. Rows are kept newest first, and new invoices are inserted in
+    place without reloading the rest of the history.
+    """
+
+    def __init__(self, master, **kwargs):
+        super().__init__(master, **kwargs)
+        self.rows = []
+        self._keys = []  # ascending keys matching self.rows (negated, so newest sorts first)
+        self._first = 0
+        self._visible = 1
+        self._slots = []
+
+        self.body = ctk.CTkFrame(self, fg_color="transparent")
+        self.body.pack(side="left", fill="both", expand=True)
+        self.body.grid_columnconfigure(0, weight=1)
+
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.body.bind("<Configure>", self._on_resize)
+        self._bind_wheel(self.body)
+
+    def set_rows(self, rows):
+        """Replace all rows; rows must already be sorted newest first"""
+        self.rows = list(rows)
+        self._keys = [sort_key(row) for row in self.rows]
+        self._first = 0
+        self._render()
+
+    def insert_row(self, row):
+        """Insert a single row at its sorted position and redraw only the visible slots"""
+        insert_sorted(self.rows, self._keys, row)
+        self._render()
+
+    def scroll_to(self, first):
+        self._first = visible_window(first, self._visible, len(self.rows))[0]
+        self._render()
+
+    def _make_slot(self):
+        frame = ctk.CTkFrame(self.body, height=ROW_HEIGHT - 2)
+        frame.grid_columnconfigure(tuple(range(len(COLUMNS))), weight=1, uniform="history")
+        labels = []
+        for column in range(len(COLUMNS)):
+            label = ctk.CTkLabel(frame, text="")
+            label.grid(row=0, column=column, padx=5, pady=3)
+            self._bind_wheel(label)
+            labels.append(label)
+        self._bind_wheel(frame)
+        return frame, labels
+
+    def _render(self):
+        # Grow the widget pool to the visible row count; never shrink it, just hide spare slots
+        while len(self._slots) < self._visible:
+            self._slots.append(self._make_slot())
+
+        self._first, shown = visible_window(self._first, self._visible, len(self.rows))
+        for i, (frame, labels) in enumerate(self._slots):
+            if i >= len(shown):
+                frame.grid_remove()
+                continue
+
+            index = shown[i]
+            row = self.rows[index]
+            bg_color = ("gray90", "gray20") if index % 2 == 0 else ("white", "gray30")
+            frame.configure(fg_color=bg_color)
+            for label, column in zip(labels, COLUMNS):
+                label.configure(text=str(row[column]))
+            frame.grid(row=i, column=0, sticky="ew", padx=2, pady=1)
+
+        self.scrollbar.set(*scrollbar_span(self._first, self._visible, len(self.rows)))
+
+    def _on_resize(self, event):
+        visible = max(1, event.height // ROW_HEIGHT)
+        if visible != self._visible:
+            self._visible = visible
+            self._render()
+
+    def _on_scrollbar(self, action, *args):
+        if action == 'moveto':
+            self.scroll_to(int(float(args[0]) * len(self.rows)))
+        elif action == 'scroll':
+            amount, unit = int(args[0]), args[1] if len(args) > 1 else 'units'
+            step = self._visible if unit == 'pages' else 1
+            self.scroll_to(self._first + amount * step)
+
+    def _on_wheel(self, event):
+        if event.num == 4:
+            delta = -1
+        elif event.num == 5:
+            delta = 1
+        else:
+            delta = -1 if event.delta > 0 else 1
+        self.scroll_to(self._first + delta * 3)
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", self._on_wheel)
+        widget.bind("<Button-4>", self._on_wheel)
+        widget.bind("<Button-5>", self._on_wheel)
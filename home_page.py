@@ -1,13 +1,27 @@
 # home_page.py
+#
+# Startup only imports what the first frame needs. The PDF stack (PyPDF2 and
+# reportlab) loads on the first Generate, the calendar (tkcalendar/babel) is
+# built right after the window first paints, and the history is loaded in the
+# background from the ledger's cached snapshot.
+#
+# The preview pane redraws the invoice the current selection would produce
+# from in-memory records and a cached template raster, without the PDF stack.
 
-from tkcalendar import Calendar
 import customtkinter as ctk
 import os
 import json
 import logging
 from datetime import datetime
-from invoice_generator import fill_invoice
-from invoice_handler import update_invoice_numbers
+from invoice_store import open_store
+from invoice_data import invoice_row, invoice_file_name, tenant_key
+from invoice_ledger import InvoiceLedger, ledger_record
+from invoice_worker import JobQueue
+from tenant_index import TenantIndex
+from invoice_timing import span
+from history_view import HistoryView
+from history_index import HistoryIndex, HistoryFilter
+from invoice_preview import InvoicePreview, PREVIEW_DELAY, preview_data, template_raster
 
 # Main directory where property folders are stored
 invoice_directory = r"C:\Users\oscar\OneDrive\Oscar\Properties"
@@ -25,19 +39,64 @@ properties = {
 # Extract the property names (keys) as a list
 property_names = list(properties.keys())
 
+# How often the window checks for finished background jobs (ms)
+POLL_INTERVAL = 100
+
+# Job key used for "Generate All" runs
+BATCH_JOB = "__batch__"
+
+# Job key for loading the invoice history
+HISTORY_JOB = "__history__"
+
+# Job keys for the preview's record snapshot and template rasters
+PREVIEW_JOB = "__preview__"
+RASTER_JOB = "__raster__"
+
+# Delay before the deferred startup work, so the first frame paints first (ms)
+STARTUP_DELAY = 20
+
+# Budget from launch to the first painted window (seconds, interpreter start included)
+STARTUP_BUDGET = 1.5
+
+def fill_invoice(input_pdf, output_pdf, data):
+    """Render one invoice; the PDF stack is imported on first use"""
+    from invoice_generator import fill_invoice as fill
+    return fill(input_pdf, output_pdf, data)
+
 class PropertyApp(ctk.CTk):
     def __init__(self):
         super().__init__()
 
         # Load default tenants from JSON file
         self.default_tenants = self.load_default_tenants()
+
+        # Invoice data: SQLite once imported, properties_data.json otherwise
+        self.store = open_store()
+
+        # Append-only record of generated invoices; history is read from here
+        self.ledger = InvoiceLedger()
+
+        # Background generation; results come back through poll_jobs
+        self.jobs = JobQueue()
+
+        # Filter bar indexes over the history; built when the history loads
+        self.history_index = None
+        self.history_filter = HistoryFilter()
+
+        # Preview: every tenant's next invoice as it stands, loaded in the background
+        self.preview_records = None
+        self._preview_after = None
+
+        # Tenant folders for every property, scanned once in the background and kept fresh
+        self.tenant_index = TenantIndex(invoice_directory, properties.values())
+        self.tenant_index.start()
         
         # Add path for invoice template
         self.template_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Invoice Master.pdf')
 
         # Configure window
         self.title("GenInv") 
-        self.geometry("1000x700")  # Wider and taller to accommodate history
+        self.geometry("1300x700")  # Wide enough for the preview, tall enough for history
         ctk.set_appearance_mode("dark")
         
         # Configure grid weight for window expansion
@@ -57,6 +116,7 @@ class PropertyApp(ctk.CTk):
         # Configure grid weights for top_frame
         top_frame.grid_columnconfigure(0, weight=1)  # Property column
         top_frame.grid_columnconfigure(1, weight=1)  # Calendar column
+        top_frame.grid_columnconfigure(2, weight=0)  # Preview column
 
         # Property selection
         property_label = ctk.CTkLabel(top_frame, text="Select Property", font=("Arial", 16))
@@ -70,7 +130,8 @@ class PropertyApp(ctk.CTk):
         tenant_label = ctk.CTkLabel(top_frame, text="Select Tenant", font=("Arial", 16))
         tenant_label.grid(row=2, column=0, padx=20, pady=(10,5), sticky="w")
         
-        self.tenant_combo = ctk.CTkComboBox(top_frame, values=["Select a property first"])
+        self.tenant_combo = ctk.CTkComboBox(top_frame, values=["Select a property first"],
+                                            command=self.schedule_preview)
         self.tenant_combo.grid(row=3, column=0, padx=20, pady=(0,10), sticky="ew")
 
         # Button to set the selected tenant as default
@@ -89,18 +150,21 @@ class PropertyApp(ctk.CTk):
         date_label = ctk.CTkLabel(top_frame, text="Select Billing Date", font=("Arial", 16))
         date_label.grid(row=0, column=1, padx=20, pady=(20,5), sticky="w")
         
-        self.cal = Calendar(top_frame, selectmode="day", year=2024, month=9, day=13,
-                          background="gray25", foreground='white', 
-                          selectbackground="lightblue", 
-                          selectforeground='black',
-                          font=('Arial', 12), headersbackground="gray15", 
-                          headersforeground='white', borderwidth=2,
-                          showweeknumbers=False)
-        self.cal.grid(row=1, column=1, rowspan=4, padx=20, pady=(0,10), sticky="nsew")
+        # The calendar itself is built once the window is up (see build_calendar)
+        self.calendar_frame = top_frame
+        self._cal = None
 
         # Generate Button
         submit_btn = ctk.CTkButton(top_frame, text="Generate", command=self.submit)
-        submit_btn.grid(row=6, column=0, columnspan=2, padx=20, pady=(10,20), sticky="ew")
+        submit_btn.grid(row=6, column=0, columnspan=2, padx=20, pady=(10,5), sticky="ew")
+
+        # Batch button: invoice every property for the selected billing date
+        batch_btn = ctk.CTkButton(top_frame, text="Generate All", command=self.submit_all)
+        batch_btn.grid(row=7, column=0, columnspan=2, padx=20, pady=(5,20), sticky="ew")
+
+        # Live preview of the selected tenant's next invoice
+        self.preview = InvoicePreview(top_frame, request_template=self.load_template_raster)
+        self.preview.grid(row=0, column=2, rowspan=8, padx=(10, 20), pady=15, sticky="n")
 
         # History section
         history_frame = ctk.CTkFrame(container)
@@ -110,6 +174,22 @@ class PropertyApp(ctk.CTk):
         history_label = ctk.CTkLabel(history_frame, text="Invoice History", font=("Arial", 16, "bold"))
         history_label.pack(pady=(10, 5))
 
+        # Filter bar: tenant/property/invoice # text, billing date range and amount range
+        filter_frame = ctk.CTkFrame(history_frame)
+        filter_frame.pack(fill="x", padx=5, pady=(0, 5))
+        filter_frame.grid_columnconfigure(0, weight=3)
+        filter_frame.grid_columnconfigure((1, 2, 3, 4), weight=1)
+        self.filter_entries = {}
+        placeholders = [("text", "Search tenant, property or invoice #"), ("start", "From (MM-DD-YYYY)"),
+                        ("end", "To (MM-DD-YYYY)"), ("min_amount", "Min $"), ("max_amount", "Max $")]
+        for i, (name, placeholder) in enumerate(placeholders):
+            entry = ctk.CTkEntry(filter_frame, placeholder_text=placeholder)
+            entry.grid(row=0, column=i, padx=5, pady=5, sticky="ew")
+            entry.bind("<KeyRelease>", self.apply_filter)
+            self.filter_entries[name] = entry
+        clear_btn = ctk.CTkButton(filter_frame, text="Clear", width=60, command=self.clear_filter)
+        clear_btn.grid(row=0, column=len(placeholders), padx=5, pady=5)
+
         # Headers frame
         headers_frame = ctk.CTkFrame(history_frame)
         headers_frame.pack(fill="x", padx=5, pady=5)
@@ -121,60 +201,135 @@ class PropertyApp(ctk.CTk):
             ctk.CTkLabel(headers_frame, text=header, font=("Arial", 14, "bold")).grid(
                 row=0, column=i, padx=5, pady=5, sticky="ew")
 
-        # Create scrollable frame for history entries
-        self.history_scrollable = ctk.CTkScrollableFrame(history_frame)
-        self.history_scrollable.pack(fill="both", expand=True, padx=5, pady=5)
-        self.history_scrollable.grid_columnconfigure((0,1,2,3,4), weight=1)
+        # Virtualized list for history entries (only visible rows get widgets)
+        self.history_view = HistoryView(history_frame)
+        self.history_view.pack(fill="both", expand=True, padx=5, pady=5)
+
+        # Set minimum size for the window
+        self.minsize(1300, 700)
+
+        # Calendar and history come after the first paint
+        self.after(STARTUP_DELAY, self.finish_startup)
 
-        # Load initial history
+        # Start polling for finished background jobs
+        self.after(POLL_INTERVAL, self.poll_jobs)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def finish_startup(self):
+        """Deferred startup work, run once the window is showing"""
+        self.build_calendar()
         self.update_history()
+        self.update_preview_records()
+        self.schedule_preview()
 
-        # Set minimum size for the window
-        self.minsize(1000, 700)
+    def build_calendar(self):
+        """Create the billing date calendar (importing tkcalendar) if it isn't there yet"""
+        if self._cal is not None:
+            return self._cal
+        from tkcalendar import Calendar
+
+        self._cal = Calendar(self.calendar_frame, selectmode="day", year=2024, month=9, day=13,
+                          background="gray25", foreground='white', 
+                          selectbackground="lightblue", 
+                          selectforeground='black',
+                          font=('Arial', 12), headersbackground="gray15", 
+                          headersforeground='white', borderwidth=2,
+                          showweeknumbers=False)
+        self._cal.grid(row=1, column=1, rowspan=4, padx=20, pady=(0,10), sticky="nsew")
+        self._cal.bind("<<CalendarSelected>>", self.schedule_preview)
+        return self._cal
+
+    @property
+    def cal(self):
+        return self.build_calendar()
 
     def update_history(self):
+        """Reload the history panel in the background"""
+        if not self.jobs.busy(HISTORY_JOB):
+            self.jobs.submit_background(HISTORY_JOB, self.load_history)
+
+    def load_history(self):
+        """Background job: every invoice from the ledger, indexed for the filter bar.
+
+        The ledger is seeded from the property records the first time; after
+        that rows come from its cached snapshot plus whatever was appended since.
+        """
+        with span('history_rebuild'):
+            self.ledger.seed(lambda: reversed(self.store.history()))
+            return HistoryIndex(self.ledger.cached_history())
+
+    def on_history_loaded(self, future):
+        """Show the loaded history (Tk thread); the view only draws the visible rows"""
         try:
-            # Clear existing history
-            for widget in self.history_scrollable.winfo_children():
-                widget.destroy()
-
-            # Load data
-            with open('properties_data.json', 'r') as f:
-                data = json.load(f)
-
-            # Create a list of all invoices
-            all_invoices = []
-            for prop in data['properties']:
-                if isinstance(prop['invoice_no'], list):
-                    for inv_no in prop['invoice_no']:
-                        all_invoices.append({
-                            'date': prop['date'],
-                            'invoice_no': inv_no,
-                            'property': prop['property_address1'],
-                            'tenant': prop['to_renter'].split(',')[0],
-                            'amount': prop['total']
-                        })
-
-            # Sort invoices by date (newest first) and invoice number
-            all_invoices.sort(key=lambda x: (datetime.strptime(x['date'], '%m-%d-%Y'), x['invoice_no']), reverse=True)
-
-            # Add entries to history
-            for i, invoice in enumerate(all_invoices):
-                bg_color = ("gray90", "gray20") if i % 2 == 0 else ("white", "gray30")
-                row_frame = ctk.CTkFrame(self.history_scrollable, fg_color=bg_color)
-                row_frame.grid(row=i, column=0, columnspan=5, sticky="ew", padx=2, pady=1)
-                row_frame.grid_columnconfigure((0,1,2,3,4), weight=1)
-
-                ctk.CTkLabel(row_frame, text=invoice['date']).grid(row=0, column=0, padx=5, pady=3)
-                ctk.CTkLabel(row_frame, text=str(invoice['invoice_no'])).grid(row=0, column=1, padx=5, pady=3)
-                ctk.CTkLabel(row_frame, text=invoice['property']).grid(row=0, column=2, padx=5, pady=3)
-                ctk.CTkLabel(row_frame, text=invoice['tenant']).grid(row=0, column=3, padx=5, pady=3)
-                ctk.CTkLabel(row_frame, text=invoice['amount']).grid(row=0, column=4, padx=5, pady=3)
-
+            self.history_index = future.result()
+            self.history_view.set_rows(self.history_index.search(self.history_filter))
         except Exception as e:
             self.display_message(f"Error loading invoice history: {str(e)}", "error")
             logging.error(f"Error loading invoice history: {str(e)}")
 
+    def apply_filter(self, event=None):
+        """Show the history rows matching the filter bar"""
+        try:
+            self.history_filter = HistoryFilter.parse(
+                **{name: entry.get() for name, entry in self.filter_entries.items()})
+        except ValueError:
+            # A date or amount still being typed; keep the current results
+            return
+        if self.history_index is not None:
+            with span('history_filter'):
+                self.history_view.set_rows(self.history_index.search(self.history_filter))
+
+    def clear_filter(self):
+        for entry in self.filter_entries.values():
+            entry.delete(0, "end")
+        self.apply_filter()
+
+    def update_preview_records(self):
+        """Reload the preview's records in the background (their next invoice numbers change as invoices go out)"""
+        if not self.jobs.busy(PREVIEW_JOB):
+            self.jobs.submit_background(PREVIEW_JOB, self.store.next_invoices)
+
+    def on_preview_records_loaded(self, future):
+        try:
+            self.preview_records = future.result()
+        except Exception as e:
+            logging.error(f"Error loading preview records: {str(e)}")
+            return
+        self.schedule_preview()
+
+    def load_template_raster(self, template_path):
+        """Make the preview raster for a template in the background (cached on disk after the first time)"""
+        self.jobs.submit_background((RASTER_JOB, template_path), template_raster, template_path)
+
+    def on_template_raster(self, template_path, future):
+        try:
+            raster = future.result()
+        except Exception as e:
+            logging.error(f"Error rasterizing {template_path}: {str(e)}")
+            raster = None
+        self.preview.set_template(template_path, raster)
+
+    def schedule_preview(self, event=None):
+        """Redraw the preview once the selection stops changing"""
+        if self._preview_after is not None:
+            self.after_cancel(self._preview_after)
+        self._preview_after = self.after(PREVIEW_DELAY, self.refresh_preview)
+
+    def refresh_preview(self):
+        """Draw the selected tenant's next invoice for the selected date; allocates nothing"""
+        self._preview_after = None
+        record = (self.preview_records or {}).get(tenant_key(self.tenant_combo.get()))
+        invoice_data = None
+        try:
+            with span('preview_refresh'):
+                if record is not None and self._cal is not None:
+                    billing_date = datetime.strptime(self._cal.get_date(), '%m/%d/%y')
+                    invoice_data = preview_data(record, billing_date, self.store.rates_file)
+                self.preview.show(invoice_data, self.template_path)
+        except Exception as e:
+            self.preview.show(None, self.template_path)
+            logging.error(f"Error drawing the preview: {str(e)}")
+
     # Add update_history call to submit method
     def submit(self):
         selected_property = self.property_combo.get()
@@ -184,52 +339,149 @@ class PropertyApp(ctk.CTk):
         if selected_property == "Select Property" or selected_tenant in ["Select a property first", "Select Tenant", "No tenants found"]:
             self.display_message("Please select both property and tenant.", "error")
             return
-            
+
+        # One generation per tenant at a time; other tenants keep queueing behind it
+        if self.jobs.busy(selected_tenant):
+            self.display_message(f"An invoice for {selected_tenant} is already being generated.", "error")
+            return
+
         try:
-            # Load existing data
-            with open('properties_data.json', 'r') as f:
-                data = json.load(f)
-            
-            # Find matching property data
-            matching_property = None
-            for prop in data['properties']:
-                if prop['to_renter'].split(',')[0].strip() == selected_tenant.split(',')[0].strip():
-                    matching_property = prop
-                    break
-            
-            if matching_property:
-                # Update date
-                matching_property['date'] = datetime.strptime(billing_date, '%m/%d/%y').strftime('%m-%d-%Y')
-                
-                # Update invoice number and get the new number
-                new_invoice_no = update_invoice_numbers(matching_property)
-                
-                # Create a copy of property data with the new invoice number
-                invoice_data = matching_property.copy()
-                invoice_data['invoice_no'] = new_invoice_no
-                
-                # Save updated data back to file
-                with open('properties_data.json', 'w') as f:
-                    json.dump(data, f, indent=4)
-                
-                # Generate invoice with new number
-                output_pdf = os.path.join(os.path.dirname(os.path.abspath(__file__)), 
-                                        f"Invoice {new_invoice_no}.pdf")
-                
-                if fill_invoice(self.template_path, output_pdf, invoice_data):
-                    self.display_message(f"Invoice {new_invoice_no} generated successfully!", "success")
-                    # Update the invoice label with new number
-                    self.invoice_label.configure(text=f"Current Invoice #: {new_invoice_no}")
-                    # Update history after successful generation
-                    self.update_history()
-                else:
-                    self.display_message("Failed to generate invoice.", "error")
-            else:
-                self.display_message("No matching tenant data found.", "error")
-                
+            self.jobs.submit(selected_tenant, self.generate_invoice, selected_tenant,
+                             datetime.strptime(billing_date, '%m/%d/%y'))
+            self.display_message(f"Generating invoice for {selected_tenant}...", "info")
+        except Exception as e:
+            self.display_message(f"Error: {str(e)}", "error")
+            logging.error(f"Error in submit: {str(e)}")
+
+    def generate_invoice(self, tenant, billing_date):
+        """Background job: allocate, render and record one invoice.
+
+        Runs on a worker thread, so it must not touch any widget. Returns
+        (invoice_data, output_pdf, ok); invoice_data is None when the tenant has no data.
+        """
+        # Find the tenant's data, update its date and allocate the next invoice number
+        invoice_data = self.store.allocate_one(tenant, billing_date)
+        if not invoice_data:
+            return None, None, False
+
+        # Generate invoice with new number
+        output_pdf = os.path.join(os.path.dirname(os.path.abspath(__file__)), invoice_file_name(invoice_data))
+        ok = fill_invoice(self.template_path, output_pdf, invoice_data)
+        if ok:
+            self.record_invoice(invoice_data, output_pdf)
+        return invoice_data, output_pdf, ok
+
+    def on_invoice_done(self, future):
+        """Show the result of a finished generate_invoice job (Tk thread)"""
+        try:
+            invoice_data, output_pdf, ok = future.result()
         except Exception as e:
             self.display_message(f"Error: {str(e)}", "error")
             logging.error(f"Error in submit: {str(e)}")
+            return
+
+        if invoice_data is None:
+            self.display_message("No matching tenant data found.", "error")
+        elif ok:
+            new_invoice_no = invoice_data['invoice_no']
+            self.display_message(f"Invoice {new_invoice_no} generated successfully!", "success")
+            # Update the invoice label with new number
+            self.invoice_label.configure(text=f"Current Invoice #: {new_invoice_no}")
+            # Add just the new invoice to the history indexes, and to the list if it passes the filter
+            row = invoice_row(invoice_data)
+            if self.history_index is None:
+                self.history_view.insert_row(row)
+            elif self.history_index.matches(self.history_index.add(row), self.history_filter):
+                self.history_view.insert_row(row)
+            self.update_preview_records()
+        else:
+            self.display_message("Failed to generate invoice.", "error")
+
+    def submit_all(self):
+        """Generate invoices for every property at once for the selected billing date"""
+        billing_date = self.cal.get_date()
+        if not billing_date:
+            self.display_message("Please select a billing date.", "error")
+            return
+
+        if self.jobs.busy(BATCH_JOB):
+            self.display_message("A batch run is already in progress.", "error")
+            return
+
+        def report_progress(done, total, invoice_no, ok):
+            # Called on the worker thread; hand the update to the Tk thread
+            status = "generated" if ok else "failed"
+            self.jobs.post('progress', f"Invoice {invoice_no} {status} ({done}/{total})", "success" if ok else "error")
+
+        try:
+            from invoice_batch import generate_batch
+
+            self.jobs.submit(BATCH_JOB, generate_batch, self.template_path, datetime.strptime(billing_date, '%m/%d/%y'),
+                             os.path.dirname(os.path.abspath(__file__)), store=self.store,
+                             ledger=self.ledger, progress=report_progress)
+            self.display_message("Generating invoices for all properties...", "info")
+        except Exception as e:
+            self.display_message(f"Error: {str(e)}", "error")
+            logging.error(f"Error in submit_all: {str(e)}")
+
+    def on_batch_done(self, future):
+        """Show the result of a finished batch run (Tk thread)"""
+        try:
+            results = future.result()
+        except Exception as e:
+            self.display_message(f"Error: {str(e)}", "error")
+            logging.error(f"Error in submit_all: {str(e)}")
+            return
+
+        generated, failed = len(results['generated']), len(results['failed'])
+        if failed:
+            self.display_message(f"Generated {generated} invoices, {failed} failed.", "error")
+        else:
+            self.display_message(f"Generated {generated} invoices successfully!", "success")
+        self.update_history()
+        self.update_preview_records()
+
+    def process_job_events(self):
+        """Apply progress updates and finished jobs from the background queue"""
+        for event in self.jobs.poll():
+            if event[0] == 'progress':
+                self.display_message(event[1], event[2])
+            elif event[1] == BATCH_JOB:
+                self.on_batch_done(event[2])
+            elif event[1] == HISTORY_JOB:
+                self.on_history_loaded(event[2])
+            elif event[1] == PREVIEW_JOB:
+                self.on_preview_records_loaded(event[2])
+            elif isinstance(event[1], tuple) and event[1][0] == RASTER_JOB:
+                self.on_template_raster(event[1][1], event[2])
+            else:
+                self.on_invoice_done(event[2])
+
+    def poll_jobs(self):
+        self.process_job_events()
+        self.after(POLL_INTERVAL, self.poll_jobs)
+
+    def finish_jobs(self):
+        """Wait for every queued generation and show its result"""
+        self.jobs.wait()
+        self.process_job_events()
+
+    def on_close(self):
+        # Let running generations finish so allocated numbers get their PDFs
+        self.finish_jobs()
+        self.jobs.shutdown()
+        self.tenant_index.stop()
+        self.destroy()
+
+    def record_invoice(self, invoice_data, output_pdf):
+        """Append a generated invoice to the ledger; a ledger error doesn't undo the invoice"""
+        try:
+            from invoice_generator import invoice_template, template_cache
+
+            template_hash = template_cache.template_hash(invoice_template(self.template_path, invoice_data))
+            self.ledger.append(ledger_record(invoice_data, output_pdf, template_hash))
+        except Exception as e:
+            logging.error(f"Error recording invoice {invoice_data['invoice_no']} in ledger: {str(e)}")
 
     # Rest of your existing methods remain the same
     def load_default_tenants(self):
@@ -250,20 +502,8 @@ class PropertyApp(ctk.CTk):
             
             # Update invoice number
             try:
-                with open('properties_data.json', 'r') as f:
-                    data = json.load(f)
-                
                 # Find the most recent invoice number for this property
-                invoice_number = "-"
-                property_short = selected_property.split(',')[0].strip()
-                
-                for prop in data['properties']:
-                    if property_short in prop['property_address1']:
-                        if isinstance(prop['invoice_no'], list) and prop['invoice_no']:
-                            invoice_number = prop['invoice_no'][-1]
-                        else:
-                            invoice_number = prop['invoice_no']
-                        break
+                invoice_number = self.store.latest_invoice_number(selected_property)
                 
                 self.invoice_label.configure(text=f"Current Invoice #: {invoice_number}")
             except Exception as e:
@@ -286,6 +526,7 @@ class PropertyApp(ctk.CTk):
             self.tenant_combo.configure(values=["Select a property first"])
             self.tenant_combo.set("Select a property first")
             self.invoice_label.configure(text="Current Invoice #: -")
+        self.schedule_preview()
 
     def set_default_tenant(self):
         selected_property = self.property_combo.get()
@@ -300,17 +541,11 @@ class PropertyApp(ctk.CTk):
             self.display_message("Default Tenant Set", "success")
 
     def find_tenants(self, property_folder):
-        tenants = []
-        tenants_path = os.path.join(invoice_directory, property_folder, "tenants")
-
-        if os.path.exists(tenants_path):
-            for folder_name in os.listdir(tenants_path):
-                tenant_path = os.path.join(tenants_path, folder_name)
-                if os.path.isdir(tenant_path):
-                    tenants.append(folder_name)
-        else:
+        # Answered from the in-memory tenant index
+        tenants = self.tenant_index.tenants(property_folder)
+        if tenants is None:
             self.display_message(f"The 'tenants' folder for {property_folder} was not found.", "error")
-
+            return []
         return tenants
 
     def display_message(self, message, message_type):
@@ -318,6 +553,8 @@ class PropertyApp(ctk.CTk):
             self.message_label.configure(text=message, text_color="red")
         elif message_type == "success":
             self.message_label.configure(text=message, text_color="green")
+        elif message_type == "info":
+            self.message_label.configure(text=message, text_color=("gray10", "gray90"))
 
 if __name__ == "__main__":
     app = PropertyApp()
@@ -0,0 +1,236 @@
+# invoice_batch.py
+
+import gc
+import os
+import logging
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from invoice_generator import fill_invoice, invoice_template, template_cache
+from invoice_layout import clear_layouts
+from invoice_statement import fill_statement
+from invoice_optimize import optimize_file
+from invoice_store import open_store
+from invoice_ledger import ledger_record
+from invoice_data import invoice_file_name, tenant_key
+
+# Memory a streaming run may use unless told otherwise (bytes)
+STREAM_MAX_MEMORY = 512 * 1024 * 1024
+
+# Past this fraction of the limit a streaming run collects garbage and drops its caches
+STREAM_COLLECT_AT = 0.8
+
+def memory_in_use():
+    """Bytes the process is using: traced memory under tracemalloc, otherwise the resident set size"""
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0]
+    if os.name == 'nt':
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + \
+                       [(name, ctypes.c_size_t) for name in (
+                           'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                           'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(counters), counters.cb)
+        return counters.WorkingSetSize
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # No /proc (macOS): the peak is the best there is (bytes there, KiB elsewhere)
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+def render_invoice(template_path, output_pdf, invoice_data, optimize=None, engine=None, output_cache=None):
+    """fill_invoice followed by the optional optimization stage.
+
+    `optimize` names the optimizations to run (see invoice_optimize.OPTIMIZATIONS),
+    `engine` the text engine (see invoice_layout.ENGINES) and `output_cache`
+    an invoice_output_cache.OutputCache; returns (ok, bytes_before, bytes_after).
+    """
+    if not fill_invoice(template_path, output_pdf, invoice_data, engine, output_cache):
+        return False, 0, 0
+    if not optimize:
+        size = os.path.getsize(output_pdf)
+        return True, size, size
+    before, after = optimize_file(output_pdf, optimize)
+    return True, before, after
+
+def record_invoice(ledger, template_path, invoice_data, output_pdf):
+    """Append a generated invoice to `ledger`; a ledger error is logged and doesn't stop the run"""
+    try:
+        template_hash = template_cache.template_hash(invoice_template(template_path, invoice_data))
+        ledger.append(ledger_record(invoice_data, output_pdf, template_hash))
+    except Exception as e:
+        logging.error(f"Error recording invoice {invoice_data['invoice_no']} in ledger: {str(e)}")
+
+def generate_batch(template_path, billing_date, output_dir, properties=None, tenants=None,
+                   store=None, ledger=None, max_workers=None, progress=None, optimize=None, engine=None,
+                   output_cache=None):
+    """Generate invoices for many properties at once over a process pool.
+
+    Invoice numbers are allocated and saved up front, then the PDFs are rendered
+    in parallel. `progress(done, total, invoice_no, ok)` is called as each invoice
+    finishes. A failed invoice never stops the rest of the run; failures are
+    collected and returned alongside the generated files, both keyed by
+    (tenant, invoice_no) since numbers are only unique per property. Each
+    generated invoice is appended to `ledger` when one is given. With `optimize`, every PDF goes
+    through the optimization stage and the results report the bytes written
+    before and after it.
+    """
+    # Allocate and save the numbers once for the whole run
+    store = store or open_store()
+    jobs = store.allocate(billing_date, properties, tenants)
+    results = {'generated': [], 'failed': [], 'bytes_before': 0, 'bytes_after': 0}
+    if not jobs:
+        return results
+
+    # results['generated'] holds (tenant, invoice_no, output_pdf), results['failed'] (tenant, invoice_no, error)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for invoice_data in jobs:
+            output_pdf = os.path.join(output_dir, invoice_file_name(invoice_data))
+            future = pool.submit(render_invoice, template_path, output_pdf, invoice_data, optimize, engine,
+                                 output_cache)
+            futures[future] = (invoice_data, output_pdf)
+
+        for done, future in enumerate(as_completed(futures), 1):
+            invoice_data, output_pdf = futures[future]
+            invoice_no = invoice_data['invoice_no']
+            tenant = tenant_key(invoice_data['to_renter'])
+            try:
+                ok, before, after = future.result()
+                error = None if ok else "fill_invoice returned False"
+            except Exception as e:
+                ok = False
+                error = str(e)
+
+            if ok:
+                results['generated'].append((tenant, invoice_no, output_pdf))
+                results['bytes_before'] += before
+                results['bytes_after'] += after
+                if ledger:
+                    record_invoice(ledger, template_path, invoice_data, output_pdf)
+            else:
+                results['failed'].append((tenant, invoice_no, error))
+                logging.error(f"Error generating invoice {invoice_no} for {tenant}: {error}")
+
+            if progress:
+                progress(done, len(jobs), invoice_no, ok)
+
+    return results
+
+def generate_statement(template_path, billing_date, output_pdf, properties=None, tenants=None,
+                       store=None, ledger=None, optimize=None, engine=None):
+    """Generate invoices for many properties into one combined statement PDF.
+
+    Numbers are allocated up front as in generate_batch. The template is
+    embedded once and shared by every page, so the statement costs little more
+    than its text. Returns the same shape as generate_batch, with every
+    generated invoice pointing at `output_pdf`.
+    """
+    store = store or open_store()
+    jobs = store.allocate(billing_date, properties, tenants)
+    results = {'generated': [], 'failed': [], 'bytes_before': 0, 'bytes_after': 0}
+    if not jobs:
+        return results
+
+    written = fill_statement(template_path, output_pdf, jobs, engine)
+    if optimize:
+        results['bytes_before'], results['bytes_after'] = optimize_file(output_pdf, optimize)
+    else:
+        results['bytes_before'] = results['bytes_after'] = os.path.getsize(output_pdf)
+    results['failed'] = written['failed']
+    written = set(written['written'])
+    for invoice_data in jobs:
+        tenant = tenant_key(invoice_data['to_renter'])
+        if (tenant, invoice_data['invoice_no']) not in written:
+            continue
+        results['generated'].append((tenant, invoice_data['invoice_no'], output_pdf))
+        if ledger:
+            record_invoice(ledger, template_path, invoice_data, output_pdf)
+    return results
+
+def generate_stream(template_path, records, output_dir, max_memory=STREAM_MAX_MEMORY, ledger=None,
+                    progress=None, optimize=None, engine=None, output_cache=None, render=render_invoice):
+    """Render invoices one at a time from any iterable of invoice records, in bounded memory.
+
+    Each record is rendered, written and appended to `ledger` before the next
+    one is pulled, and nothing is kept per invoice, so a run of any length
+    holds a single invoice at a time. Before pulling a record the run checks
+    that memory in use plus the most any invoice has added so far fits under
+    `max_memory`; PyPDF2 leaves every writer in reference cycles, so past
+    STREAM_COLLECT_AT of the limit they are collected and the template and
+    layout caches dropped first. If the next invoice still wouldn't fit, the
+    run stops without pulling it and results['stopped'] says why.
+    `progress(done, None, invoice_no, ok)` is called per invoice (the total
+    isn't known up front).
+
+    Memory in use is what memory_in_use() reports. Under tracemalloc that is
+    the traced heap, which drops when garbage is collected. Otherwise it is
+    the resident set size, which doesn't: the allocator keeps freed memory
+    for reuse instead of returning it. There, collecting is what stops the
+    resident set from growing further, and the run only collects again once
+    it has grown past what it was after the last collection.
+
+    Returns counts: {'generated', 'failed', 'bytes_before', 'bytes_after',
+    'peak_memory', 'stopped'}; failures are logged as they happen.
+    """
+    results = {'generated': 0, 'failed': 0, 'bytes_before': 0, 'bytes_after': 0,
+               'peak_memory': memory_in_use(), 'stopped': None}
+    collect_at = max_memory * STREAM_COLLECT_AT
+    records = iter(records)
+    per_invoice = 0    # the most a single invoice has added to memory in use
+    collected = 0      # memory in use right after the last collection
+    done = 0
+    while True:
+        in_use = memory_in_use()
+        if in_use + per_invoice > collect_at and in_use > collected:
+            gc.collect()
+            template_cache.clear()
+            clear_layouts()
+            in_use = collected = memory_in_use()
+        results['peak_memory'] = max(results['peak_memory'], in_use)
+        if in_use + per_invoice > max_memory:
+            results['stopped'] = (f"memory in use ({in_use:,} bytes) and the largest invoice so far "
+                                  f"({per_invoice:,} bytes) would pass the {max_memory:,} byte limit "
+                                  f"after {done} invoices")
+            logging.error(f"Streaming run stopped: {results['stopped']}")
+            break
+
+        invoice_data = next(records, None)
+        if invoice_data is None:
+            break
+        done += 1
+        invoice_no = invoice_data['invoice_no']
+        output_pdf = os.path.join(output_dir, invoice_file_name(invoice_data))
+        try:
+            ok, before, after = render(template_path, output_pdf, invoice_data, optimize, engine, output_cache)
+            error = None if ok else "fill_invoice returned False"
+        except Exception as e:
+            ok = False
+            error = str(e)
+
+        if ok:
+            results['generated'] += 1
+            results['bytes_before'] += before
+            results['bytes_after'] += after
+            if ledger:
+                record_invoice(ledger, template_path, invoice_data, output_pdf)
+        else:
+            results['failed'] += 1
+            logging.error(f"Error generating invoice {invoice_no}: {error}")
+        if progress:
+            progress(done, None, invoice_no, ok)
+
+        rendered = memory_in_use()
+        per_invoice = max(per_invoice, rendered - in_use)
+        results['peak_memory'] = max(results['peak_memory'], rendered)
+    return results
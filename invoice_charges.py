@@ -0,0 +1,184 @@
+# invoice_charges.py
+#
+# Recurring charges derived from rate tables instead of hand-kept strings.
+# invoice_rates.json holds each property's monthly utility bills, per-unit fees
+# and tax rate, and each tenant's rent, unit count, move-in/out dates, own fees
+# and discount:
+#
+#   {"properties": {"3175 Seminole Ave": {"utilities": {"Water": "$150.00"},
+#                                         "fees": {"Internet": "$18.00"},
+#                                         "tax_rate": "0"}},
+#    "tenants": {"Hector Garcia": {"property": "3175 Seminole Ave", "rent": "$1,312.50",
+#                                  "units": 1, "move_in": "09-15-2024", "move_out": null,
+#                                  "fees": {"Parking": "$25.00"}, "discount": "$0.00"}}}
+#
+# The tables are compiled once into integer cents and date ordinals, and a
+# month is priced for the whole portfolio in one pass: rent prorated by the
+# days occupied, utility bills split across each property's tenants by units
+# times days occupied (to the cent, by largest remainder), then fees, discount
+# and tax. Amounts are Cents, which only turn into strings when drawn.
+# Tenants with no day in residence in the month are vacant: the stores leave
+# them out rather than issue a $0 invoice.
+
+import calendar
+import json
+import os
+import threading
+from datetime import date
+from decimal import Decimal
+from invoice_data import Cents, parse_billing_date, parse_cents, tenant_key
+
+RATES_FILE = 'invoice_rates.json'
+
+# Fields a priced invoice gets, besides its line items
+TOTAL_FIELDS = ('subtotal', 'discount', 'fees', 'tax', 'total')
+
+def _ordinal(value):
+    return parse_billing_date(value).toordinal() if value else None
+
+def _amounts(table):
+    return [(name, parse_cents(amount)) for name, amount in (table or {}).items()]
+
+def split_cents(amount, weights):
+    """Split `amount` cents in proportion to `weights`; the parts add up to `amount` exactly"""
+    total = sum(weights)
+    if not total:
+        return [0] * len(weights)
+    parts = [amount * weight // total for weight in weights]
+    # Hand the cents lost to rounding down to the largest remainders
+    remainders = sorted(range(len(weights)), key=lambda i: (amount * weights[i]) % total, reverse=True)
+    for i in remainders[:amount - sum(parts)]:
+        parts[i] += 1
+    return parts
+
+class RateTable:
+    """Rate tables compiled to integer cents, with each month's charges computed once"""
+
+    def __init__(self, spec):
+        self.properties = {}
+        for address, prop in spec.get('properties', {}).items():
+            numerator, denominator = Decimal(str(prop.get('tax_rate', 0))).as_integer_ratio()
+            self.properties[address] = (_amounts(prop.get('utilities')), _amounts(prop.get('fees')),
+                                        numerator, denominator)
+
+        # (tenant, property, rent, units, move-in ordinal, move-out ordinal, fees, discount)
+        self.tenants = []
+        for name, tenant in spec.get('tenants', {}).items():
+            self.tenants.append((tenant_key(name), tenant['property'], parse_cents(tenant.get('rent', 0)),
+                                 int(tenant.get('units', 1)), _ordinal(tenant.get('move_in')),
+                                 _ordinal(tenant.get('move_out')), _amounts(tenant.get('fees')),
+                                 parse_cents(tenant.get('discount', 0))))
+        self._months = {}
+        self._lock = threading.Lock()
+
+    def _month(self, billing_date):
+        key = (billing_date.year, billing_date.month)
+        with self._lock:
+            if key not in self._months:
+                self._months[key] = self._price(*key)
+            return self._months[key]
+
+    def month(self, billing_date):
+        """{tenant: charges} for the month `billing_date` falls in"""
+        return self._month(billing_date)[0]
+
+    def vacant(self, billing_date):
+        """Tenants with no day in residence in the month `billing_date` falls in"""
+        return self._month(billing_date)[1]
+
+    def _price(self, year, month):
+        days = calendar.monthrange(year, month)[1]
+        first = date(year, month, 1).toordinal()
+        last = first + days - 1
+        no_property = ([], [], 0, 1)
+
+        # Days each tenant holds their unit this month, and who shares each property's bills
+        occupied = []
+        sharing = {}
+        for i, (_, prop, _, units, move_in, move_out, _, _) in enumerate(self.tenants):
+            held = max(0, min(last, move_out or last) - max(first, move_in or first) + 1)
+            occupied.append(held)
+            if held:
+                members = sharing.setdefault(prop, ([], []))
+                members[0].append(i)
+                members[1].append(units * held)
+
+        utilities = [[] for _ in self.tenants]
+        for prop, (members, weights) in sharing.items():
+            for name, bill in self.properties.get(prop, no_property)[0]:
+                for i, share in zip(members, split_cents(bill, weights)):
+                    utilities[i].append([name, Cents(share)])
+
+        charges = {}
+        vacant = set()
+        for i, (tenant, prop, rent, _, _, _, tenant_fees, discount) in enumerate(self.tenants):
+            held = occupied[i]
+            if not held:
+                charges[tenant] = {'line_items': [], **{field: Cents(0) for field in TOTAL_FIELDS}}
+                vacant.add(tenant)
+                continue
+            _, property_fees, numerator, denominator = self.properties.get(prop, no_property)
+
+            if held == days:
+                line_items = [["Monthly Rent", Cents(rent)]]
+            else:
+                line_items = [[f"Rent ({held}/{days} days)", Cents((rent * held * 2 + days) // (2 * days))]]
+            line_items += utilities[i]
+            subtotal = sum(amount for _, amount in line_items)
+            fees = 0
+            for name, amount in property_fees + tenant_fees:
+                line_items.append([name, Cents(amount)])
+                fees += amount
+            tax = (subtotal * numerator * 2 + denominator) // (2 * denominator) if numerator else 0
+
+            charges[tenant] = {
+                'line_items': line_items,
+                'subtotal': Cents(subtotal),
+                'discount': Cents(discount),
+                'fees': Cents(fees),
+                'tax': Cents(tax),
+                'total': Cents(subtotal - discount + fees + tax),
+            }
+        return charges, frozenset(vacant)
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+def load_rates(path=RATES_FILE):
+    """The compiled rate table in `path` (None if there is none), recompiled when the file changes"""
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    with _tables_lock:
+        cached = _tables.get(path)
+        if cached and cached[0] == (stat.st_mtime_ns, stat.st_size):
+            return cached[1]
+    with open(path, 'r') as f:
+        table = RateTable(json.load(f))
+    with _tables_lock:
+        _tables[path] = ((stat.st_mtime_ns, stat.st_size), table)
+    return table
+
+def vacant_tenants(billing_date, path=RATES_FILE):
+    """Tenants the rate table has no day in residence for in `billing_date`'s month (none without a table)"""
+    table = load_rates(path)
+    if table is None:
+        return frozenset()
+    return table.vacant(billing_date)
+
+def price_invoices(jobs, billing_date, path=RATES_FILE):
+    """Fill in line items and totals from the rate table for every job whose tenant has rates.
+
+    Tenants without rates keep the line items and totals stored in their record.
+    """
+    table = load_rates(path)
+    if table is None:
+        return jobs
+    charges = table.month(billing_date)
+    for invoice_data in jobs:
+        tenant_charges = charges.get(tenant_key(invoice_data.get('to_renter', '')))
+        if tenant_charges is not None:
+            invoice_data.update(tenant_charges, line_items=list(tenant_charges['line_items']))
+    return jobs
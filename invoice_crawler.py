@@ -0,0 +1,213 @@
+# invoice_crawler.py
+#
+# Index of the invoice PDFs already filed under <root>/<property>/tenants/<tenant>.
+# Text is extracted on a process pool and the results are kept in a JSON index
+# keyed by path, size and mtime, so a rescan only re-reads new or changed files.
+
+import json
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from invoice_data import tenant_key
+from invoice_handler import InvoiceNumbers
+
+PDF_INDEX_FILE = 'invoice_pdf_index.json'
+
+# Fields read back from the PDFs (where the standard layout draws them)
+EXTRACT_FIELDS = ('date', 'invoice_no', 'total')
+
+# PyPDF2 reports a drawn string's position after the line advance, so it
+# comes back up to this far below the layout position
+EXTRACT_TOLERANCE = 16
+
+DATE_PATTERN = re.compile(r'\d{2}-\d{2}-\d{4}')
+AMOUNT_PATTERN = re.compile(r'-?\$[\d,]+\.\d{2}')
+FILENAME_PATTERN = re.compile(r'Invoice\s+(\d+)', re.IGNORECASE)
+
+def _field_text(strings, x, y):
+    """The string drawn closest to (x, y) in the same column, or None"""
+    best = None
+    for text, tx, ty in strings:
+        if abs(tx - x) <= 1 and -2 <= y - ty <= EXTRACT_TOLERANCE:
+            if best is None or abs(y - ty) < abs(y - best[2]):
+                best = (text, tx, ty)
+    return best[0] if best else None
+
+def _page_strings(page):
+    strings = []
+
+    def visit(text, cm, tm, font, size):
+        if text.strip():
+            strings.append((text.strip(), tm[4] + cm[4], tm[5] + cm[5]))
+
+    page.extract_text(visitor_text=visit)
+    return strings
+
+def extract_invoice(path):
+    """Read the invoice number, billing date and total back out of an invoice PDF.
+
+    Runs in worker processes. Fields are matched by where the standard layout
+    draws them; the number falls back to the file name. Returns a dict with
+    whatever was found, plus 'error' if the file couldn't be read.
+    """
+    from PyPDF2 import PdfReader
+    from invoice_layout import STANDARD_LAYOUT
+
+    positions = dict(STANDARD_LAYOUT['fields'], **STANDARD_LAYOUT['totals'])
+    result = {field: None for field in EXTRACT_FIELDS}
+    try:
+        reader = PdfReader(path)
+        first = _page_strings(reader.pages[0])
+        last = _page_strings(reader.pages[-1]) if len(reader.pages) > 1 else first
+
+        date = _field_text(first, *positions['date'])
+        if date and DATE_PATTERN.fullmatch(date):
+            result['date'] = date
+        invoice_no = _field_text(first, *positions['invoice_no'])
+        if invoice_no and invoice_no.isdigit():
+            result['invoice_no'] = int(invoice_no)
+        total = _field_text(last, *positions['total'])
+        if total and AMOUNT_PATTERN.fullmatch(total):
+            result['total'] = total
+    except Exception as e:
+        result['error'] = str(e)
+
+    if result['invoice_no'] is None:
+        match = FILENAME_PATTERN.search(os.path.basename(path))
+        if match:
+            result['invoice_no'] = int(match.group(1))
+    return result
+
+class PdfIndex:
+    """Persistent index of the invoice PDFs under an invoice directory.
+
+    Entries are keyed by path relative to the root and carry the file's size
+    and mtime; a scan stats every file but only extracts the new or changed ones.
+    """
+
+    def __init__(self, root, path=PDF_INDEX_FILE):
+        self.root = root
+        self.path = path
+        self.entries = {}
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                snapshot = json.load(f)
+            # An index built for another directory doesn't apply
+            if snapshot.get('root') == os.path.abspath(self.root):
+                self.entries = snapshot['entries']
+        return self
+
+    def save(self):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'root': os.path.abspath(self.root), 'entries': self.entries}, f, separators=(',', ':'))
+        os.replace(temp_path, self.path)
+
+    def walk(self):
+        """Yield (relative path, property, tenant, stat) for every PDF in the tenant folders"""
+        try:
+            properties = [entry for entry in os.scandir(self.root) if entry.is_dir()]
+        except OSError:
+            return
+        for prop in properties:
+            tenants_path = os.path.join(prop.path, 'tenants')
+            try:
+                tenants = [entry for entry in os.scandir(tenants_path) if entry.is_dir()]
+            except OSError:
+                continue
+            for tenant in tenants:
+                for folder, _, files in os.walk(tenant.path):
+                    for name in files:
+                        if not name.lower().endswith('.pdf'):
+                            continue
+                        full_path = os.path.join(folder, name)
+                        try:
+                            stat = os.stat(full_path)
+                        except OSError:
+                            continue
+                        yield os.path.relpath(full_path, self.root), prop.name, tenant.name, stat
+
+    def scan(self, max_workers=None):
+        """Bring the index up to date with the directory; returns counts of what changed"""
+        stats = {'files': 0, 'unchanged': 0, 'extracted': 0, 'failed': 0, 'removed': 0}
+        seen = set()
+        changed = []
+        for rel_path, prop, tenant, stat in self.walk():
+            stats['files'] += 1
+            seen.add(rel_path)
+            entry = self.entries.get(rel_path)
+            if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                stats['unchanged'] += 1
+                continue
+            changed.append((rel_path, {'property': prop, 'tenant': tenant,
+                                       'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}))
+
+        for rel_path in [p for p in self.entries if p not in seen]:
+            del self.entries[rel_path]
+            stats['removed'] += 1
+
+        if changed:
+            paths = [os.path.join(self.root, rel_path) for rel_path, _ in changed]
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                results = pool.map(extract_invoice, paths, chunksize=max(1, len(paths) // 64))
+                for (rel_path, entry), fields in zip(changed, results):
+                    entry.update(fields)
+                    self.entries[rel_path] = entry
+                    if 'error' in fields:
+                        stats['failed'] += 1
+                        logging.error(f"Error reading {rel_path}: {fields['error']}")
+                    else:
+                        stats['extracted'] += 1
+
+        if changed or stats['removed']:
+            self.save()
+        return stats
+
+    def search(self, tenant=None, property_name=None, invoice_no=None):
+        """Index entries (with their 'path') matching every filter given"""
+        found = []
+        for rel_path, entry in sorted(self.entries.items()):
+            if tenant and tenant_key(entry['tenant']) != tenant_key(tenant):
+                continue
+            if property_name and property_name.split(',')[0].strip() not in entry['property']:
+                continue
+            if invoice_no is not None and entry.get('invoice_no') != int(invoice_no):
+                continue
+            found.append(dict(entry, path=rel_path))
+        return found
+
+    def reconcile(self, issued):
+        """Compare the filed PDFs with the invoice numbers issued, as {tenant: InvoiceNumbers}
+        (a store's issued_numbers()).
+
+        Returns {tenant: {'missing': [[start, end], ...], 'unexpected': [numbers]}}
+        for every tenant where they disagree: numbers issued without a PDF on
+        file, and PDFs whose number was never issued to that tenant.
+        """
+        filed = {}
+        for entry in self.entries.values():
+            if entry.get('invoice_no') is not None:
+                filed.setdefault(tenant_key(entry['tenant']), set()).add(entry['invoice_no'])
+
+        report = {}
+        for tenant, numbers_issued in issued.items():
+            tenant = tenant_key(tenant)
+            numbers = filed.pop(tenant, set())
+            missing = InvoiceNumbers()
+            for number in numbers_issued:
+                if number not in numbers:
+                    missing.add(number)
+            unexpected = sorted(n for n in numbers if n not in numbers_issued)
+            if missing.ranges or unexpected:
+                report[tenant] = {'missing': missing.ranges, 'unexpected': unexpected}
+
+        # Tenants with PDFs on file but no record at all
+        for tenant, numbers in filed.items():
+            report[tenant] = {'missing': [], 'unexpected': sorted(numbers)}
+        return report
+
+def open_pdf_index(root, path=PDF_INDEX_FILE):
+    return PdfIndex(root, path).load()
@@ -0,0 +1,163 @@
+# invoice_data.py
+
+import json
+import os
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from invoice_timing import span
+from invoice_handler import InvoiceNumbers, update_invoice_numbers
+
+# File holding every property record and its invoice numbers
+DATA_FILE = 'properties_data.json'
+
+# Format used for the 'date' field inside properties_data.json
+DATE_FORMAT = '%m-%d-%Y'
+
+def load_data(data_file=DATA_FILE):
+    """Load the full properties data file"""
+    with span('json_load'), open(data_file, 'r') as f:
+        return json.load(f)
+
+def save_data(data, data_file=DATA_FILE):
+    """Write the full properties data back to disk.
+
+    The data goes to a temp file that replaces the old one once it is safely
+    on disk, so a crash mid-write leaves the previous version intact.
+    """
+    temp_path = data_file + '.tmp'
+    with span('json_save'):
+        with open(temp_path, 'w') as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, data_file)
+
+def tenant_key(name):
+    """Normalise a tenant name the way the renter field is matched ("Name, extra" -> "Name")"""
+    return name.split(',')[0].strip()
+
+def invoice_file_name(invoice_data):
+    """File name for a rendered invoice: "Invoice 29 - Hector Garcia.pdf".
+
+    Numbers are allocated per property record, so two tenants can hold the
+    same number; the tenant keeps their files apart.
+    """
+    tenant = ''.join('_' if c in '<>:"/\\|?*' else c for c in tenant_key(invoice_data['to_renter']))
+    return f"Invoice {invoice_data['invoice_no']} - {tenant}.pdf"
+
+def find_property_by_tenant(data, tenant):
+    """Return the property record whose renter matches the given tenant, or None"""
+    wanted = tenant_key(tenant)
+    for prop in data['properties']:
+        if tenant_key(prop['to_renter']) == wanted:
+            return prop
+    return None
+
+def find_property_by_address(data, property_name):
+    """Return the first property record whose address matches the property's street part"""
+    property_short = property_name.split(',')[0].strip()
+    for prop in data['properties']:
+        if property_short in prop['property_address1']:
+            return prop
+    return None
+
+def select_properties(data, properties=None, tenants=None):
+    """Pick the property records to invoice; every record when no filter is given"""
+    wanted_properties = [p.split(',')[0].strip() for p in properties or []]
+    wanted_tenants = {tenant_key(t) for t in tenants or []}
+
+    selected = []
+    for prop in data['properties']:
+        if wanted_properties and not any(p in prop['property_address1'] for p in wanted_properties):
+            continue
+        if wanted_tenants and tenant_key(prop['to_renter']) not in wanted_tenants:
+            continue
+        selected.append(prop)
+    return selected
+
+def format_billing_date(billing_date):
+    """Turn a date/datetime into the string stored in properties_data.json"""
+    return billing_date.strftime(DATE_FORMAT)
+
+def parse_billing_date(value):
+    """Parse a stored billing date string back into a datetime"""
+    return datetime.strptime(value, DATE_FORMAT)
+
+def parse_cents(amount):
+    """Parse a stored amount like "$1,368.00" (or "-$5.00", "($5.00)") into integer cents"""
+    text = str(amount).strip()
+    negative = text.startswith('-') or (text.startswith('(') and text.endswith(')'))
+    text = text.strip('-()').replace('$', '').replace(',', '').strip()
+    try:
+        cents = int((Decimal(text or '0') * 100).to_integral_value())
+    except InvalidOperation:
+        raise ValueError(f"invalid amount '{amount}'")
+    return -cents if negative else cents
+
+def format_cents(cents):
+    """Format integer cents the way amounts are stored ("$1,368.00")"""
+    sign = '-' if cents < 0 else ''
+    return f"{sign}${abs(cents) // 100:,}.{abs(cents) % 100:02d}"
+
+class Cents(int):
+    """An amount in integer cents that prints the way amounts are stored.
+
+    Computed charges stay integers all the way to the page; they only become
+    "$1,368.00" when drawn (str) or written out (stored_amounts).
+    """
+
+    def __str__(self):
+        return format_cents(self)
+
+    def __repr__(self):
+        return f"Cents({int(self)})"
+
+def stored_amounts(value):
+    """`value` with any Cents in it (also inside lists) turned into their stored strings"""
+    if isinstance(value, Cents):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return [stored_amounts(item) for item in value]
+    return value
+
+def collect_invoices(data):
+    """Flatten every property's invoice numbers into history rows, newest first"""
+    all_invoices = []
+    for prop in data['properties']:
+        if isinstance(prop['invoice_no'], (list, dict)):
+            for inv_no in InvoiceNumbers.from_value(prop['invoice_no']):
+                all_invoices.append({
+                    'date': prop['date'],
+                    'invoice_no': inv_no,
+                    'property': prop['property_address1'],
+                    'tenant': tenant_key(prop['to_renter']),
+                    'amount': prop['total']
+                })
+
+    # Sort invoices by date (newest first) and invoice number
+    all_invoices.sort(key=history_key, reverse=True)
+    return all_invoices
+
+def history_key(row):
+    """Sort key for history rows: billing date, then invoice number"""
+    return (parse_billing_date(row['date']), int(row['invoice_no']))
+
+def invoice_row(invoice_data):
+    """History row for a freshly generated invoice"""
+    return {
+        'date': invoice_data['date'],
+        'invoice_no': int(invoice_data['invoice_no']),
+        'property': invoice_data['property_address1'],
+        'tenant': tenant_key(invoice_data['to_renter']),
+        'amount': invoice_data.get('total', '')
+    }
+
+def prepare_invoice(property_data, billing_date):
+    """Stamp the billing date, allocate the next invoice number and return the data to render"""
+    property_data['date'] = format_billing_date(billing_date)
+    new_invoice_no = update_invoice_numbers(property_data)
+
+    # Copy of the property data carrying just the new invoice number
+    invoice_data = property_data.copy()
+    invoice_data['invoice_no'] = new_invoice_no
+    return invoice_data
@@ -1,88 +1,205 @@
 # invoice_generator.py
 
-from PyPDF2 import PdfReader, PdfWriter
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
+from PyPDF2 import PdfReader, PdfWriter, PageObject
+from PyPDF2.generic import ArrayObject, DecodedStreamObject, DictionaryObject, NameObject
 import io
 import os
 import json
+import hashlib
+import threading
+from invoice_layout import layout_for, ENGINES, DEFAULT_ENGINE, DIRECT_FONT
+from invoice_timing import span
+from invoice_output_cache import default_output_cache
 
-def fill_invoice(input_pdf, output_pdf, data):
+class TemplateCache:
+    """Parses each invoice template once per thread and hands out fresh copies of its first page.
+
+    Entries are revalidated against the file's mtime and size on every lookup; when
+    those change the content hash decides whether the template really needs re-parsing.
+    The file contents are shared, but each thread gets its own PdfReader: a reader
+    resolves objects lazily from its stream, and pages copied from it are still read
+    through it while they are merged and written.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._generation = 0
+
+    def _entry(self, input_pdf):
+        path = os.path.abspath(input_pdf)
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry['mtime'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                return entry
+
+            with span('template_read'):
+                with open(path, 'rb') as f:
+                    content = f.read()
+                digest = hashlib.sha256(content).hexdigest()
+
+            if entry and entry['hash'] == digest:
+                # Touched but unchanged: keep the parsed template
+                entry['mtime'], entry['size'] = stat.st_mtime_ns, stat.st_size
+                return entry
+
+            entry = {
+                'path': path,
+                'mtime': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'hash': digest,
+                'content': content,
+            }
+            self._entries[path] = entry
+            return entry
+
+    def _readers(self):
+        """This thread's {path: (hash, reader)}, emptied when the cache is cleared"""
+        local = self._local
+        if getattr(local, 'generation', None) != self._generation:
+            local.readers = {}
+            local.generation = self._generation
+        return local.readers
+
+    def reader(self, input_pdf):
+        """This thread's parsed PdfReader for the template"""
+        entry = self._entry(input_pdf)
+        readers = self._readers()
+        cached = readers.get(entry['path'])
+        if cached is None or cached[0] != entry['hash']:
+            # Parsed on first use; the reader works from memory, so no file handle stays open
+            with span('template_parse'):
+                cached = (entry['hash'], PdfReader(io.BytesIO(entry['content'])))
+            readers[entry['path']] = cached
+        return cached[1]
+
+    def template_hash(self, input_pdf):
+        """SHA-256 of the template's current contents"""
+        return self._entry(input_pdf)['hash']
+
+    def new_page(self, input_pdf):
+        """Return a fresh, shallow copy of the template's first page.
+
+        merge_page replaces the copy's /Contents and /Resources with new objects, so
+        merging onto it never touches the cached template; the fonts and images it
+        references are shared with this thread's reader.
+        """
+        reader = self.reader(input_pdf)
+        page = PageObject(reader)
+        page.update(reader.pages[0])
+        return page
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+# Shared per-process template cache
+template_cache = TemplateCache()
+
+def invoice_template(input_pdf, data):
+    """Template an invoice is drawn on: its layout's own, or `input_pdf`"""
+    return layout_for(data).template_for(input_pdf)
+
+def _add_stream(writer, data):
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    return writer._add_object(stream)
+
+def inject_text(writer, page, content, font):
+    """Append direct-engine text to a fresh template page, drawing with `font` as DIRECT_FONT.
+
+    The template's content is wrapped in q/Q so the graphics state it leaves
+    behind can't move the text. /Contents and /Resources are replaced with new
+    objects, so the cached template page is never modified.
+    """
+    contents = dict.__getitem__(page, '/Contents')
+    parts = list(contents.get_object()) if isinstance(contents.get_object(), ArrayObject) else [contents]
+    page[NameObject('/Contents')] = ArrayObject(
+        [_add_stream(writer, b"q\n")] + parts + [_add_stream(writer, b"\nQ\n" + content)])
+
+    resources = DictionaryObject(dict.items(page['/Resources']))
+    fonts = dict.get(resources, '/Font')
+    fonts = DictionaryObject(dict.items(fonts.get_object())) if fonts is not None else DictionaryObject()
+    fonts[NameObject(DIRECT_FONT)] = font
+    resources[NameObject('/Font')] = fonts
+    page[NameObject('/Resources')] = resources
+
+def fill_invoice(input_pdf, output_pdf, data, engine=None, output_cache=None):
+    """Render one invoice to `output_pdf`; returns False (after printing why) if it couldn't.
+
+    With an output cache (`output_cache`, or $GENINV_OUTPUT_CACHE), an invoice
+    already rendered from the same template, layout, engine and fields is
+    linked or copied from the cache instead of being rendered again.
+    """
+    temp_path = output_pdf + '.tmp'
     try:
-        # Read the template PDF
-        template_pdf = PdfReader(open(input_pdf, 'rb'))
-        output = PdfWriter()
-        
-        # Create a new PDF with our text
-        packet = io.BytesIO()
-        c = canvas.Canvas(packet, pagesize=letter)
+        engine = engine or DEFAULT_ENGINE
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown text engine '{engine}'")
         
-        # Set font and size
-        c.setFont("Helvetica", 10)
+        # The record's layout decides where fields go (and may bring its own template)
+        layout = layout_for(data)
+        input_pdf = layout.template_for(input_pdf)
+        font = None
+
+        output_cache = output_cache or default_output_cache()
+        if output_cache is not None:
+            # The key hashes every line item, so an iterator of them is read once up front
+            data = dict(data, line_items=list(data.get('line_items', ())))
+            with span('output_cache'):
+                cache_key = output_cache.key(template_cache.template_hash(input_pdf), layout, engine, data)
+                if output_cache.fetch(cache_key, output_pdf):
+                    return True
         
-        # Fill in all fields
-        field_positions = {
-            'date': (345, 742),
-            'invoice_no': (380, 725),
-            'property_address1': (425, 710),
-            'property_address2': (310, 695),
+        output = PdfWriter()
+        # Line items are consumed lazily, one page at a time; each page gets its
+        # own overlay merged onto a fresh copy of the template
+        pages = layout.paginate(data.get('line_items', ()))
+        for page_no, (line_items, is_last) in enumerate(pages, 1):
+            # Get a fresh copy of the (cached) template page
+            with span('template_page'):
+                page = template_cache.new_page(input_pdf)
+
+            # Direct engine: write the text operators into the page itself
+            content = None
+            if engine == 'direct':
+                with span('overlay_render'):
+                    content = layout.direct_content(data, line_items, page_no, is_last)
+            if content is not None:
+                with span('page_merge'):
+                    if font is None:
+                        font = output._add_object(layout.direct_font())
+                    inject_text(output, page, content, font)
+                    output.add_page(page)
+                continue
             
-            # FROM section
-            'from_company': (120, 652),
-            'from_email': (105, 635),
-            'from_phone': (105, 205),
+            # Create the text overlay; static fields come from the layout's cache
+            overlay = layout.overlay(data, line_items, page_no, is_last)
             
-            # BILL TO section
-            'to_renter': (370, 652),
-            'to_address': (370, 617),
-            'to_city_state': (378, 600),
-            'to_zip': (333, 583),
-            'to_phone': (350, 567),
-            'to_email': (350, 549),
-        }
-        
-        # Fill in the basic fields
-        for field, (x, y) in field_positions.items():
-            if field in data:
-                c.drawString(x, y, str(data[field]))
+            # Merge with template
+            with span('page_merge'):
+                page.merge_page(overlay)
+                output.add_page(page)
         
-        # Fill in line items
-        if 'line_items' in data:
-            y_position = 480
-            for desc, amount in data['line_items']:
-                c.drawString(60, y_position, str(desc))
-                c.drawString(480, y_position, str(amount))
-                y_position -= 20
-        
-        # Fill in totals
-        totals_positions = {
-            'subtotal': (480, 243),
-            'discount': (480, 219),
-            'fees': (480, 197),
-            'tax': (480, 174),
-            'total': (480, 152)
-        }
-        
-        for field, (x, y) in totals_positions.items():
-            if field in data:
-                c.drawString(x, y, str(data[field]))
-        
-        c.save()
-        packet.seek(0)
-        
-        # Create new PDF with the text
-        new_pdf = PdfReader(packet)
-        
-        # Merge with template
-        page = template_pdf.pages[0]
-        page.merge_page(new_pdf.pages[0])
-        output.add_page(page)
-        
-        # Write the output file
-        with open(output_pdf, 'wb') as outputStream:
-            output.write(outputStream)
-            
+        # Write the output file through a temp file, so a cached copy hard-linked
+        # at output_pdf is replaced rather than overwritten
+        with span('pdf_write'):
+            with open(temp_path, 'wb') as outputStream:
+                output.write(outputStream)
+            os.replace(temp_path, output_pdf)
+
+        if output_cache is not None:
+            with span('output_cache'):
+                output_cache.store(cache_key, output_pdf)
         return True
     except Exception as e:
         print(f"Error: {str(e)}")
-        return False
\ No newline at end of file
+        # Don't leave a half-written temp file next to the output
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return False
@@ -1,18 +1,126 @@
 # invoice_handler.py
 
+import bisect
+import logging
+
+class InvoiceNumbers:
+    """Issued invoice numbers stored as contiguous [start, end] ranges plus a high-water mark.
+
+    Stored in properties_data.json as {"ranges": [[1, 28]], "high_water": 28}, which
+    stays the same size however many invoices are issued in sequence. Allocation
+    and next-number lookups only touch the high-water mark and the last range.
+    The range starts are kept in step as a sorted list, so lookups and adds
+    bisect it instead of rebuilding it.
+    """
+
+    def __init__(self, ranges=(), high_water=0):
+        self.ranges = [list(r) for r in ranges]
+        self._starts = [r[0] for r in self.ranges]
+        self.high_water = max(high_water, self.ranges[-1][1] if self.ranges else 0)
+        self.duplicates = []
+
+    @classmethod
+    def from_value(cls, value):
+        """Build from a stored invoice_no value: range dict, legacy list, or single number"""
+        if isinstance(value, dict):
+            return cls(value.get('ranges', ()), value.get('high_water', 0))
+
+        # Legacy format: every number ever issued, in issue order
+        numbers = cls()
+        for number in value if isinstance(value, list) else [value]:
+            numbers.add(int(number))
+        return numbers
+
+    def to_value(self):
+        return {'ranges': [list(r) for r in self.ranges], 'high_water': self.high_water}
+
+    def next_number(self):
+        return self.high_water + 1
+
+    @property
+    def last(self):
+        """Most recently issued (highest) number, or None"""
+        return self.high_water or None
+
+    def allocate(self):
+        """Issue the next number"""
+        return self.reserve(1)[0]
+
+    def reserve(self, count):
+        """Issue a block of `count` consecutive numbers at once"""
+        if count < 1:
+            raise ValueError(f"invalid invoice number count {count}, expected at least 1")
+        first = self.high_water + 1
+        last = self.high_water + count
+        if self.ranges and self.ranges[-1][1] == self.high_water:
+            self.ranges[-1][1] = last
+        else:
+            self.ranges.append([first, last])
+            self._starts.append(first)
+        self.high_water = last
+        return list(range(first, last + 1))
+
+    def add(self, number):
+        """Record an already issued number (used when migrating); duplicates are collected"""
+        if number in self:
+            self.duplicates.append(number)
+            return
+        i = bisect.bisect_left(self._starts, number)
+        # Merge with the neighbouring ranges where they touch
+        joins_prev = i > 0 and self.ranges[i - 1][1] == number - 1
+        joins_next = i < len(self.ranges) and self.ranges[i][0] == number + 1
+        if joins_prev and joins_next:
+            self.ranges[i - 1][1] = self.ranges.pop(i)[1]
+            del self._starts[i]
+        elif joins_prev:
+            self.ranges[i - 1][1] = number
+        elif joins_next:
+            self.ranges[i][0] = self._starts[i] = number
+        else:
+            self.ranges.insert(i, [number, number])
+            bisect.insort(self._starts, number)
+        self.high_water = max(self.high_water, number)
+
+    def gaps(self):
+        """Missing [start, end] ranges between the first issued number and the high-water mark"""
+        return [[prev[1] + 1, cur[0] - 1] for prev, cur in zip(self.ranges, self.ranges[1:])]
+
+    def __contains__(self, number):
+        i = bisect.bisect_right(self._starts, number) - 1
+        return i >= 0 and self.ranges[i][0] <= number <= self.ranges[i][1]
+
+    def __iter__(self):
+        for start, end in self.ranges:
+            yield from range(start, end + 1)
+
+    def __len__(self):
+        return sum(end - start + 1 for start, end in self.ranges)
+
 def get_next_invoice_number(current_numbers):
     """Get the next invoice number based on the current list of numbers"""
     if not current_numbers:
         return 1
     return int(current_numbers[-1]) + 1
 
+def migrate_invoice_numbers(property_data):
+    """Convert a property's invoice_no to the range format, reporting duplicates and gaps"""
+    numbers = InvoiceNumbers.from_value(property_data['invoice_no'])
+    if not isinstance(property_data['invoice_no'], dict):
+        renter = property_data.get('to_renter', '?')
+        if numbers.duplicates:
+            logging.warning(f"Duplicate invoice numbers for {renter}: {numbers.duplicates}")
+        if numbers.gaps():
+            logging.warning(f"Gaps in invoice numbers for {renter}: {numbers.gaps()}")
+    property_data['invoice_no'] = numbers.to_value()
+    return numbers
+
 def update_invoice_numbers(property_data):
-    """Add a new invoice number to the property's invoice_no list"""
-    if not isinstance(property_data['invoice_no'], list):
-        # Convert single number to list if needed
-        property_data['invoice_no'] = [int(property_data['invoice_no'])]
-    
-    # Add next number to the sequence
-    next_number = get_next_invoice_number(property_data['invoice_no'])
-    property_data['invoice_no'].append(next_number)
-    return str(next_number)  # Return the new invoice number as string
\ No newline at end of file
+    """Issue the next invoice number for the property and store it in range form"""
+    return reserve_invoice_numbers(property_data, 1)[0]  # Return the new invoice number as string
+
+def reserve_invoice_numbers(property_data, count):
+    """Issue a block of `count` consecutive invoice numbers for the property"""
+    numbers = migrate_invoice_numbers(property_data)
+    block = numbers.reserve(count)
+    property_data['invoice_no'] = numbers.to_value()
+    return [str(n) for n in block]
@@ -0,0 +1,166 @@
+# invoice_journal.py
+#
+# Safe read-modify-write of properties_data.json when more than one process
+# uses it (two app windows, or the app and geninv). Every update holds an
+# exclusive inter-process lock on <data file>.lock; lookups hold it shared.
+# A commit first appends the changed property records to a small write-ahead
+# journal (<data file>.journal), then rewrites the data file through an
+# fsynced temp file and a rename and empties the journal. The rewritten file
+# is what makes the change durable; the journal is only fsynced when the
+# rewrite fails (a file held open on Windows, a full disk), because then it is
+# the one record of numbers the caller is about to hand out. If the process
+# dies before the rename, commit never returned, so no number was handed out.
+# Whoever next takes the lock replays the journal, so an allocated invoice
+# number is never lost or handed out twice.
+#
+# A batch run commits all of its allocations as one journal group: one fsync
+# and one rewrite of the data file however many invoices it allocates.
+
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from invoice_data import DATA_FILE, load_data, save_data, tenant_key
+
+# Fields of a property record that change when an invoice is allocated
+JOURNAL_FIELDS = ('date', 'invoice_no')
+
+@contextmanager
+def file_lock(path, shared=False):
+    """Lock on `path` shared with other processes; blocks until it is free.
+
+    An exclusive lock creates `path`. A shared lock only opens it, so readers
+    never create lock files; if there is none yet, nothing has ever written
+    under it and the reader goes ahead unlocked. Windows has no shared mode,
+    so there shared locks are exclusive too.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY if shared else os.O_RDWR | os.O_CREAT, 0o644)
+    except FileNotFoundError:
+        if not shared:
+            raise
+        yield
+        return
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            while True:
+                try:
+                    # LK_LOCK gives up after about 10 seconds; keep waiting
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+def _record_key(prop):
+    return tenant_key(prop.get('to_renter', '')), prop.get('property_address1', '')
+
+class DataFile:
+    """properties_data.json behind an inter-process lock and a write-ahead journal.
+
+    Journal lines are groups of property records as committed; replaying one
+    sets those records' fields to the logged values, so replaying a group the
+    data file already has changes nothing.
+    """
+
+    def __init__(self, data_file=DATA_FILE):
+        self.path = data_file
+        self.journal_path = data_file + '.journal'
+        self.lock_path = data_file + '.lock'
+        # flock only excludes other processes reliably; threads queue up here first
+        self._lock = threading.Lock()
+
+    def _journal_groups(self):
+        """Groups logged in the journal, in commit order; a torn last line is ignored"""
+        if not os.path.exists(self.journal_path):
+            return []
+        groups = []
+        with open(self.journal_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    groups.append(json.loads(line))
+                except ValueError:
+                    break
+        return groups
+
+    def _replay(self, data):
+        """Apply the journal to freshly loaded data; returns how many groups there were"""
+        groups = self._journal_groups()
+        if groups:
+            records = {_record_key(prop): prop for prop in data['properties']}
+            for group in groups:
+                for entry in group:
+                    prop = records.get((entry['tenant'], entry['property']))
+                    if prop is None:
+                        logging.error(f"Journal entry for unknown tenant {entry['tenant']} skipped")
+                        continue
+                    for field in JOURNAL_FIELDS:
+                        prop[field] = entry[field]
+        return len(groups)
+
+    def _checkpoint(self, data):
+        """Rewrite the data file with everything journaled, then empty the journal"""
+        try:
+            save_data(data, self.path)
+        except OSError as e:
+            # The journal still has the changes; the next commit or reader tries again
+            logging.warning(f"Could not rewrite {self.path}, keeping its journal: {str(e)}")
+            return False
+        with open(self.journal_path, 'wb'):
+            pass
+        return True
+
+    @contextmanager
+    def locked(self):
+        """Hold the lock; yields the current data, journaled changes included"""
+        with self._lock, file_lock(self.lock_path):
+            data = load_data(self.path)
+            if self._replay(data):
+                self._checkpoint(data)
+            yield data
+
+    def read(self):
+        """Current data for lookups, journaled changes included.
+
+        Holds the lock shared, so lookups only wait for a commit in progress.
+        A journal left by a failed rewrite is applied in memory; the next
+        writer folds it into the file.
+        """
+        with file_lock(self.lock_path, shared=True):
+            data = load_data(self.path)
+            self._replay(data)
+            return data
+
+    def commit(self, data, changed):
+        """Make the changes to the property records in `changed` durable (call while locked).
+
+        All of them go into the journal as one group before the data file is
+        rewritten; one fsync covers the group either way.
+        """
+        if not changed:
+            return
+        group = [{'tenant': tenant_key(prop['to_renter']), 'property': prop.get('property_address1', ''),
+                  **{field: prop[field] for field in JOURNAL_FIELDS}} for prop in changed]
+        with open(self.journal_path, 'ab') as f:
+            f.write((json.dumps(group, separators=(',', ':')) + '\n').encode('utf-8'))
+        if not self._checkpoint(data):
+            # The data file still has the old numbers; the journal must survive a crash
+            with open(self.journal_path, 'ab') as f:
+                os.fsync(f.fileno())
@@ -0,0 +1,330 @@
+# invoice_layout.py
+#
+# Declarative invoice layouts. A layout spec says where each field goes on its
+# template page; it is compiled once into a Layout (the draw plan). Fields that
+# stay the same from one of a tenant's invoices to the next (company, property
+# and bill-to details) are rendered once and cached as PDF content, so each
+# invoice only renders its date, number, line items and totals.
+#
+# Besides the built-in 'standard' layout, more can be declared in
+# invoice_layouts.json; a property record picks one with "layout": "<name>".
+#
+# Text reaches the page through one of two engines. 'reportlab' draws each
+# overlay on a reportlab canvas, which builds a complete throwaway PDF that is
+# parsed back and merged. 'direct' writes the same text operators straight
+# into a content stream with a pre-registered standard font, skipping both;
+# pages with text the font's WinAnsi encoding can't show fall back to reportlab.
+#
+# Where the strings go (static_strings/dynamic_strings) needs no PDF library,
+# so reportlab and PyPDF2 are only imported by the methods that render; the
+# live preview lays out invoices with this module without loading either.
+
+import hashlib
+import io
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+from itertools import islice
+from invoice_timing import span
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+LAYOUTS_FILE = os.path.join(APP_DIR, 'invoice_layouts.json')
+DEFAULT_LAYOUT = 'standard'
+
+# Fields redrawn on every invoice unless a spec says otherwise; the other header
+# fields are static and come from the cache
+DYNAMIC_FIELDS = ['date', 'invoice_no']
+
+# Part of every layout's version; bump it when a change to the drawing code
+# changes the pages an unchanged spec produces (cached outputs are keyed on it)
+LAYOUT_VERSION = 1
+
+# Page size every layout draws on (US letter, in points)
+PAGE_SIZE = (612, 792)
+
+# Static overlays kept per layout (one per distinct set of static values)
+STATIC_CACHE_SIZE = 256
+
+ENGINES = ('direct', 'reportlab')
+DEFAULT_ENGINE = os.environ.get('GENINV_ENGINE', 'direct')
+
+# Fonts every PDF viewer has built in, so the direct engine needs nothing embedded
+STANDARD_FONTS = {
+    'Courier', 'Courier-Bold', 'Courier-BoldOblique', 'Courier-Oblique',
+    'Helvetica', 'Helvetica-Bold', 'Helvetica-BoldOblique', 'Helvetica-Oblique',
+    'Times-Roman', 'Times-Bold', 'Times-BoldItalic', 'Times-Italic', 'Symbol', 'ZapfDingbats',
+}
+
+# Resource name the direct engine draws its font under
+DIRECT_FONT = '/GenInvF1'
+
+# Line items run down from 'top'; anything past 'per_page' rows would run into
+# the totals block, so it continues on another page
+LINE_ITEMS_PER_PAGE = 11
+
+STANDARD_LAYOUT = {
+    'font': ['Helvetica', 10],
+    'fields': {
+        'date': [345, 742],
+        'invoice_no': [380, 725],
+        'property_address1': [425, 710],
+        'property_address2': [310, 695],
+
+        # FROM section
+        'from_company': [120, 652],
+        'from_email': [105, 635],
+        'from_phone': [105, 205],
+
+        # BILL TO section
+        'to_renter': [370, 652],
+        'to_address': [370, 617],
+        'to_city_state': [378, 600],
+        'to_zip': [333, 583],
+        'to_phone': [350, 567],
+        'to_email': [350, 549],
+    },
+    'dynamic': DYNAMIC_FIELDS,
+    'totals': {
+        'subtotal': [480, 243],
+        'discount': [480, 219],
+        'fees': [480, 197],
+        'tax': [480, 174],
+        'total': [480, 152],
+    },
+    'line_items': {'top': 480, 'step': 20, 'per_page': LINE_ITEMS_PER_PAGE, 'desc_x': 60, 'amount_x': 480},
+    # Where continuation pages say the statement goes on
+    'continued': [60, 243],
+}
+
+def paginate(line_items, per_page=LINE_ITEMS_PER_PAGE):
+    """Yield (items, is_last) page chunks from any iterable without materializing it"""
+    iterator = iter(line_items)
+    chunk = list(islice(iterator, per_page))
+    while True:
+        next_chunk = list(islice(iterator, per_page))
+        yield chunk, not next_chunk
+        if not next_chunk:
+            return
+        chunk = next_chunk
+
+def _number(value):
+    """A number the way reportlab writes it: at most 6 decimals, no trailing zeros"""
+    magnitude = abs(value)
+    if magnitude <= 1e-7:
+        return '0'
+    places = 6 if magnitude <= 1 else min(max(0, 6 - int(math.log10(magnitude))), 6)
+    text = '%.*f' % (places, value)
+    if places:
+        text = text.rstrip('0').rstrip('.')
+    return text[1:] if text[0] == '0' and len(text) > 1 else text
+
+def _pdf_string(text):
+    """Text as a PDF literal string in WinAnsi; raises UnicodeEncodeError if it can't be"""
+    out = []
+    for byte in text.encode('cp1252'):
+        if byte in (0x28, 0x29, 0x5c):
+            out.append('\\' + chr(byte))
+        elif 32 <= byte < 127:
+            out.append(chr(byte))
+        else:
+            out.append('\\%03o' % byte)
+    return '(' + ''.join(out) + ')'
+
+def _content_data(page):
+    from PyPDF2.generic import ArrayObject
+
+    contents = page['/Contents']
+    if isinstance(contents, ArrayObject):
+        return b"\n".join(part.get_object().get_data() for part in contents)
+    return contents.get_data()
+
+class Layout:
+    """A layout spec compiled into a draw plan, with a cache of static overlays"""
+
+    def __init__(self, name, spec):
+        self.name = name
+        spec_hash = hashlib.sha256(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()
+        self.version = f"{LAYOUT_VERSION}-{spec_hash[:16]}"
+        self.template = spec.get('template')
+        self.font = tuple(spec['font'])
+        dynamic = set(spec.get('dynamic', DYNAMIC_FIELDS))
+        fields = [(field, x, y) for field, (x, y) in spec['fields'].items()]
+        self.static_fields = tuple(f for f in fields if f[0] not in dynamic)
+        self.dynamic_fields = tuple(f for f in fields if f[0] in dynamic)
+        self.totals = tuple((field, x, y) for field, (x, y) in spec['totals'].items())
+        items = spec['line_items']
+        self.items_top, self.items_step = items['top'], items['step']
+        self.items_per_page = items['per_page']
+        self.desc_x, self.amount_x = items['desc_x'], items['amount_x']
+        self.continued = tuple(spec['continued'])
+        self._static = OrderedDict()
+        self._lock = threading.Lock()
+
+    def template_for(self, input_pdf):
+        """The layout's own template if it names one, otherwise the caller's"""
+        if self.template:
+            return os.path.join(APP_DIR, self.template)
+        return input_pdf
+
+    def paginate(self, line_items):
+        return paginate(line_items, self.items_per_page)
+
+    def _canvas(self, packet):
+        from reportlab.pdfgen import canvas
+
+        c = canvas.Canvas(packet, pagesize=PAGE_SIZE)
+        c.setFont(*self.font)
+        return c
+
+    def static_strings(self, data):
+        """(x, y, text) for every static field in `data`"""
+        return [(x, y, str(data[field])) for field, x, y in self.static_fields if field in data]
+
+    def dynamic_strings(self, data, line_items, page_no=1, is_last=True):
+        """(x, y, text) for the dynamic fields, this page's line items and the totals"""
+        strings = [(x, y, str(data[field])) for field, x, y in self.dynamic_fields if field in data]
+
+        # This page's line items
+        y_position = self.items_top
+        for desc, amount in line_items:
+            strings.append((self.desc_x, y_position, str(desc)))
+            strings.append((self.amount_x, y_position, str(amount)))
+            y_position -= self.items_step
+
+        # Totals only go on the last page
+        if is_last:
+            strings += [(x, y, str(data[field])) for field, x, y in self.totals if field in data]
+        else:
+            strings.append((*self.continued, f"Continued on page {page_no + 1}"))
+        return strings
+
+    def draw_static(self, c, data):
+        for x, y, text in self.static_strings(data):
+            c.drawString(x, y, text)
+
+    def draw_dynamic(self, c, data, line_items, page_no=1, is_last=True):
+        for x, y, text in self.dynamic_strings(data, line_items, page_no, is_last):
+            c.drawString(x, y, text)
+
+    def render(self, data, line_items, page_no=1, is_last=True):
+        """Render one complete page of invoice text; returns the overlay PDF as a BytesIO"""
+        packet = io.BytesIO()
+        c = self._canvas(packet)
+        self.draw_static(c, data)
+        self.draw_dynamic(c, data, line_items, page_no, is_last)
+        c.save()
+        packet.seek(0)
+        return packet
+
+    def static_content(self, data):
+        """Content stream bytes of the static fields, rendered once per distinct set of values"""
+        key = tuple(str(data.get(field)) for field, _, _ in self.static_fields)
+        with self._lock:
+            if key in self._static:
+                self._static.move_to_end(key)
+                return self._static[key]
+
+        from PyPDF2 import PdfReader
+
+        packet = io.BytesIO()
+        c = self._canvas(packet)
+        self.draw_static(c, data)
+        c.save()
+        packet.seek(0)
+        content = _content_data(PdfReader(packet).pages[0])
+
+        with self._lock:
+            self._static[key] = content
+            if len(self._static) > STATIC_CACHE_SIZE:
+                self._static.popitem(last=False)
+        return content
+
+    def overlay(self, data, line_items, page_no=1, is_last=True):
+        """Overlay page for one invoice page: freshly rendered dynamic text plus the cached static text.
+
+        Drawing is timed as 'overlay_render' and reading reportlab's output
+        back as 'overlay_parse'. Both canvases only ever select the layout's font, so the static content
+        can reuse the dynamic page's font resources as is.
+        """
+        from PyPDF2 import PdfReader
+        from PyPDF2.generic import DecodedStreamObject, NameObject
+
+        with span('overlay_render'):
+            packet = io.BytesIO()
+            c = self._canvas(packet)
+            self.draw_dynamic(c, data, line_items, page_no, is_last)
+            c.save()
+        packet.seek(0)
+        with span('overlay_parse'):
+            page = PdfReader(packet).pages[0]
+
+        stream = DecodedStreamObject()
+        stream.set_data(b"q\n" + self.static_content(data) + b"\nQ\nq\n" + _content_data(page) + b"\nQ\n")
+        page[NameObject('/Contents')] = stream
+        return page
+
+    def direct_font(self):
+        """The font resource the direct engine draws with, or None if the layout's font isn't a standard one"""
+        if self.font[0] not in STANDARD_FONTS:
+            return None
+        from PyPDF2.generic import DictionaryObject, NameObject
+
+        return DictionaryObject({
+            NameObject('/Type'): NameObject('/Font'),
+            NameObject('/Subtype'): NameObject('/Type1'),
+            NameObject('/BaseFont'): NameObject('/' + self.font[0]),
+            NameObject('/Encoding'): NameObject('/WinAnsiEncoding'),
+        })
+
+    def direct_content(self, data, line_items, page_no=1, is_last=True):
+        """Content stream bytes drawing one page's text in DIRECT_FONT, or None if the direct engine can't.
+
+        The operators are the ones reportlab writes for drawString.
+        """
+        if self.font[0] not in STANDARD_FONTS:
+            return None
+        size = self.font[1]
+        lines = [f"BT {DIRECT_FONT} {_number(size)} Tf {_number(size * 1.2)} TL ET"]
+        try:
+            for x, y, text in self.static_strings(data) + self.dynamic_strings(data, line_items, page_no, is_last):
+                lines.append(f"BT 1 0 0 1 {_number(x)} {_number(y)} Tm {_pdf_string(text)} Tj T* ET")
+        except UnicodeEncodeError:
+            return None
+        return ("\n".join(lines) + "\n").encode('latin-1')
+
+    def clear(self):
+        with self._lock:
+            self._static.clear()
+
+def load_specs(path=None):
+    """Layout specs by name: the built-in standard layout plus any declared in `path`"""
+    path = path or LAYOUTS_FILE
+    specs = {DEFAULT_LAYOUT: STANDARD_LAYOUT}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            specs.update(json.load(f))
+    return specs
+
+_layouts = {}
+_layouts_lock = threading.Lock()
+
+def get_layout(name=None):
+    """Compiled layout by name (default: standard); each spec is compiled once per process"""
+    name = name or DEFAULT_LAYOUT
+    with _layouts_lock:
+        if name not in _layouts:
+            specs = load_specs()
+            if name not in specs:
+                raise KeyError(f"Unknown invoice layout '{name}'")
+            _layouts[name] = Layout(name, specs[name])
+        return _layouts[name]
+
+def layout_for(data):
+    """The compiled layout an invoice record asks for"""
+    return get_layout(data.get('layout'))
+
+def clear_layouts():
+    with _layouts_lock:
+        _layouts.clear()
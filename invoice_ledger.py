@@ -0,0 +1,198 @@
+# invoice_ledger.py
+
+import os
+import json
+import struct
+import threading
+from datetime import datetime
+from invoice_data import tenant_key, parse_billing_date, history_key, stored_amounts
+from invoice_journal import file_lock
+
+# Append-only ledger: one JSON record per generated invoice
+LEDGER_FILE = 'invoice_ledger.jsonl'
+
+# Sidecar index entry: billing date ordinal (uint32) + byte offset of the record (uint64)
+INDEX_ENTRY = struct.Struct('<IQ')
+
+# Invoice fields copied into each ledger record
+RECORD_FIELDS = ('line_items', 'subtotal', 'discount', 'fees', 'tax', 'total')
+
+def ledger_record(invoice_data, output_pdf=None, template_hash=None):
+    """Build the ledger record for one generated invoice"""
+    record = {
+        'invoice_no': int(invoice_data['invoice_no']),
+        'date': invoice_data['date'],
+        'property': invoice_data.get('property_address1', ''),
+        'tenant': tenant_key(invoice_data.get('to_renter', '')),
+    }
+    for field in RECORD_FIELDS:
+        if field in invoice_data:
+            record[field] = stored_amounts(invoice_data[field])
+    record['output_pdf'] = output_pdf
+    record['template_hash'] = template_hash
+    record['generated_at'] = datetime.now().isoformat(timespec='seconds')
+    return record
+
+def history_row(record):
+    """History panel row for a ledger record"""
+    return {
+        'date': record['date'],
+        'invoice_no': record['invoice_no'],
+        'property': record['property'],
+        'tenant': record['tenant'],
+        'amount': record.get('total', '')
+    }
+
+class InvoiceLedger:
+    """Append-only record of every generated invoice.
+
+    Each invoice is one line appended to the ledger file, so writes cost the
+    same however long the history gets. A fixed-size sidecar index keeps the
+    billing date and byte offset of every record for seeking by date range.
+    Records are never rewritten; they keep the data the invoice was made with.
+    """
+
+    def __init__(self, path=LEDGER_FILE):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.history_path = path + '.history'
+        self.lock_path = path + '.lock'
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def subscribe(self, listener):
+        """Call `listener(offset, end_offset, record)` after each record this ledger object appends"""
+        self._listeners.append(listener)
+
+    def _write(self, records):
+        """Append records and their index entries (call while locked); returns (offset, end_offset, record) of each"""
+        written = []
+        offset = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        with open(self.path, 'ab') as f, open(self.index_path, 'ab') as index:
+            for record in records:
+                line = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+                entry = INDEX_ENTRY.pack(parse_billing_date(record['date']).toordinal(), offset)
+                f.write(line)
+                index.write(entry)
+                written.append((offset, offset + len(line), record))
+                offset += len(line)
+        return written
+
+    def _notify(self, written):
+        for offset, end_offset, record in written:
+            for listener in self._listeners:
+                listener(offset, end_offset, record)
+
+    def append(self, record):
+        """Append one record and its index entry.
+
+        The lock file keeps another process's append from landing between the
+        offset being read and the index entry being written.
+        """
+        with self._lock, file_lock(self.lock_path):
+            written = self._write([record])
+        self._notify(written)
+
+    def seed(self, history):
+        """Start a new ledger from the history rows (oldest first) `history()` returns.
+
+        Does nothing if the ledger already exists; the check and the seeding
+        hold the lock together, so two processes starting at once can't both
+        seed it. Returns whether it seeded. Older invoices only kept their
+        number, date, property, tenant and amount.
+        """
+        with self._lock, file_lock(self.lock_path):
+            if self.exists():
+                return False
+            records = [{
+                'invoice_no': int(row['invoice_no']),
+                'date': row['date'],
+                'property': row['property'],
+                'tenant': row['tenant'],
+                'total': row['amount'],
+                'output_pdf': None,
+                'template_hash': None,
+                'generated_at': None
+            } for row in history()]
+            written = self._write(records)
+        self._notify(written)
+        return True
+
+    def records(self):
+        """Stream every record in the order they were generated"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    __iter__ = records
+
+    def tail(self, offset=0):
+        """Stream (end_offset, record) for the records written at or after byte `offset`"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                offset += len(line)
+                # A partly written last line is picked up on a later call
+                if not line.endswith(b'\n'):
+                    return
+                if line.strip():
+                    yield offset, json.loads(line)
+
+    def between(self, start, end):
+        """Stream the records whose billing date falls within [start, end] (dates or datetimes)"""
+        if not os.path.exists(self.index_path):
+            return
+        first, last = start.toordinal(), end.toordinal()
+        with open(self.index_path, 'rb') as f:
+            index = f.read()
+
+        with open(self.path, 'rb') as f:
+            for ordinal, offset in INDEX_ENTRY.iter_unpack(index[:len(index) - len(index) % INDEX_ENTRY.size]):
+                if first <= ordinal <= last:
+                    f.seek(offset)
+                    yield json.loads(f.readline())
+
+    def history(self):
+        """History rows for every ledger record, newest first"""
+        rows = [history_row(record) for record in self.records()]
+        rows.sort(key=history_key, reverse=True)
+        return rows
+
+    def cached_history(self):
+        """History rows, newest first, from the snapshot the last call saved plus any newer records"""
+        rows, offset = [], 0
+        size = os.path.getsize(self.path) if self.exists() else 0
+        try:
+            with open(self.history_path, 'r') as f:
+                snapshot = json.load(f)
+            # A snapshot that runs past the end of the ledger belongs to a replaced ledger
+            if snapshot['offset'] <= size:
+                rows, offset = snapshot['rows'], snapshot['offset']
+        except (OSError, ValueError, KeyError):
+            pass
+
+        new_rows = []
+        for offset, record in self.tail(offset):
+            new_rows.append(history_row(record))
+        if new_rows or not os.path.exists(self.history_path):
+            rows.extend(new_rows)
+            rows.sort(key=history_key, reverse=True)
+            temp_path = self.history_path + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump({'offset': offset, 'rows': rows}, f, separators=(',', ':'))
+            os.replace(temp_path, self.history_path)
+        return rows
+
+def open_ledger(store, path=LEDGER_FILE):
+    """Open the ledger, seeding it from the store's history the first time"""
+    ledger = InvoiceLedger(path)
+    ledger.seed(lambda: reversed(store.history()))
+    return ledger
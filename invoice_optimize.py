@@ -0,0 +1,315 @@
+# invoice_optimize.py
+#
+# Output optimization for generated PDFs. PdfWriter writes content streams
+# uncompressed and keeps every object it was handed, so a finished file is
+# re-read here and written back with:
+#
+#   compress     - flate-compress streams that have no filter
+#   dedupe       - merge byte-identical objects (fonts, font descriptors, ...)
+#   drop_unused  - drop /Font, /XObject and /ExtGState entries no content uses
+#   drop_fields  - drop the template's blank text field widgets; the invoice
+#                  text is drawn on the page, so they show nothing, but their
+#                  appearances carry the form's embedded font
+#
+# Objects nothing refers to any more are left out and the rest renumbered.
+
+import hashlib
+import io
+import logging
+import os
+from PyPDF2 import PdfReader
+from PyPDF2.generic import (ArrayObject, ContentStream, DecodedStreamObject, DictionaryObject,
+                            IndirectObject, NameObject, NumberObject, StreamObject)
+from invoice_timing import span
+
+OPTIMIZATIONS = ('compress', 'dedupe', 'drop_unused', 'drop_fields')
+
+# Resource categories that are pruned, by the content operator that uses them
+RESOURCE_OPERATORS = {b'Tf': '/Font', b'Do': '/XObject', b'gs': '/ExtGState'}
+
+def _key(ref):
+    return (ref.idnum, ref.generation)
+
+def _children(obj):
+    """Values held directly by a dictionary/array (references are not followed)"""
+    if isinstance(obj, DictionaryObject):
+        return dict.values(obj)
+    if isinstance(obj, ArrayObject):
+        return list.__iter__(obj)
+    return ()
+
+def _references(obj):
+    """Every indirect reference reachable from obj without leaving it"""
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, IndirectObject):
+            yield item
+        else:
+            stack.extend(_children(item))
+
+def _replace_references(obj, mapping):
+    """Point references to merged objects at the object they were merged into"""
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, DictionaryObject):
+            for name, value in dict.items(item):
+                if isinstance(value, IndirectObject) and _key(value) in mapping:
+                    dict.__setitem__(item, name, mapping[_key(value)])
+                else:
+                    stack.append(value)
+        elif isinstance(item, ArrayObject):
+            for i, value in enumerate(list.__iter__(item)):
+                if isinstance(value, IndirectObject) and _key(value) in mapping:
+                    list.__setitem__(item, i, mapping[_key(value)])
+                else:
+                    stack.append(value)
+
+class _Document:
+    """The object graph of a PDF held as {(idnum, generation): object}"""
+
+    def __init__(self, content):
+        self.reader = PdfReader(io.BytesIO(content))
+        self.header = self.reader.pdf_header
+        trailer = self.reader.trailer
+        self.roots = {name: dict.__getitem__(trailer, name)
+                      for name in ('/Root', '/Info') if name in trailer}
+        self.id = trailer.get('/ID')
+        self.objects = {}
+        pending = list(self.roots.values())
+        while pending:
+            ref = pending.pop()
+            if _key(ref) in self.objects:
+                continue
+            obj = self.reader.get_object(ref)
+            self.objects[_key(ref)] = obj
+            pending.extend(_references(obj))
+
+    def resolve(self, obj):
+        if isinstance(obj, IndirectObject):
+            return self.objects.get(_key(obj))
+        return obj
+
+    def page_references(self):
+        stack = [dict.__getitem__(self.resolve(self.roots['/Root']), '/Pages')]
+        while stack:
+            ref = stack.pop()
+            node = self.resolve(ref)
+            if node.get('/Type') == '/Pages':
+                stack.extend(reversed(list(self.resolve(dict.__getitem__(node, '/Kids')))))
+            else:
+                yield ref
+
+    def pages(self):
+        for ref in self.page_references():
+            yield self.resolve(ref)
+
+    def compress(self):
+        """Flate-compress every stream that is stored without a filter"""
+        for key, obj in self.objects.items():
+            if not isinstance(obj, StreamObject) or '/Filter' in obj:
+                continue
+            stream = DecodedStreamObject()
+            stream.set_data(obj.get_data())
+            encoded = stream.flate_encode()
+            if len(encoded._data) >= len(obj.get_data()):
+                continue
+            for name, value in dict.items(obj):
+                if name not in ('/Length', '/Filter'):
+                    dict.__setitem__(encoded, name, value)
+            self.objects[key] = encoded
+
+    def dedupe(self):
+        """Merge identical objects until no two are left the same; pages are never merged"""
+        while True:
+            seen = {}
+            mapping = {}
+            for key, obj in self.objects.items():
+                if isinstance(obj, DictionaryObject) and obj.get('/Type') in ('/Page', '/Pages', '/Catalog'):
+                    continue
+                buffer = io.BytesIO()
+                obj.write_to_stream(buffer, None)
+                digest = hashlib.sha256(buffer.getvalue()).digest()
+                if digest in seen:
+                    mapping[key] = IndirectObject(*seen[digest], None)
+                else:
+                    seen[digest] = key
+            if not mapping:
+                return
+            for obj in self.objects.values():
+                _replace_references(obj, mapping)
+            for key in mapping:
+                del self.objects[key]
+
+    def _content_data(self, contents):
+        contents = self.resolve(contents)
+        if isinstance(contents, ArrayObject):
+            return b"\n".join(self.resolve(part).get_data() for part in list.__iter__(contents))
+        return contents.get_data()
+
+    def _collect_used(self, resources, data, used, visited):
+        """Record the resource names `data` uses in each of the resource dictionaries' categories"""
+        categories = {category: self.resolve(resources.get(category)) if resources else None
+                      for category in RESOURCE_OPERATORS.values()}
+        for category in categories.values():
+            if isinstance(category, DictionaryObject):
+                used.setdefault(id(category), (category, set()))
+
+        try:
+            stream = DecodedStreamObject()
+            stream.set_data(data)
+            operations = ContentStream(stream, None).operations
+        except Exception as e:
+            # Can't tell what this content uses: keep everything it can see
+            logging.warning(f"Could not parse content stream, keeping its resources: {str(e)}")
+            for category in categories.values():
+                if isinstance(category, DictionaryObject):
+                    used[id(category)] = (category, None)
+            return
+
+        for operands, operator in operations:
+            category_name = RESOURCE_OPERATORS.get(operator)
+            if not category_name or not operands:
+                continue
+            category = categories[category_name]
+            if not isinstance(category, DictionaryObject):
+                continue
+            names = used[id(category)][1]
+            if names is not None:
+                names.add(operands[0])
+
+            # Forms draw with resources of their own (or their user's, if they have none)
+            if operator == b'Do':
+                form = self.resolve(dict.get(category, operands[0]))
+                if (isinstance(form, StreamObject) and form.get('/Subtype') == '/Form'
+                        and id(form) not in visited):
+                    visited.add(id(form))
+                    form_resources = self.resolve(form.get('/Resources')) or resources
+                    self._collect_used(form_resources, form.get_data(), used, visited)
+
+    def drop_unused(self):
+        """Remove resource entries that no page or form content refers to"""
+        used = {}
+        visited = set()
+        for page in self.pages():
+            resources = self.resolve(page.get('/Resources'))
+            if '/Contents' in page and isinstance(resources, DictionaryObject):
+                self._collect_used(resources, self._content_data(dict.__getitem__(page, '/Contents')),
+                                   used, visited)
+        for category, names in used.values():
+            if names is None:
+                continue
+            for name in [name for name in category if name not in names]:
+                del category[name]
+
+    def _blank_field(self, annotation):
+        """Whether an annotation is a text field widget with no value (inherited from its parents too)"""
+        if not isinstance(annotation, DictionaryObject) or annotation.get('/Subtype') != '/Widget':
+            return False
+        field_type = value = None
+        field = annotation
+        while isinstance(field, DictionaryObject):
+            field_type = field_type or field.get('/FT')
+            value = value if value is not None else self.resolve(field.get('/V'))
+            field = self.resolve(field.get('/Parent'))
+        return field_type == '/Tx' and not str(value or '').strip()
+
+    def drop_fields(self):
+        """Remove blank text field widgets from the pages of a document without an interactive form.
+
+        With no /AcroForm the widgets aren't working fields, and a blank one
+        draws nothing; its appearance and the font that goes with it go too.
+        The annotations kept are pointed back at the page they are on: PdfWriter
+        leaves their /P on a copy of the template's page, which would keep every
+        dropped widget reachable.
+        """
+        if '/AcroForm' in self.resolve(self.roots['/Root']):
+            return
+        for page_ref in self.page_references():
+            page = self.resolve(page_ref)
+            annotations = self.resolve(page.get('/Annots'))
+            if not isinstance(annotations, ArrayObject):
+                continue
+            kept = [ref for ref in list.__iter__(annotations) if not self._blank_field(self.resolve(ref))]
+            for ref in kept:
+                annotation = self.resolve(ref)
+                if isinstance(annotation, DictionaryObject) and '/P' in annotation:
+                    dict.__setitem__(annotation, NameObject('/P'), page_ref)
+            if len(kept) == len(annotations):
+                continue
+            if kept:
+                dict.__setitem__(page, NameObject('/Annots'), ArrayObject(kept))
+            else:
+                dict.__delitem__(page, '/Annots')
+
+    def write(self):
+        """Serialize the objects still reachable from the trailer, renumbered from 1"""
+        order = []
+        numbers = {}
+        pending = list(self.roots.values())
+        while pending:
+            ref = pending.pop(0)
+            if _key(ref) in numbers:
+                continue
+            numbers[_key(ref)] = len(order) + 1
+            order.append(self.objects[_key(ref)])
+            pending.extend(_references(self.objects[_key(ref)]))
+
+        mapping = {key: IndirectObject(number, 0, None) for key, number in numbers.items()}
+        for obj in order:
+            _replace_references(obj, mapping)
+
+        out = io.BytesIO()
+        out.write(self.header.encode() + b"\n%\xE2\xE3\xCF\xD3\n")
+        positions = []
+        for number, obj in enumerate(order, 1):
+            positions.append(out.tell())
+            out.write(f"{number} 0 obj\n".encode())
+            obj.write_to_stream(out, None)
+            out.write(b"\nendobj\n")
+
+        xref = out.tell()
+        out.write(f"xref\n0 {len(order) + 1}\n0000000000 65535 f \n".encode())
+        for position in positions:
+            out.write(f"{position:010d} 00000 n \n".encode())
+        trailer = DictionaryObject({NameObject('/Size'): NumberObject(len(order) + 1)})
+        for name, ref in self.roots.items():
+            trailer[NameObject(name)] = mapping[_key(ref)]
+        if self.id is not None:
+            trailer[NameObject('/ID')] = self.id
+        out.write(b"trailer\n")
+        trailer.write_to_stream(out, None)
+        out.write(f"\nstartxref\n{xref}\n%%EOF\n".encode())
+        return out.getvalue()
+
+def optimize_pdf(content, optimizations=OPTIMIZATIONS):
+    """Optimized copy of the PDF bytes `content`, applying the named optimizations"""
+    document = _Document(content)
+    if 'drop_fields' in optimizations:
+        document.drop_fields()
+    if 'drop_unused' in optimizations:
+        document.drop_unused()
+    if 'compress' in optimizations:
+        document.compress()
+    if 'dedupe' in optimizations:
+        document.dedupe()
+    return document.write()
+
+def optimize_file(path, optimizations=OPTIMIZATIONS):
+    """Optimize a written PDF in place; returns (bytes_before, bytes_after).
+
+    The file is only replaced when the optimized copy is smaller.
+    """
+    with span('pdf_optimize'):
+        with open(path, 'rb') as f:
+            content = f.read()
+        optimized = optimize_pdf(content, optimizations)
+        if len(optimized) >= len(content):
+            return len(content), len(content)
+
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(optimized)
+        os.replace(temp_path, path)
+        return len(content), len(optimized)
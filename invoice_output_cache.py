@@ -0,0 +1,174 @@
+# invoice_output_cache.py
+#
+# Content-addressed cache of rendered invoice PDFs. The key covers everything
+# that decides the bytes fill_invoice writes: the template's hash, the layout's
+# version, the text engine and a canonical hash of the invoice fields the
+# layout draws. A hit hard-links (or, across filesystems, copies) the stored
+# PDF to the output path instead of rendering it again. The invoice number is
+# one of the drawn fields, so hits come from reprints of an issued invoice;
+# every generate or batch run allocates fresh numbers and only stores.
+#
+# Entries live under <dir>/<key[:2]>/<key>.pdf; a hit bumps the entry's mtime,
+# so the oldest mtimes are the least recently used and go first once the
+# cache is over its size cap. <dir>/stats.json keeps the hit/miss counters and
+# a running byte total, so the entries are only listed when eviction is due.
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from invoice_journal import file_lock
+
+# Cap on the stored PDFs unless told otherwise (bytes)
+OUTPUT_CACHE_SIZE = 256 * 1024 * 1024
+
+def _empty_stats():
+    return {'hits': 0, 'misses': 0, 'bytes': 0}
+
+def canonical_fields(layout, data):
+    """The invoice fields `layout` draws, as strings, in a form that hashes the same for the same page"""
+    fields = {}
+    for field, _, _ in layout.static_fields + layout.dynamic_fields + layout.totals:
+        if field in data:
+            fields[field] = str(data[field])
+    fields['line_items'] = [[str(desc), str(amount)] for desc, amount in data.get('line_items', ())]
+    return fields
+
+class OutputCache:
+    """Rendered invoice PDFs keyed by what went into them, with an LRU size cap.
+
+    Safe to share between processes: entries are written through a temp file
+    and a rename, and the counters are updated under a lock file.
+    """
+
+    def __init__(self, path, max_bytes=OUTPUT_CACHE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats_path = os.path.join(path, 'stats.json')
+        self.lock_path = os.path.join(path, '.lock')
+
+    def key(self, template_hash, layout, engine, data):
+        """Cache key for rendering `data` with `layout` and `engine` on the template with `template_hash`"""
+        canonical = json.dumps([template_hash, layout.version, engine, canonical_fields(layout, data)],
+                               sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.path, key[:2], key + '.pdf')
+
+    def _update(self, reset=None, **changes):
+        """Set the counters in `reset`, then add `changes`; returns the new stats"""
+        os.makedirs(self.path, exist_ok=True)
+        with file_lock(self.lock_path):
+            stats = self.stats()
+            stats.update(reset or {})
+            for field, change in changes.items():
+                stats[field] += change
+            temp_path = self.stats_path + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(stats, f)
+            os.replace(temp_path, self.stats_path)
+            return stats
+
+    def stats(self):
+        """{'hits', 'misses', 'bytes'} so far; bytes is the running total of what was stored"""
+        try:
+            with open(self.stats_path, 'r') as f:
+                return dict(_empty_stats(), **json.load(f))
+        except (OSError, ValueError):
+            return _empty_stats()
+
+    @staticmethod
+    def _place(source, target):
+        """Put `source` at `target` as a hard link if possible, else a copy; replaces whatever was there"""
+        temp_path = f"{target}.{os.getpid()}.tmp"
+        try:
+            os.link(source, temp_path)
+        except OSError:
+            shutil.copyfile(source, temp_path)
+        os.replace(temp_path, target)
+
+    def fetch(self, key, output_pdf):
+        """Put the cached PDF for `key` at `output_pdf`; returns False on a miss"""
+        entry = self._entry(key)
+        try:
+            self._place(entry, output_pdf)
+            os.utime(entry)
+        except OSError:
+            self._update(misses=1)
+            return False
+        self._update(hits=1)
+        return True
+
+    def store(self, key, output_pdf):
+        """Keep the freshly written `output_pdf` under `key`, evicting old entries if over the cap"""
+        entry = self._entry(key)
+        try:
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            self._place(output_pdf, entry)
+        except OSError as e:
+            # The invoice itself is fine; it just won't be cached
+            logging.warning(f"Could not cache {output_pdf}: {str(e)}")
+            return
+        if self._update(bytes=os.path.getsize(entry))['bytes'] > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        """(mtime, size, path) of every stored PDF"""
+        found = []
+        try:
+            shards = [entry.path for entry in os.scandir(self.path) if entry.is_dir()]
+        except OSError:
+            return found
+        for shard in shards:
+            for entry in os.scandir(shard):
+                if entry.name.endswith('.pdf'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    found.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return found
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits its cap; returns how many went"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # Another process evicted it first
+                continue
+            total -= size
+            removed += 1
+        # Resync the running total with what is really there
+        self._update(reset={'bytes': total})
+        return removed
+
+    def size(self):
+        """(entry count, bytes) currently stored"""
+        entries = self.entries()
+        return len(entries), sum(size for _, size, _ in entries)
+
+    def purge(self):
+        """Remove every stored PDF and reset the counters; returns how many entries went"""
+        removed = 0
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                continue
+        if os.path.isdir(self.path):
+            self._update(reset=_empty_stats())
+        return removed
+
+def default_output_cache():
+    """The cache named by $GENINV_OUTPUT_CACHE, or None when caching is off"""
+    path = os.environ.get('GENINV_OUTPUT_CACHE')
+    return OutputCache(path) if path else None
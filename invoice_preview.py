@@ -0,0 +1,161 @@
+# invoice_preview.py
+#
+# Live preview of the invoice the current selection would produce. The first
+# page is drawn on a Tk canvas with the strings and positions fill_invoice
+# uses, over a low-resolution raster of the template that is made once per
+# template (by whichever of pdftoppm, Ghostscript or mutool is installed) and
+# cached on disk. Nothing here imports the PDF stack or reads the data file:
+# records come from a snapshot the app loads in the background, and no invoice
+# number is allocated.
+
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import tkinter as tk
+from invoice_charges import RATES_FILE, price_invoices
+from invoice_data import format_billing_date
+from invoice_layout import PAGE_SIZE, layout_for
+
+# Preview size relative to the page (1.0 = one pixel per point)
+PREVIEW_SCALE = 0.45
+
+# Wait this long after the last change before redrawing, so scrolling through
+# dates or tenants redraws once (ms)
+PREVIEW_DELAY = 30
+
+# Where template rasters are kept, named by template hash and resolution
+PREVIEW_CACHE_DIR = 'preview_cache'
+
+def _pdftoppm(exe, pdf, out, dpi):
+    # pdftoppm adds the .png itself
+    return [exe, '-png', '-r', str(dpi), '-f', '1', '-l', '1', '-singlefile', pdf, out[:-len('.png')]]
+
+def _ghostscript(exe, pdf, out, dpi):
+    return [exe, '-q', '-dSAFER', '-dBATCH', '-dNOPAUSE', '-sDEVICE=png16m', f'-r{dpi}',
+            '-dFirstPage=1', '-dLastPage=1', f'-sOutputFile={out}', pdf]
+
+def _mutool(exe, pdf, out, dpi):
+    return [exe, 'draw', '-q', '-r', str(dpi), '-o', out, pdf, '1']
+
+# Rasterizers tried in order: (executable, command builder)
+RASTERIZERS = (
+    ('pdftoppm', _pdftoppm),
+    ('gs', _ghostscript),
+    ('gswin64c', _ghostscript),
+    ('mutool', _mutool),
+)
+
+def raster_dpi(scale=PREVIEW_SCALE):
+    return max(1, round(72 * scale))
+
+def template_raster(template_path, dpi=None, cache_dir=PREVIEW_CACHE_DIR):
+    """PNG of the template's first page at `dpi`, made once and cached; None if it can't be made.
+
+    Slow the first time (runs an external rasterizer), so call it off the Tk thread.
+    """
+    dpi = dpi or raster_dpi()
+    try:
+        with open(template_path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+    except OSError as e:
+        logging.error(f"Error reading template {template_path}: {str(e)}")
+        return None
+    raster = os.path.join(cache_dir, f"{digest[:16]}-{dpi}.png")
+    if os.path.exists(raster):
+        return raster
+
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_path = os.path.join(cache_dir, f"{digest[:16]}-{dpi}.tmp.png")
+    for name, command in RASTERIZERS:
+        exe = shutil.which(name)
+        if exe is None:
+            continue
+        try:
+            subprocess.run(command(exe, os.path.abspath(template_path), temp_path, dpi),
+                           capture_output=True, timeout=60, check=True)
+            os.replace(temp_path, raster)
+            return raster
+        except (OSError, subprocess.SubprocessError) as e:
+            logging.warning(f"{name} could not rasterize {template_path}: {str(e)}")
+    logging.warning(f"No rasterizer for {template_path}; the preview shows a blank page")
+    return None
+
+def preview_data(record, billing_date, rates_file=RATES_FILE):
+    """What the invoice for `record` would contain on `billing_date` (a copy; the record is untouched)"""
+    invoice_data = dict(record)
+    invoice_data['date'] = format_billing_date(billing_date)
+    price_invoices([invoice_data], billing_date, rates_file)
+    return invoice_data
+
+def page_strings(invoice_data):
+    """(x, y, text) for everything fill_invoice draws on the first page"""
+    layout = layout_for(invoice_data)
+    line_items, is_last = next(layout.paginate(invoice_data.get('line_items', ())))
+    return layout.static_strings(invoice_data) + layout.dynamic_strings(invoice_data, line_items, 1, is_last)
+
+def _tk_font(name, size, scale):
+    """Tk font closest to a standard PDF font, sized in pixels"""
+    family = {'Times': 'Times', 'Courier': 'Courier'}.get(name.split('-')[0], 'Helvetica')
+    style = name.split('-')[1].lower() if '-' in name else ''
+    font = (family, -max(1, round(size * scale)))
+    if 'bold' in style:
+        font += ('bold',)
+    if 'oblique' in style or 'italic' in style:
+        font += ('italic',)
+    return font
+
+class InvoicePreview(tk.Canvas):
+    """Canvas showing an invoice's first page at `scale`.
+
+    show() only replaces the text items; each template's raster is loaded into
+    a PhotoImage once. `request_template(path)` is called for templates without
+    a raster yet; the owner makes one off the Tk thread and hands it to set_template.
+    """
+
+    def __init__(self, master, scale=PREVIEW_SCALE, request_template=None, **kwargs):
+        self.scale = scale
+        width, height = (round(side * scale) for side in PAGE_SIZE)
+        super().__init__(master, width=width, height=height, background='white', highlightthickness=0, **kwargs)
+        self.request_template = request_template
+        self._images = {}     # template path -> PhotoImage, or None when it has no raster
+        self._template = None
+
+    def set_template(self, template_path, raster):
+        """Attach the raster made for `template_path` (None: show it as a blank page)"""
+        image = None
+        if raster:
+            try:
+                image = tk.PhotoImage(master=self, file=raster)
+            except tk.TclError as e:
+                logging.error(f"Error loading preview raster {raster}: {str(e)}")
+        self._images[template_path] = image
+        if template_path == self._template:
+            self._draw_template()
+
+    def _draw_template(self):
+        self.delete('template')
+        image = self._images.get(self._template)
+        if image is not None:
+            self.create_image(0, 0, anchor='nw', image=image, tags='template')
+            self.tag_lower('template')
+
+    def show(self, invoice_data, template_path):
+        """Draw `invoice_data` over its template (its layout's own, else `template_path`); None clears the text"""
+        if invoice_data is not None:
+            template_path = layout_for(invoice_data).template_for(template_path)
+        if template_path != self._template:
+            self._template = template_path
+            self._draw_template()
+            if template_path not in self._images and self.request_template:
+                self.request_template(template_path)
+
+        self.delete('text')
+        if invoice_data is None:
+            return
+        font = _tk_font(*layout_for(invoice_data).font, self.scale)
+        page_height = PAGE_SIZE[1]
+        for x, y, text in page_strings(invoice_data):
+            self.create_text(x * self.scale, (page_height - y) * self.scale, text=text, anchor='sw',
+                             font=font, fill='black', tags='text')
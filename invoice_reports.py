@@ -0,0 +1,208 @@
+# invoice_reports.py
+#
+# Revenue reporting kept as running aggregates over the invoice ledger, in
+# integer cents: per property per month, per tenant per year, and what is
+# still outstanding per tenant. Each invoice updates a handful of counters,
+# and the aggregates are saved as a small snapshot along with how far into
+# the ledger they go, so opening the reports only replays newer records.
+# Reports opened on a ledger follow it, so invoices appended through that
+# ledger are counted as they are generated. Which invoices are open is kept
+# as each tenant's issued and paid invoice-number ranges, not one entry per
+# unpaid invoice, so the snapshot stays small however much is outstanding.
+
+import csv
+import json
+import os
+import threading
+from invoice_data import parse_cents, format_cents, parse_billing_date
+from invoice_handler import InvoiceNumbers
+
+REPORTS_FILE = 'invoice_reports.json'
+
+# Columns of the streaming invoice CSV export
+CSV_COLUMNS = ('date', 'invoice_no', 'property', 'tenant', 'total_cents', 'total', 'paid')
+
+def _bump(totals, key, cents, count=1):
+    entry = totals.setdefault(key, [0, 0])
+    entry[0] += count
+    entry[1] += cents
+    if entry[0] == 0 and entry[1] == 0:
+        del totals[key]
+
+class InvoiceReports:
+    """Incremental revenue aggregates; every query is answered from memory.
+
+    Totals are [count, cents] pairs. Invoice numbers are only unique per
+    tenant, so issued and paid numbers are kept per tenant as compact
+    invoice-number ranges; an invoice is open when it is issued and not
+    paid. Payments are recorded with mark_paid and survive a rebuild from
+    the ledger.
+    """
+
+    def __init__(self, path=REPORTS_FILE):
+        self.path = path
+        self.ledger = None
+        self._lock = threading.RLock()
+        self._reset()
+        self.paid = {}
+
+    def _reset(self):
+        self.by_property_month = {}
+        self.by_tenant_year = {}
+        self.outstanding = {}
+        self.issued = {}
+        self.ledger_offset = 0
+
+    def load(self):
+        """Load the saved snapshot, if there is one; returns whether it was found"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'r') as f:
+            snapshot = json.load(f)
+        with self._lock:
+            self.paid = {tenant: InvoiceNumbers.from_value(value) for tenant, value in snapshot['paid'].items()}
+            if 'issued' not in snapshot:
+                # Older snapshot format: keep the payments and rebuild the rest from the ledger
+                self._reset()
+                return False
+            self.by_property_month = snapshot['by_property_month']
+            self.by_tenant_year = snapshot['by_tenant_year']
+            self.outstanding = snapshot['outstanding']
+            self.issued = {tenant: InvoiceNumbers.from_value(value) for tenant, value in snapshot['issued'].items()}
+            self.ledger_offset = snapshot['ledger_offset']
+        return True
+
+    def save(self):
+        """Write the snapshot atomically"""
+        with self._lock:
+            snapshot = {
+                'ledger_offset': self.ledger_offset,
+                'by_property_month': self.by_property_month,
+                'by_tenant_year': self.by_tenant_year,
+                'outstanding': self.outstanding,
+                'issued': {tenant: numbers.to_value() for tenant, numbers in self.issued.items()},
+                'paid': {tenant: numbers.to_value() for tenant, numbers in self.paid.items()},
+            }
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(snapshot, f, separators=(',', ':'))
+            os.replace(temp_path, self.path)
+
+    def add(self, record):
+        """Fold one ledger record into the aggregates"""
+        cents = parse_cents(record.get('total') or 0)
+        billed = parse_billing_date(record['date'])
+        property_name, tenant = record['property'], record['tenant']
+        invoice_no = int(record['invoice_no'])
+        with self._lock:
+            _bump(self.by_property_month.setdefault(property_name, {}), billed.strftime('%Y-%m'), cents)
+            _bump(self.by_tenant_year.setdefault(tenant, {}), billed.strftime('%Y'), cents)
+            issued = self.issued.setdefault(tenant, InvoiceNumbers())
+            if invoice_no not in issued and not self.is_paid(tenant, invoice_no):
+                _bump(self.outstanding, tenant, cents)
+            issued.add(invoice_no)
+
+    def follow(self, ledger):
+        """Count every record appended through `ledger` as it is written"""
+        self.ledger = ledger
+        ledger.subscribe(self._appended)
+
+    def _appended(self, offset, end_offset, record):
+        with self._lock:
+            if offset == self.ledger_offset:
+                self.add(record)
+                self.ledger_offset = end_offset
+            elif offset > self.ledger_offset:
+                # Another process appended in between; pick its records up too
+                self.sync(self.ledger)
+
+    def sync(self, ledger):
+        """Fold in the ledger records written since the last sync; returns how many there were"""
+        self.ledger = ledger
+        with self._lock:
+            if self.ledger_offset > (os.path.getsize(ledger.path) if ledger.exists() else 0):
+                # The ledger was replaced: start over
+                self._reset()
+            added = 0
+            for offset, record in ledger.tail(self.ledger_offset):
+                self.add(record)
+                self.ledger_offset = offset
+                added += 1
+            return added
+
+    def is_paid(self, tenant, invoice_no):
+        with self._lock:
+            return tenant in self.paid and int(invoice_no) in self.paid[tenant]
+
+    def is_open(self, tenant, invoice_no):
+        with self._lock:
+            return int(invoice_no) in self.issued.get(tenant, ()) and not self.is_paid(tenant, invoice_no)
+
+    def _amount(self, tenant, invoice_no):
+        """Cents the tenant's first ledger record for `invoice_no` was counted with"""
+        for record in self.ledger.records() if self.ledger else ():
+            if record['tenant'] == tenant and int(record['invoice_no']) == invoice_no:
+                return parse_cents(record.get('total') or 0)
+        return 0
+
+    def mark_paid(self, tenant, invoice_no):
+        """Record a payment; returns False if the tenant has no such outstanding invoice.
+
+        The amount is read back from the ledger, which this streams through
+        once; payments are rare next to invoices.
+        """
+        invoice_no = int(invoice_no)
+        with self._lock:
+            if not self.is_open(tenant, invoice_no):
+                return False
+            _bump(self.outstanding, tenant, -self._amount(tenant, invoice_no), count=-1)
+            self.paid.setdefault(tenant, InvoiceNumbers()).add(invoice_no)
+            return True
+
+    def property_months(self, property_name=None):
+        """[(property, 'YYYY-MM', count, cents)] sorted by property and month"""
+        with self._lock:
+            return [(prop, month, count, cents)
+                    for prop, months in sorted(self.by_property_month.items())
+                    if property_name is None or prop == property_name
+                    for month, (count, cents) in sorted(months.items())]
+
+    def tenant_years(self, tenant=None):
+        """[(tenant, 'YYYY', count, cents)] sorted by tenant and year"""
+        with self._lock:
+            return [(name, year, count, cents)
+                    for name, years in sorted(self.by_tenant_year.items())
+                    if tenant is None or name == tenant
+                    for year, (count, cents) in sorted(years.items())]
+
+    def outstanding_by_tenant(self):
+        """[(tenant, count, cents)] for every tenant with unpaid invoices"""
+        with self._lock:
+            return [(tenant, count, cents) for tenant, (count, cents) in sorted(self.outstanding.items())]
+
+    def outstanding_count(self, tenant=None):
+        with self._lock:
+            if tenant is not None:
+                return self.outstanding.get(tenant, [0, 0])[0]
+            return sum(count for count, _ in self.outstanding.values())
+
+    def export_csv(self, ledger, out):
+        """Stream every ledger invoice to `out` as CSV, one record at a time; returns the row count"""
+        writer = csv.writer(out)
+        writer.writerow(CSV_COLUMNS)
+        rows = 0
+        for record in ledger.records():
+            cents = parse_cents(record.get('total') or 0)
+            writer.writerow([record['date'], record['invoice_no'], record['property'], record['tenant'],
+                             cents, format_cents(cents), self.is_paid(record['tenant'], record['invoice_no'])])
+            rows += 1
+        return rows
+
+def open_reports(ledger, path=REPORTS_FILE):
+    """Load the reports snapshot, bring it up to date with the ledger and follow the ledger's appends"""
+    reports = InvoiceReports(path)
+    reports.load()
+    if reports.sync(ledger):
+        reports.save()
+    reports.follow(ledger)
+    return reports
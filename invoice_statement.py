@@ -0,0 +1,218 @@
+# invoice_statement.py
+#
+# Combined statements: many invoices written into one PDF. The template page
+# is stored once as a Form XObject that every page draws with a single `Do`;
+# each page only carries its own text overlay. The template's printable
+# annotations (labels and masking strokes) are flattened into that form, so a
+# statement page looks the same as the single invoice it replaces.
+
+import logging
+from PyPDF2 import PdfWriter, PageObject
+from PyPDF2.generic import (ArrayObject, DecodedStreamObject, DictionaryObject, FloatObject,
+                            NameObject, NumberObject, StreamObject)
+from invoice_data import tenant_key
+from invoice_generator import template_cache
+from invoice_layout import layout_for, ENGINES, DEFAULT_ENGINE, DIRECT_FONT
+from invoice_timing import span
+
+# Resource name the shared template form is drawn under on every page
+TEMPLATE_XOBJECT = '/GenInvTemplate'
+
+# Prefix of the resource names flattened annotation appearances are drawn under
+ANNOTATION_XOBJECT = '/GenInvAnnot'
+
+# Annotation flags (PDF 1.7, 12.5.3)
+ANNOTATION_HIDDEN = 2
+ANNOTATION_PRINT = 4
+
+def _content_data(contents):
+    """Decoded bytes of a page's /Contents, whether a single stream or an array of them"""
+    contents = contents.get_object()
+    if isinstance(contents, ArrayObject):
+        return b"\n".join(part.get_object().get_data() for part in contents)
+    return contents.get_data()
+
+def _transform(matrix, x, y):
+    a, b, c, d, e, f = matrix
+    return a * x + c * y + e, b * x + d * y + f
+
+def _appearance(annotation):
+    """The normal appearance stream reference a printed annotation shows, or None"""
+    flags = int(annotation.get('/F', 0))
+    if not flags & ANNOTATION_PRINT or flags & ANNOTATION_HIDDEN or '/AP' not in annotation:
+        return None
+    appearances = annotation['/AP'].get_object()
+    if '/N' not in appearances:
+        return None
+    normal = appearances.raw_get('/N')
+    if not isinstance(normal.get_object(), StreamObject):
+        # One appearance per state (check boxes and the like); /AS picks the one shown
+        states = normal.get_object()
+        if annotation.get('/AS') not in states:
+            return None
+        normal = states.raw_get(annotation['/AS'])
+    return normal
+
+def _placement(annotation, appearance):
+    """`cm` operands that put the appearance form on the annotation's /Rect (PDF 1.7, 12.5.5)"""
+    matrix = [float(v) for v in appearance.get('/Matrix', (1, 0, 0, 1, 0, 0))]
+    x1, y1, x2, y2 = (float(v) for v in appearance['/BBox'])
+    corners = [_transform(matrix, x, y) for x in (x1, x2) for y in (y1, y2)]
+    left, bottom = min(x for x, _ in corners), min(y for _, y in corners)
+    right, top = max(x for x, _ in corners), max(y for _, y in corners)
+    rect = [float(v) for v in annotation['/Rect']]
+    rect_left, rect_right = sorted(rect[0::2])
+    rect_bottom, rect_top = sorted(rect[1::2])
+    if right == left or top == bottom:
+        return None
+    scale_x = (rect_right - rect_left) / (right - left)
+    scale_y = (rect_top - rect_bottom) / (top - bottom)
+    return (scale_x, 0, 0, scale_y, rect_left - scale_x * left, rect_bottom - scale_y * bottom)
+
+def _add_stream(writer, data, extra=None):
+    """Add a flate-compressed stream to the writer; returns its indirect reference"""
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    stream = stream.flate_encode()
+    if extra:
+        stream.update(extra)
+    return writer._add_object(stream)
+
+class StatementWriter:
+    """Builds one PDF holding many invoices on top of shared template forms.
+
+    Each template in use (normally just `input_pdf`, unless a record's layout
+    brings its own) is embedded once. `engine` picks how the text is drawn
+    (see invoice_layout.ENGINES).
+    """
+
+    def __init__(self, input_pdf, engine=None):
+        self.writer = PdfWriter()
+        self.input_pdf = input_pdf
+        self.engine = engine or DEFAULT_ENGINE
+        if self.engine not in ENGINES:
+            raise ValueError(f"Unknown text engine '{self.engine}'")
+        self._templates = {}
+
+        # Overlay fonts are identical from invoice to invoice; keep one copy of each
+        self._fonts = {}
+
+    def _template(self, input_pdf):
+        """(form reference, mediabox, rotation) for a template, embedding it on first use"""
+        if input_pdf in self._templates:
+            return self._templates[input_pdf]
+
+        template = template_cache.reader(input_pdf).pages[0]
+        # The template page as a Form XObject; its fonts and images are cloned once
+        with span('statement_template'):
+            resources = DictionaryObject(dict.items(template['/Resources']))
+            xobjects = resources['/XObject'] if '/XObject' in resources else DictionaryObject()
+            xobjects = DictionaryObject(dict.items(xobjects))
+            resources[NameObject('/XObject')] = xobjects
+            annotations = self._annotations(template, xobjects)
+            form = DictionaryObject({
+                NameObject('/Type'): NameObject('/XObject'),
+                NameObject('/Subtype'): NameObject('/Form'),
+                NameObject('/BBox'): ArrayObject(FloatObject(v) for v in template.mediabox),
+                NameObject('/Resources'): resources.clone(self.writer),
+            })
+            if '/Group' in template:
+                form[NameObject('/Group')] = template['/Group'].clone(self.writer)
+            content = b"q\n" + _content_data(template['/Contents']) + b"\nQ\n" + annotations
+            ref = _add_stream(self.writer, content, form)
+
+        self._templates[input_pdf] = (ref, template.mediabox, template.get('/Rotate', 0))
+        return self._templates[input_pdf]
+
+    @staticmethod
+    def _annotations(template, xobjects):
+        """Content drawing the template's printed annotations; their appearances are added to `xobjects`"""
+        content = b""
+        annotations = template['/Annots'] if '/Annots' in template else ()
+        for n, annotation in enumerate(annotations):
+            annotation = annotation.get_object()
+            appearance = _appearance(annotation)
+            placement = _placement(annotation, appearance.get_object()) if appearance is not None else None
+            if placement is None:
+                continue
+            name = f"{ANNOTATION_XOBJECT}{n}"
+            xobjects[NameObject(name)] = appearance
+            content += b"q " + " ".join(f"{v:.4f}" for v in placement).encode() + b" cm " + name.encode() + b" Do Q\n"
+        return content
+
+    def _font(self, font):
+        font = font.get_object()
+        key = tuple(sorted((k, str(v)) for k, v in font.items()))
+        if key not in self._fonts:
+            self._fonts[key] = self.writer._add_object(font.clone(self.writer))
+        return self._fonts[key]
+
+    def _overlay(self, layout, data, line_items, page_no, is_last):
+        """(content bytes, fonts by resource name, ProcSet or None) for one page's text"""
+        if self.engine == 'direct':
+            with span('overlay_render'):
+                content = layout.direct_content(data, line_items, page_no, is_last)
+            if content is not None:
+                return content, {DIRECT_FONT: layout.direct_font()}, None
+
+        overlay = layout.overlay(data, line_items, page_no, is_last)
+        resources = overlay.get('/Resources', DictionaryObject()).get_object()
+        content = _content_data(overlay['/Contents']) if '/Contents' in overlay else b""
+        return content, resources.get('/Font', DictionaryObject()).get_object(), resources.get('/ProcSet')
+
+    def _add_page(self, template, overlay):
+        template_ref, mediabox, rotate = template
+        content, fonts, procset = overlay
+        resources = DictionaryObject({
+            NameObject('/XObject'): DictionaryObject({NameObject(TEMPLATE_XOBJECT): template_ref}),
+        })
+        if fonts:
+            resources[NameObject('/Font')] = DictionaryObject(
+                {NameObject(name): self._font(font) for name, font in fonts.items()})
+        if procset is not None:
+            resources[NameObject('/ProcSet')] = procset.clone(self.writer)
+
+        data = b"q " + TEMPLATE_XOBJECT.encode() + b" Do Q\n" + content
+
+        page = PageObject.create_blank_page(self.writer, float(mediabox.width), float(mediabox.height))
+        page[NameObject('/Resources')] = resources
+        page[NameObject('/Contents')] = _add_stream(self.writer, data)
+        if rotate:
+            page[NameObject('/Rotate')] = NumberObject(rotate)
+        self.writer.add_page(page)
+
+    def add_invoice(self, data):
+        """Append one invoice's pages; nothing is added if any of its overlays fails to render"""
+        overlays = []
+        layout = layout_for(data)
+        pages = layout.paginate(data.get('line_items', ()))
+        for page_no, (line_items, is_last) in enumerate(pages, 1):
+            overlays.append(self._overlay(layout, data, line_items, page_no, is_last))
+
+        template = self._template(layout.template_for(self.input_pdf))
+        for overlay in overlays:
+            self._add_page(template, overlay)
+        return len(overlays)
+
+    def write(self, output_pdf):
+        with span('pdf_write'), open(output_pdf, 'wb') as outputStream:
+            self.writer.write(outputStream)
+
+def fill_statement(input_pdf, output_pdf, invoices, engine=None):
+    """Write every invoice in `invoices` into the single statement PDF `output_pdf`.
+
+    Returns {'written': [(tenant, invoice_no), ...], 'failed': [(tenant, invoice_no, error), ...]};
+    an invoice that fails to render is left out and does not stop the others.
+    """
+    results = {'written': [], 'failed': []}
+    statement = StatementWriter(input_pdf, engine)
+    for data in invoices:
+        tenant, invoice_no = tenant_key(data.get('to_renter', '')), data.get('invoice_no')
+        try:
+            statement.add_invoice(data)
+            results['written'].append((tenant, invoice_no))
+        except Exception as e:
+            results['failed'].append((tenant, invoice_no, str(e)))
+            logging.error(f"Error adding invoice {invoice_no} for {tenant} to statement: {str(e)}")
+    statement.write(output_pdf)
+    return results
@@ -0,0 +1,310 @@
+# invoice_store.py
+
+import os
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from invoice_data import DATA_FILE, tenant_key, select_properties, \
+    find_property_by_tenant, find_property_by_address, collect_invoices, format_billing_date, prepare_invoice
+from invoice_handler import InvoiceNumbers, get_next_invoice_number
+from invoice_journal import DataFile
+from invoice_charges import RATES_FILE, price_invoices, vacant_tenants
+
+# SQLite database that replaces properties_data.json once it has been imported
+DB_FILE = 'properties_data.db'
+
+# Fields of a property record that belong to the property rather than the tenant
+PROPERTY_FIELDS = ('property_address1', 'property_address2', 'from_company', 'from_email', 'from_phone')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS properties (
+    id INTEGER PRIMARY KEY,
+    address1 TEXT NOT NULL,
+    details TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tenants (
+    id INTEGER PRIMARY KEY,
+    property_id INTEGER NOT NULL REFERENCES properties(id),
+    name TEXT NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS invoices (
+    tenant_id INTEGER NOT NULL REFERENCES tenants(id),
+    invoice_no INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    sort_date TEXT NOT NULL,
+    total TEXT NOT NULL,
+    PRIMARY KEY (tenant_id, invoice_no)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_properties_address1 ON properties(address1);
+CREATE INDEX IF NOT EXISTS idx_tenants_name ON tenants(name);
+CREATE INDEX IF NOT EXISTS idx_invoices_sort_date ON invoices(sort_date, invoice_no);
+"""
+
+def _vacancy(tenant, billing_date):
+    return f"{tenant_key(tenant)} has no days in residence in {billing_date:%B %Y}"
+
+def _check_billable(tenant, vacant, billing_date):
+    """Refuse to allocate a number for a tenant who wasn't in residence that month"""
+    if tenant_key(tenant) in vacant:
+        raise ValueError(_vacancy(tenant, billing_date))
+
+def _billable(record, vacant, billing_date):
+    """Whether a batch bills the tenant in `record`; vacant tenants are logged as left out"""
+    if tenant_key(record['to_renter']) in vacant:
+        logging.info(f"Not billed: {_vacancy(record['to_renter'], billing_date)}")
+        return False
+    return True
+
+def _latest_number(invoice_no):
+    """Most recent number from a property's invoice_no field"""
+    last = InvoiceNumbers.from_value(invoice_no).last
+    return "-" if last is None else last
+
+class JsonStore:
+    """Data store backed by the whole-file properties_data.json.
+
+    Allocations lock the file against other threads and processes and are
+    journaled before the file is rewritten (see invoice_journal).
+    """
+
+    def __init__(self, data_file=DATA_FILE, rates_file=RATES_FILE):
+        self.data_file = data_file
+        self.rates_file = rates_file
+        self.data = DataFile(data_file)
+
+    def allocate_one(self, tenant, billing_date):
+        """Allocate the next invoice for a tenant; returns the invoice data or None if not found.
+
+        Raises ValueError for a tenant the rate table has out of residence all month.
+        """
+        _check_billable(tenant, vacant_tenants(billing_date, self.rates_file), billing_date)
+        with self.data.locked() as data:
+            matching_property = find_property_by_tenant(data, tenant)
+            if not matching_property:
+                return None
+            invoice_data = prepare_invoice(matching_property, billing_date)
+            self.data.commit(data, [matching_property])
+        price_invoices([invoice_data], billing_date, self.rates_file)
+        return invoice_data
+
+    def allocate(self, billing_date, properties=None, tenants=None):
+        """Allocate one invoice per selected property, committed together as one group.
+
+        Tenants out of residence all month are left out, without using up a number.
+        """
+        vacant = vacant_tenants(billing_date, self.rates_file)
+        with self.data.locked() as data:
+            selected = [prop for prop in select_properties(data, properties, tenants)
+                        if _billable(prop, vacant, billing_date)]
+            jobs = [prepare_invoice(prop, billing_date) for prop in selected]
+            self.data.commit(data, selected)
+        return price_invoices(jobs, billing_date, self.rates_file)
+
+    def latest_invoice_number(self, property_name):
+        prop = find_property_by_address(self.data.read(), property_name)
+        return _latest_number(prop['invoice_no']) if prop else "-"
+
+    def next_invoice_number(self, tenant):
+        prop = find_property_by_tenant(self.data.read(), tenant)
+        if not prop:
+            return None
+        return InvoiceNumbers.from_value(prop['invoice_no']).next_number()
+
+    def history(self):
+        return collect_invoices(self.data.read())
+
+    def issued_numbers(self):
+        """{tenant: InvoiceNumbers} of every number issued so far"""
+        return {tenant_key(prop['to_renter']): InvoiceNumbers.from_value(prop['invoice_no'])
+                for prop in self.data.read()['properties']}
+
+    def next_invoices(self):
+        """{tenant: record} with the number each tenant's next invoice would get; nothing is allocated"""
+        upcoming = {}
+        for prop in self.data.read()['properties']:
+            invoice_data = dict(prop)
+            invoice_data['invoice_no'] = str(InvoiceNumbers.from_value(prop['invoice_no']).next_number())
+            upcoming[tenant_key(prop['to_renter'])] = invoice_data
+        return upcoming
+
+class SqliteStore:
+    """Data store backed by SQLite with properties, tenants and invoices tables.
+
+    Lookups go through the tenant-name and property-address indexes, and every
+    invoice number is allocated inside its own write transaction, so generating
+    an invoice costs a couple of row writes instead of a whole-file rewrite.
+    """
+
+    def __init__(self, db_file=DB_FILE, rates_file=RATES_FILE):
+        self.db_file = db_file
+        self.rates_file = rates_file
+        # One connection shared by the GUI's worker threads; _lock serializes its use
+        self.conn = sqlite3.connect(db_file, isolation_level=None, check_same_thread=False)
+        self._lock = threading.RLock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """Write transaction that takes the database lock up front"""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def import_json(self, data_file=DATA_FILE):
+        """One-shot import of properties_data.json; returns the number of records imported"""
+        data = DataFile(data_file).read()
+        with self.transaction() as conn:
+            if conn.execute("SELECT 1 FROM tenants LIMIT 1").fetchone():
+                raise ValueError(f"{self.db_file} already contains imported data")
+
+            for prop in data['properties']:
+                property_id = self._property_id(conn, prop)
+                record = {k: v for k, v in prop.items() if k not in PROPERTY_FIELDS and k != 'invoice_no'}
+                tenant_id = conn.execute(
+                    "INSERT INTO tenants (property_id, name, record) VALUES (?, ?, ?)",
+                    (property_id, tenant_key(prop['to_renter']), json.dumps(record))).lastrowid
+
+                # Past invoices only kept their numbers; pair them with the record's date and total
+                numbers = InvoiceNumbers.from_value(prop['invoice_no'])
+                conn.executemany(
+                    "INSERT OR IGNORE INTO invoices (tenant_id, invoice_no, date, sort_date, total) VALUES (?, ?, ?, ?, ?)",
+                    [(tenant_id, int(n), prop['date'], _sort_date(prop['date']), prop.get('total', ''))
+                     for n in numbers])
+        return len(data['properties'])
+
+    def _property_id(self, conn, prop):
+        row = conn.execute("SELECT id FROM properties WHERE address1 = ?", (prop['property_address1'],)).fetchone()
+        if row:
+            return row[0]
+        details = {k: prop[k] for k in PROPERTY_FIELDS if k in prop}
+        return conn.execute("INSERT INTO properties (address1, details) VALUES (?, ?)",
+                            (prop['property_address1'], json.dumps(details))).lastrowid
+
+    def _tenant_rows(self, conn, properties=None, tenants=None):
+        """(tenant_id, record) pairs matching the property/tenant filters, in import order"""
+        query = ("SELECT t.id, p.details, t.record FROM tenants t JOIN properties p ON p.id = t.property_id")
+        clauses, params = [], []
+        if tenants:
+            clauses.append(f"t.name IN ({','.join('?' * len(tenants))})")
+            params += [tenant_key(t) for t in tenants]
+        if properties:
+            # Prefix range on the street part keeps the address index usable
+            ranges = []
+            for name in properties:
+                street = name.split(',')[0].strip()
+                ranges.append("(p.address1 >= ? AND p.address1 < ?)")
+                params += [street, street + '\uffff']
+            clauses.append(f"({' OR '.join(ranges)})")
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY t.id"
+
+        for tenant_id, details, record in conn.execute(query, params).fetchall():
+            merged = json.loads(details)
+            merged.update(json.loads(record))
+            yield tenant_id, merged
+
+    def _allocate(self, conn, tenant_id, record, billing_date):
+        (last,) = conn.execute("SELECT MAX(invoice_no) FROM invoices WHERE tenant_id = ?", (tenant_id,)).fetchone()
+        next_number = get_next_invoice_number([] if last is None else [last])
+
+        record['date'] = format_billing_date(billing_date)
+        tenant_record = {k: v for k, v in record.items() if k not in PROPERTY_FIELDS}
+        conn.execute("UPDATE tenants SET record = ? WHERE id = ?", (json.dumps(tenant_record), tenant_id))
+
+        invoice_data = dict(record)
+        invoice_data['invoice_no'] = str(next_number)
+        price_invoices([invoice_data], billing_date, self.rates_file)
+        conn.execute("INSERT INTO invoices (tenant_id, invoice_no, date, sort_date, total) VALUES (?, ?, ?, ?, ?)",
+                     (tenant_id, next_number, record['date'], _sort_date(record['date']),
+                      str(invoice_data.get('total', ''))))
+        return invoice_data
+
+    def allocate_one(self, tenant, billing_date):
+        """Allocate the next invoice for a tenant; returns the invoice data or None if not found.
+
+        Raises ValueError for a tenant the rate table has out of residence all month.
+        """
+        _check_billable(tenant, vacant_tenants(billing_date, self.rates_file), billing_date)
+        with self.transaction() as conn:
+            for tenant_id, record in self._tenant_rows(conn, tenants=[tenant]):
+                return self._allocate(conn, tenant_id, record, billing_date)
+        return None
+
+    def allocate(self, billing_date, properties=None, tenants=None):
+        """Allocate one invoice per selected tenant in a single transaction, leaving out vacant tenants"""
+        vacant = vacant_tenants(billing_date, self.rates_file)
+        with self.transaction() as conn:
+            rows = [(tenant_id, record) for tenant_id, record in self._tenant_rows(conn, properties, tenants)
+                    if _billable(record, vacant, billing_date)]
+            return [self._allocate(conn, tenant_id, record, billing_date) for tenant_id, record in rows]
+
+    def latest_invoice_number(self, property_name):
+        with self._lock:
+            for tenant_id, _ in self._tenant_rows(self.conn, properties=[property_name]):
+                (last,) = self.conn.execute("SELECT MAX(invoice_no) FROM invoices WHERE tenant_id = ?",
+                                            (tenant_id,)).fetchone()
+                return "-" if last is None else last
+            return "-"
+
+    def next_invoice_number(self, tenant):
+        with self._lock:
+            for tenant_id, _ in self._tenant_rows(self.conn, tenants=[tenant]):
+                (last,) = self.conn.execute("SELECT MAX(invoice_no) FROM invoices WHERE tenant_id = ?",
+                                            (tenant_id,)).fetchone()
+                return get_next_invoice_number([] if last is None else [last])
+            return None
+
+    def next_invoices(self):
+        """{tenant: record} with the number each tenant's next invoice would get; nothing is allocated"""
+        with self._lock:
+            last_numbers = dict(self.conn.execute(
+                "SELECT tenant_id, MAX(invoice_no) FROM invoices GROUP BY tenant_id").fetchall())
+            upcoming = {}
+            for tenant_id, record in self._tenant_rows(self.conn):
+                last = last_numbers.get(tenant_id)
+                record['invoice_no'] = str(get_next_invoice_number([] if last is None else [last]))
+                upcoming[tenant_key(record['to_renter'])] = record
+            return upcoming
+
+    def issued_numbers(self):
+        """{tenant: InvoiceNumbers} of every number issued so far"""
+        with self._lock:
+            issued = {tenant_key(record['to_renter']): InvoiceNumbers() for _, record in self._tenant_rows(self.conn)}
+            rows = self.conn.execute("SELECT t.name, i.invoice_no FROM invoices i JOIN tenants t ON t.id = i.tenant_id "
+                                     "ORDER BY t.name, i.invoice_no").fetchall()
+        for name, invoice_no in rows:
+            issued.setdefault(name, InvoiceNumbers()).add(invoice_no)
+        return issued
+
+    def history(self):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT i.date, i.invoice_no, p.address1, t.name, i.total FROM invoices i "
+                "JOIN tenants t ON t.id = i.tenant_id JOIN properties p ON p.id = t.property_id "
+                "ORDER BY i.sort_date DESC, i.invoice_no DESC").fetchall()
+        return [{'date': date, 'invoice_no': invoice_no, 'property': address1, 'tenant': name, 'amount': total}
+                for date, invoice_no, address1, name, total in rows]
+
+def _sort_date(date):
+    """MM-DD-YYYY -> YYYY-MM-DD so dates order correctly as text"""
+    month, day, year = date.split('-')
+    return f"{year}-{month}-{day}"
+
+def open_store(data_file=DATA_FILE, db_file=DB_FILE, rates_file=RATES_FILE):
+    """Use the SQLite store once the JSON data has been imported, otherwise the JSON file"""
+    if os.path.exists(db_file):
+        return SqliteStore(db_file, rates_file)
+    return JsonStore(data_file, rates_file)
@@ -0,0 +1,146 @@
+# invoice_timing.py
+#
+# Opt-in per-stage timing. Turn it on with GENINV_TIMING=1 (or enable()); the
+# aggregated spans are logged on exit, or written as JSON to GENINV_TIMING_FILE.
+# When it is off, span() hands back a shared no-op context manager and record()
+# does nothing. Each span keeps its count, total, min and max, plus a fixed-size
+# random sample of durations for the percentiles, so a long run's timing takes
+# the same memory as a short one's.
+
+import atexit
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+_enabled = os.environ.get('GENINV_TIMING', '') not in ('', '0')
+_lock = threading.Lock()
+_spans = {}
+
+# Durations kept per span for the percentiles; exact up to this many
+RESERVOIR_SIZE = 1024
+
+class _Stats:
+    """One span's aggregate: counters plus a uniform sample of its durations"""
+    __slots__ = ('count', 'total', 'min', 'max', 'sample', 'random')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.sample = []
+        self.random = random.Random(0)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        if len(self.sample) < RESERVOIR_SIZE:
+            self.sample.append(seconds)
+        else:
+            # Reservoir sampling: every duration so far is kept with equal chance
+            slot = self.random.randrange(self.count)
+            if slot < RESERVOIR_SIZE:
+                self.sample[slot] = seconds
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+def span(name):
+    """Time a named stage: `with span('pdf_write'): ...`"""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+def is_enabled():
+    return _enabled
+
+def record(name, seconds):
+    """Add one duration to a span's aggregate (nothing happens while timing is off)"""
+    if not _enabled:
+        return
+    with _lock:
+        stats = _spans.get(name)
+        if stats is None:
+            stats = _spans[name] = _Stats()
+        stats.add(seconds)
+
+def reset():
+    with _lock:
+        _spans.clear()
+
+def _percentile(values, q):
+    """q-th percentile (0-100) of an already sorted list, nearest rank"""
+    index = min(len(values) - 1, max(0, int(round(q / 100 * (len(values) - 1)))))
+    return values[index]
+
+def report():
+    """Counters and percentiles (seconds) per span; percentiles come from the sample"""
+    with _lock:
+        spans = {name: (stats.count, stats.total, stats.min, stats.max, sorted(stats.sample))
+                 for name, stats in _spans.items()}
+    return {
+        name: {
+            'count': count,
+            'total': total,
+            'mean': total / count,
+            'min': low,
+            'p50': _percentile(sample, 50),
+            'p90': _percentile(sample, 90),
+            'p99': _percentile(sample, 99),
+            'max': high,
+        }
+        for name, (count, total, low, high, sample) in spans.items() if count
+    }
+
+def dump(path):
+    with open(path, 'w') as f:
+        json.dump(report(), f, indent=4)
+
+def log_report():
+    for name, stats in sorted(report().items()):
+        logging.info(f"{name}: count={stats['count']} total={stats['total']:.4f}s "
+                     f"p50={stats['p50'] * 1000:.2f}ms p90={stats['p90'] * 1000:.2f}ms max={stats['max'] * 1000:.2f}ms")
+
+def _at_exit():
+    if not (_enabled and _spans):
+        return
+    path = os.environ.get('GENINV_TIMING_FILE')
+    if path:
+        dump(path)
+    else:
+        # Make sure the report is visible even if the app never configured logging
+        logging.basicConfig(level=logging.INFO)
+        log_report()
+
+atexit.register(_at_exit)
@@ -0,0 +1,63 @@
+# invoice_worker.py
+
+import queue
+from concurrent.futures import ThreadPoolExecutor, wait
+
+class JobQueue:
+    """Runs invoice jobs on background threads and hands results back through a queue.
+
+    The GUI submits work keyed by what it is for (e.g. the tenant), polls the
+    queue from Tk with after(), and never blocks on file or PDF work. Only one
+    job per key can be in flight; different keys run side by side. Invoice
+    generation and background loading (history, preview, rasters) run on
+    separate pools, so Generate never waits behind a slow load.
+    """
+
+    def __init__(self, max_workers=2, background_workers=2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='geninv')
+        self._background = ThreadPoolExecutor(max_workers=background_workers, thread_name_prefix='geninv-bg')
+        self._events = queue.Queue()
+        self._in_flight = {}
+
+    def busy(self, key):
+        return key in self._in_flight
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Run fn in the background; returns False if a job with the same key is still in flight"""
+        return self._submit(self._executor, key, fn, args, kwargs)
+
+    def submit_background(self, key, fn, *args, **kwargs):
+        """Like submit, but on the background pool, for loading that generation shouldn't wait behind"""
+        return self._submit(self._background, key, fn, args, kwargs)
+
+    def _submit(self, executor, key, fn, args, kwargs):
+        if key in self._in_flight:
+            return False
+        future = executor.submit(fn, *args, **kwargs)
+        self._in_flight[key] = future
+        future.add_done_callback(lambda f: self._events.put(('done', key, f)))
+        return True
+
+    def post(self, *event):
+        """Queue an event (e.g. progress) from a worker thread"""
+        self._events.put(event)
+
+    def poll(self):
+        """Drain and return the pending events; call from the Tk thread"""
+        events = []
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                return events
+            if event[0] == 'done':
+                self._in_flight.pop(event[1], None)
+            events.append(event)
+
+    def wait(self, timeout=None):
+        """Block until every job in flight has finished"""
+        wait(list(self._in_flight.values()), timeout=timeout)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        self._background.shutdown(wait=True)
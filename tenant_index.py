@@ -0,0 +1,87 @@
+# tenant_index.py
+
+import os
+import threading
+
+# Seconds between background mtime checks of every property's tenants folder
+REVALIDATE_INTERVAL = 30.0
+
+class TenantIndex:
+    """In-memory index of the tenant folders under <root>/<property>/tenants.
+
+    A background thread scans every property once at startup with os.scandir
+    and then polls each tenants folder's mtime, rescanning only the folders
+    that changed. Lookups are answered from memory; a property that hasn't been
+    scanned yet is scanned on the spot.
+    """
+
+    def __init__(self, root, property_folders, revalidate_interval=REVALIDATE_INTERVAL):
+        self.root = root
+        self.property_folders = list(property_folders)
+        self.revalidate_interval = revalidate_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        """Prefetch every property and keep revalidating in the background"""
+        threading.Thread(target=self._run, name='tenant-index', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        for folder in self.property_folders:
+            if self._stop.is_set():
+                return
+            self.revalidate(folder)
+        while not self._stop.wait(self.revalidate_interval):
+            for folder in self.property_folders:
+                self.revalidate(folder)
+
+    def tenants_path(self, property_folder):
+        return os.path.join(self.root, property_folder, "tenants")
+
+    def _mtime(self, property_folder):
+        try:
+            return os.stat(self.tenants_path(property_folder)).st_mtime_ns
+        except OSError:
+            return None
+
+    def scan(self, property_folder):
+        """Scan one tenants folder; returns the tenant names, or None if the folder is missing"""
+        mtime = self._mtime(property_folder)
+        tenants = None
+        if mtime is not None:
+            try:
+                with os.scandir(self.tenants_path(property_folder)) as entries:
+                    tenants = [entry.name for entry in entries if entry.is_dir()]
+            except OSError:
+                mtime = None
+
+        with self._lock:
+            self._entries[property_folder] = (mtime, tenants)
+        return tenants
+
+    def revalidate(self, property_folder):
+        """Rescan a property only if its tenants folder changed since the last scan"""
+        with self._lock:
+            entry = self._entries.get(property_folder)
+        if entry is None or entry[0] != self._mtime(property_folder):
+            self.scan(property_folder)
+
+    def tenants(self, property_folder):
+        """Tenant names for a property from the cache (None if it has no tenants folder)"""
+        with self._lock:
+            entry = self._entries.get(property_folder)
+        if entry is None:
+            return self.scan(property_folder)
+        return list(entry[1]) if entry[1] is not None else None
+
+    def invalidate(self, property_folder=None):
+        """Forget cached results so the next lookup rescans"""
+        with self._lock:
+            if property_folder is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(property_folder, None)
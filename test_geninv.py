@@ -0,0 +1,70 @@
+import unittest
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+from geninv import STARTUP_BUDGET, main
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class TestGenInvCli(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.tmp.name, 'properties_data.json')
+        self.db_file = os.path.join(self.tmp.name, 'properties_data.db')
+        self.ledger_file = os.path.join(self.tmp.name, 'invoice_ledger.jsonl')
+        with open(self.data_file, 'w') as f:
+            json.dump({"properties": [
+                {"date": "09-13-2024", "invoice_no": [28], "to_renter": "Hector Garcia",
+                 "property_address1": "3175 Seminole Ave", "total": "$1,368.00",
+                 "line_items": [["Monthly Rent", "$1,312.50"]]}
+            ]}, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_no_gui_or_pdf_imports(self):
+        """Test that non-rendering commands never import Tk or the PDF stack"""
+        code = ("import sys, geninv; geninv.main(['--data-file', sys.argv[1], '--db', sys.argv[2], '--ledger', sys.argv[3], 'next-number', '--tenant', 'Hector Garcia']);"
+                "heavy = {'tkinter', 'customtkinter', 'tkcalendar', 'PyPDF2', 'reportlab'} & set(sys.modules);"
+                "sys.exit(1 if heavy else 0)")
+        result = subprocess.run([sys.executable, '-c', code, self.data_file, self.db_file, self.ledger_file], cwd=APP_DIR,
+                                capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "29")
+
+    def test_startup_budget(self):
+        """Test that a non-rendering command finishes within the startup budget"""
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(APP_DIR, 'geninv.py'), '--data-file', self.data_file,
+                        '--db', self.db_file, '--ledger', self.ledger_file, 'history'], check=True, capture_output=True)
+        self.assertLess(time.perf_counter() - start, STARTUP_BUDGET)
+
+    def test_generate(self):
+        """Test generating one invoice headlessly"""
+        reports_file = os.path.join(self.tmp.name, 'invoice_reports.json')
+        code = main(['--data-file', self.data_file, '--db', self.db_file, '--ledger', self.ledger_file,
+                     '--reports', reports_file, 'generate', 'Hector Garcia',
+                     '--date', '10-01-2024', '--output-dir', self.tmp.name])
+        self.assertEqual(code, 0)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, "Invoice 29 - Hector Garcia.pdf")))
+        with open(self.data_file) as f:
+            prop = json.load(f)['properties'][0]
+        self.assertEqual(prop['invoice_no'], {'ranges': [[28, 29]], 'high_water': 29})
+        self.assertEqual(prop['date'], "10-01-2024")
+
+        # The ledger was seeded with the old invoice and recorded the new one
+        from invoice_ledger import InvoiceLedger
+        records = list(InvoiceLedger(self.ledger_file).records())
+        self.assertEqual([r['invoice_no'] for r in records], [28, 29])
+        self.assertEqual(records[1]['line_items'], [["Monthly Rent", "$1,312.50"]])
+        self.assertTrue(records[1]['template_hash'])
+
+        # And the report totals took it in as it was generated
+        with open(reports_file) as f:
+            self.assertEqual(json.load(f)['outstanding'], {"Hector Garcia": [2, 273600]})
+
+if __name__ == '__main__':
+    unittest.main()
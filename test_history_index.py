@@ -0,0 +1,83 @@
+import unittest
+import random
+from datetime import date
+from history_index import HistoryIndex, HistoryFilter, tokens
+from invoice_data import history_key, parse_billing_date, parse_cents
+
+TENANTS = ["Hector Garcia", "Maria Mercedes", "John Smith", "Ana Garcia"]
+PROPERTIES = ["3175 Seminole Ave", "3306 Seminole Ave", "10755 State St", "10974 Lou Dillon Ave"]
+
+def make_rows(count, seed=7):
+    rng = random.Random(seed)
+    return [{'date': f"{rng.randint(1, 12):02d}-01-{rng.randint(2020, 2024)}", 'invoice_no': no,
+             'property': rng.choice(PROPERTIES), 'tenant': rng.choice(TENANTS),
+             'amount': f"${rng.randint(500, 3000):,}.00"} for no in range(1, count + 1)]
+
+def brute_force(rows, query):
+    """What a full scan would return for the query"""
+    found = []
+    for row in rows:
+        ordinal = parse_billing_date(row['date']).toordinal()
+        cents = parse_cents(row['amount'])
+        row_tokens = tokens(row['tenant']) + tokens(row['property']) + tokens(row['invoice_no'])
+        if query.start is not None and ordinal < query.start:
+            continue
+        if query.end is not None and ordinal > query.end:
+            continue
+        if query.min_cents is not None and cents < query.min_cents:
+            continue
+        if query.max_cents is not None and cents > query.max_cents:
+            continue
+        if all(any(token.startswith(term) for token in row_tokens) for term in query.terms):
+            found.append(row)
+    return sorted(found, key=history_key, reverse=True)
+
+class TestHistoryIndex(unittest.TestCase):
+    def setUp(self):
+        self.rows = make_rows(2000)
+        self.index = HistoryIndex(self.rows)
+
+    def test_filters_match_full_scan(self):
+        """Test text, date and amount filters alone and combined against a full scan"""
+        queries = [
+            HistoryFilter(),
+            HistoryFilter("garcia"),
+            HistoryFilter("GARC sem"),
+            HistoryFilter("hector 3306"),
+            HistoryFilter("nobody"),
+            HistoryFilter(start=date(2022, 3, 1), end=date(2022, 6, 1)),
+            HistoryFilter(min_cents=150000, max_cents=150500),
+            HistoryFilter("state", date(2021, 1, 1), date(2023, 12, 31), 100000, 200000),
+            HistoryFilter("maria", start=date(2024, 1, 1)),
+        ]
+        for query in queries:
+            self.assertEqual(self.index.search(query), brute_force(self.rows, query))
+
+    def test_add_updates_indexes(self):
+        """Test that a new invoice is searchable without rebuilding the index"""
+        row = {'date': "06-15-2022", 'invoice_no': 5000, 'property': "1 Zebra Way",
+               'tenant': "Zoe Quinn", 'amount': "$9,999.00"}
+        row_id = self.index.add(row)
+        self.assertEqual(self.index.search(HistoryFilter("zoe")), [row])
+        self.assertEqual(self.index.search(HistoryFilter(min_cents=999900)), [row])
+        self.assertTrue(self.index.matches(row_id, HistoryFilter("zebra", date(2022, 6, 1), date(2022, 6, 30))))
+        self.assertFalse(self.index.matches(row_id, HistoryFilter("hector")))
+
+        rows = self.rows + [row]
+        query = HistoryFilter(start=date(2022, 6, 1), end=date(2022, 6, 30))
+        self.assertEqual(self.index.search(query), brute_force(rows, query))
+        self.assertEqual(self.index.search(), sorted(rows, key=history_key, reverse=True))
+
+    def test_parse(self):
+        """Test reading the filter bar's entries"""
+        query = HistoryFilter.parse("Hector", "01-01-2024", "", "$1,000", "")
+        self.assertEqual((query.terms, query.start, query.end, query.min_cents, query.max_cents),
+                         (["hector"], date(2024, 1, 1).toordinal(), None, 100000, None))
+        self.assertFalse(HistoryFilter.parse("", " ", "", "", ""))
+        with self.assertRaises(ValueError):
+            HistoryFilter.parse("", "01-0", "", "", "")
+        with self.assertRaises(ValueError):
+            HistoryFilter.parse("", "", "", "1.2.3", "")
+
+if __name__ == '__main__':
+    unittest.main()
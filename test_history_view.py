@@ -0,0 +1,60 @@
+import unittest
+import random
+from history_view import sort_key, insert_sorted, visible_window, scrollbar_span
+
+def row(date, invoice_no):
+    return {'date': date, 'invoice_no': invoice_no, 'property': "3175 Seminole Ave",
+            'tenant': "Hector Garcia", 'amount': "$1,312.50"}
+
+class TestHistoryView(unittest.TestCase):
+    def test_window_is_bounded_by_the_visible_slots(self):
+        """Test that no more rows than fit are ever shown, however long the history"""
+        for total in (0, 1, 5, 20, 100000):
+            for first in (-3, 0, 7, total - 1, total + 50):
+                start, shown = visible_window(first, 20, total)
+                self.assertLessEqual(len(shown), 20)
+                self.assertEqual(len(shown), min(20, total))
+                self.assertTrue(all(0 <= index < total for index in shown))
+
+    def test_scrolling_recycles_the_same_slots(self):
+        """Test that scrolling re-labels a fixed set of slots and clamps at both ends"""
+        self.assertEqual(visible_window(0, 10, 100), (0, range(0, 10)))
+        self.assertEqual(visible_window(3, 10, 100), (3, range(3, 13)))
+        # Past the end the window backs up so it stays full
+        self.assertEqual(visible_window(95, 10, 100), (90, range(90, 100)))
+        self.assertEqual(visible_window(-5, 10, 100), (0, range(0, 10)))
+        # Fewer rows than slots: the spare slots are hidden
+        self.assertEqual(visible_window(4, 10, 3), (0, range(0, 3)))
+
+        slots = {len(visible_window(first, 10, 1000)[1]) for first in range(0, 1000, 7)}
+        self.assertEqual(slots, {10})
+
+    def test_scrollbar_span(self):
+        """Test the scrollbar fractions for the window"""
+        self.assertEqual(scrollbar_span(0, 10, 0), (0, 1))
+        self.assertEqual(scrollbar_span(0, 10, 5), (0, 1.0))
+        self.assertEqual(scrollbar_span(25, 25, 100), (0.25, 0.5))
+
+    def test_insert_keeps_newest_first(self):
+        """Test that inserted rows land in date, then invoice number, order, newest first"""
+        rows = [row("10-01-2024", 41), row("10-01-2024", 29), row("09-01-2024", 40)]
+        keys = [sort_key(r) for r in rows]
+
+        self.assertEqual(insert_sorted(rows, keys, row("11-01-2024", 1)), 0)
+        self.assertEqual(insert_sorted(rows, keys, row("10-01-2024", 30)), 2)
+        self.assertEqual(insert_sorted(rows, keys, row("01-01-2024", 99)), 5)
+        self.assertEqual([(r['date'], r['invoice_no']) for r in rows],
+                         [("11-01-2024", 1), ("10-01-2024", 41), ("10-01-2024", 30),
+                          ("10-01-2024", 29), ("09-01-2024", 40), ("01-01-2024", 99)])
+        self.assertEqual(keys, [sort_key(r) for r in rows])
+
+        shuffled = [row(f"{month:02d}-01-2024", n) for month in range(1, 13) for n in range(5)]
+        random.Random(1).shuffle(shuffled)
+        rows, keys = [], []
+        for r in shuffled:
+            insert_sorted(rows, keys, r)
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(rows[0]['date'], "12-01-2024")
+
+if __name__ == '__main__':
+    unittest.main()
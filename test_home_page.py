@@ -1,5 +1,8 @@
 import unittest
 import logging
+import os
+import sys
+import subprocess
 from unittest.mock import patch, mock_open, MagicMock, call
 from datetime import datetime
 import json
@@ -33,6 +36,7 @@ with patch('tkcalendar.Calendar', MockCalendar), \
      patch('babel.core', mock_babel['core']), \
      patch('babel.localedata', mock_babel['localedata']):
     from home_page import PropertyApp
+    from tenant_index import TenantIndex
 
 @patch('tkcalendar.Calendar', MockCalendar)
 @patch('babel.dates', mock_babel['dates'])
@@ -53,6 +57,8 @@ class TestHomePage(unittest.TestCase):
         # Create context managers for patching
         self.json_patcher = patch('json.load')
         self.mock_json_load = self.json_patcher.start()
+        # Cleanups run even when setUp fails part way (no display), unlike tearDown
+        self.addCleanup(self.json_patcher.stop)
         
         # Mock data for testing
         self.mock_data = {
@@ -78,6 +84,15 @@ class TestHomePage(unittest.TestCase):
         # Create a context manager for patching open
         self.open_patcher = patch('builtins.open', new_callable=mock_open)
         self.mock_file = self.open_patcher.start()
+        self.addCleanup(self.open_patcher.stop)
+
+        # Nothing really reaches the disk, so there is nothing to fsync or rename into place
+        self.fsync_patcher = patch('os.fsync')
+        self.fsync_patcher.start()
+        self.addCleanup(self.fsync_patcher.stop)
+        self.replace_patcher = patch('os.replace')
+        self.replace_patcher.start()
+        self.addCleanup(self.replace_patcher.stop)
         
         # Initialize the app
         self.app = PropertyApp()
@@ -97,10 +112,6 @@ class TestHomePage(unittest.TestCase):
             self.app.quit()
             self.app.destroy()
             self.app = None
-            
-        # Stop the patchers
-        self.json_patcher.stop()
-        self.open_patcher.stop()
 
     def test_home_page_loads(self):
         """Test if the home page loads successfully"""
@@ -110,13 +121,11 @@ class TestHomePage(unittest.TestCase):
         self.assertTrue(self.app.tenant_combo)
         self.assertTrue(self.app.cal)
 
-    @patch('os.path.exists')
-    @patch('os.listdir')
-    def test_property_selection_updates_tenants(self, mock_listdir, mock_exists):
+    @patch.object(TenantIndex, 'tenants')
+    def test_property_selection_updates_tenants(self, mock_tenants):
         """Test if selecting a property updates the tenant list correctly"""
-        # Mock the file system calls
-        mock_exists.return_value = True
-        mock_listdir.return_value = ["Hector Garcia", "Another Tenant"]
+        # Mock the tenant folder index
+        mock_tenants.return_value = ["Hector Garcia", "Another Tenant"]
         
         # Simulate selecting a property
         self.app.property_combo.set("3175 Seminole Ave, SouthGate Property")
@@ -130,16 +139,14 @@ class TestHomePage(unittest.TestCase):
 
     @patch('home_page.fill_invoice')
     @patch('json.dump')
-    @patch('os.path.exists')
-    @patch('os.listdir')
-    def test_submit_button_functionality(self, mock_listdir, mock_exists, mock_json_dump, mock_fill_invoice):
+    @patch.object(TenantIndex, 'tenants')
+    def test_submit_button_functionality(self, mock_tenants, mock_json_dump, mock_fill_invoice):
         """Test if the submit button works correctly"""
         # Mock the fill_invoice function to return True
         mock_fill_invoice.return_value = True
         
-        # Mock the file system calls
-        mock_exists.return_value = True
-        mock_listdir.return_value = ["Hector Garcia"]
+        # Mock the tenant folder index
+        mock_tenants.return_value = ["Hector Garcia"]
         
         # Setup test data
         test_property = "3175 Seminole Ave, SouthGate Property"
@@ -154,8 +161,9 @@ class TestHomePage(unittest.TestCase):
             self.app.tenant_combo.set(test_tenant)
             self.app.cal._selection = test_date
 
-            # Call submit
+            # Call submit and wait for the background job
             self.app.submit()
+            self.app.finish_jobs()
             
             # Verify success message
             self.assertEqual(
@@ -207,16 +215,14 @@ class TestHomePage(unittest.TestCase):
             "red"
         )
 
-    @patch('os.path.exists')
-    @patch('os.listdir')
-    def test_default_tenant_persistence(self, mock_listdir, mock_exists):
+    @patch.object(TenantIndex, 'tenants')
+    def test_default_tenant_persistence(self, mock_tenants):
         """Test if default tenant persists after setting and reselecting property"""
         test_property = "3306 Seminole Ave, Lynwood Property"
         test_tenant = "Maria Mercedes"
 
-        # Mock the file system calls
-        mock_exists.return_value = True
-        mock_listdir.return_value = [test_tenant]
+        # Mock the tenant folder index
+        mock_tenants.return_value = [test_tenant]
 
         # Set default tenant
         self.app.property_combo.set(test_property)
@@ -232,14 +238,12 @@ class TestHomePage(unittest.TestCase):
 
     @patch('home_page.fill_invoice')
     @patch('json.dump')
-    @patch('os.path.exists')
-    @patch('os.listdir')
-    def test_date_update_in_properties_data(self, mock_listdir, mock_exists, mock_json_dump, mock_fill_invoice):
+    @patch.object(TenantIndex, 'tenants')
+    def test_date_update_in_properties_data(self, mock_tenants, mock_json_dump, mock_fill_invoice):
         """Test if the date gets updated correctly in properties_data.json"""
         # Mock the necessary functions
         mock_fill_invoice.return_value = True
-        mock_exists.return_value = True
-        mock_listdir.return_value = ["Hector Garcia"]
+        mock_tenants.return_value = ["Hector Garcia"]
         
         # Setup test data
         test_property = "3175 Seminole Ave, SouthGate Property"
@@ -252,8 +256,9 @@ class TestHomePage(unittest.TestCase):
         self.app.tenant_combo.set(test_tenant)
         self.app.cal._selection = test_date
         
-        # Call submit
+        # Call submit and wait for the background job
         self.app.submit()
+        self.app.finish_jobs()
         
         # Verify json.dump was called with updated date
         calls = mock_json_dump.call_args_list
@@ -279,5 +284,23 @@ class TestHomePage(unittest.TestCase):
         self.assertEqual(self.app.message_label.cget("text"), "Success message")
         self.assertEqual(self.app.message_label.cget("text_color"), "green")
 
+class TestStartup(unittest.TestCase):
+    APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+    def test_heavy_modules_load_lazily(self):
+        """Test that importing the app doesn't pull in the PDF stack or the calendar"""
+        code = ("import sys, home_page;"
+                "heavy = {'PyPDF2', 'reportlab', 'tkcalendar', 'babel'} & set(sys.modules);"
+                "print(sorted(heavy)); sys.exit(1 if heavy else 0)")
+        result = subprocess.run([sys.executable, '-c', code], cwd=self.APP_DIR, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+
+    @unittest.skipIf(sys.platform.startswith('linux') and not os.environ.get('DISPLAY'), "needs a display")
+    def test_startup_budget(self):
+        """Test that the window paints within the startup budget"""
+        from bench_geninv import app_startup_time
+        from home_page import STARTUP_BUDGET
+        self.assertLess(app_startup_time(), STARTUP_BUDGET)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
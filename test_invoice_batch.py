@@ -0,0 +1,237 @@
+import unittest
+import os
+import gc
+import json
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime
+from unittest.mock import Mock
+from invoice_data import select_properties
+from invoice_batch import generate_batch, generate_statement, generate_stream
+from invoice_generator import fill_invoice
+from invoice_ledger import InvoiceLedger
+from invoice_store import JsonStore
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Invoice Master.pdf')
+
+def drawn_words(page):
+    """Every word drawn on a page, forms included"""
+    words = set()
+    page.extract_text(visitor_text=lambda text, *args: words.update(text.split()))
+    return words
+
+class TestInvoiceBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.tmp.name, 'properties_data.json')
+        self.data = {
+            "properties": [
+                {"date": "09-13-2024", "invoice_no": [28], "to_renter": "Hector Garcia",
+                 "property_address1": "3175 Seminole Ave", "total": "$1,368.00",
+                 "line_items": [["Monthly Rent", "$1,312.50"]]},
+                {"date": "09-13-2024", "invoice_no": [40], "to_renter": "Maria Mercedes",
+                 "property_address1": "3306 Seminole Ave", "total": "$900.00",
+                 "line_items": [["Monthly Rent", "$900.00"]]},
+                # Malformed line item so this invoice fails to render
+                {"date": "09-13-2024", "invoice_no": [7], "to_renter": "Broken Tenant",
+                 "property_address1": "10755 State St", "total": "$1.00",
+                 "line_items": [["Missing amount"]]}
+            ]
+        }
+        with open(self.data_file, 'w') as f:
+            json.dump(self.data, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_select_properties_filters(self):
+        """Test filtering by property and by tenant"""
+        self.assertEqual(len(select_properties(self.data)), 3)
+        selected = select_properties(self.data, properties=["3306 Seminole Ave, Lynwood Property"])
+        self.assertEqual([p['to_renter'] for p in selected], ["Maria Mercedes"])
+        selected = select_properties(self.data, tenants=["Hector Garcia, Unit A"])
+        self.assertEqual([p['to_renter'] for p in selected], ["Hector Garcia"])
+
+    def test_generate_batch_collects_failures(self):
+        """Test that a failing invoice does not stop the rest of the run"""
+        progress = []
+        results = generate_batch(TEMPLATE, datetime(2024, 10, 1), self.tmp.name, store=JsonStore(self.data_file),
+                                 max_workers=2, progress=lambda *args: progress.append(args))
+
+        self.assertEqual(sorted(no for _, no, _ in results['generated']), ['29', '41'])
+        self.assertEqual([(tenant, no) for tenant, no, _ in results['failed']], [("Broken Tenant", '8')])
+        self.assertEqual(len(progress), 3)
+        for _, _, path in results['generated']:
+            self.assertTrue(os.path.exists(path))
+
+        # Numbers and dates were allocated and saved up front
+        with open(self.data_file) as f:
+            saved = json.load(f)
+        self.assertEqual([p['invoice_no']['high_water'] for p in saved['properties']], [29, 41, 8])
+        self.assertTrue(all(p['date'] == "10-01-2024" for p in saved['properties']))
+
+    def test_generate_statement_shares_template(self):
+        """Test that a combined statement embeds the template once for all invoices"""
+        from PyPDF2 import PdfReader
+
+        output_pdf = os.path.join(self.tmp.name, 'statement.pdf')
+        results = generate_statement(TEMPLATE, datetime(2024, 10, 1), output_pdf, store=JsonStore(self.data_file))
+
+        self.assertEqual([no for _, no, _ in results['generated']], ['29', '41'])
+        self.assertEqual([no for _, no, _ in results['failed']], ['8'])
+
+        reader = PdfReader(output_pdf)
+        self.assertEqual(len(reader.pages), 2)
+        forms = {page['/Resources']['/XObject'].raw_get('/GenInvTemplate').idnum for page in reader.pages}
+        self.assertEqual(len(forms), 1)
+        self.assertIn("Maria Mercedes", reader.pages[1].extract_text())
+        # Far smaller than the two standalone invoices it replaces
+        self.assertLess(os.path.getsize(output_pdf), os.path.getsize(TEMPLATE))
+
+        # The template's labels are annotations; the statement page draws them like the single invoice shows them
+        single_pdf = os.path.join(self.tmp.name, 'single.pdf')
+        self.assertTrue(fill_invoice(TEMPLATE, single_pdf, dict(self.data['properties'][0], invoice_no="29",
+                                                                 date="10-01-2024")))
+        single = PdfReader(single_pdf).pages[0]
+        labels = {annotation.get_object()['/Contents'] for annotation in single['/Annots']
+                  if annotation.get_object()['/Subtype'] == '/FreeText'}
+        self.assertEqual(labels, {"OWNER:", "RENTER:", "E-MAIL:"})
+        self.assertFalse(labels & drawn_words(single))
+        self.assertLessEqual(drawn_words(single) | labels, drawn_words(reader.pages[0]))
+
+    def test_generate_stream(self):
+        """Test that a streaming run renders and records each invoice from an iterator"""
+        jobs = JsonStore(self.data_file).allocate(datetime(2024, 10, 1))
+        ledger = InvoiceLedger(os.path.join(self.tmp.name, 'invoice_ledger.jsonl'))
+        results = generate_stream(TEMPLATE, iter(jobs), self.tmp.name, ledger=ledger)
+
+        self.assertEqual((results['generated'], results['failed'], results['stopped']), (2, 1, None))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, "Invoice 29 - Hector Garcia.pdf")))
+        self.assertEqual([r['invoice_no'] for r in ledger.records()], [29, 41])
+
+    def test_properties_sharing_a_number(self):
+        """Test that two properties allocated the same number get their own files and ledger records"""
+        from PyPDF2 import PdfReader
+
+        self.data['properties'][2] = {"date": "09-13-2024", "invoice_no": [28], "to_renter": "Ana Lopez, Unit B",
+                                      "property_address1": "10755 State St", "total": "$900.00",
+                                      "line_items": [["Monthly Rent", "$900.00"]]}
+        with open(self.data_file, 'w') as f:
+            json.dump(self.data, f)
+        ledger = InvoiceLedger(os.path.join(self.tmp.name, 'invoice_ledger.jsonl'))
+        results = generate_batch(TEMPLATE, datetime(2024, 10, 1), self.tmp.name, store=JsonStore(self.data_file),
+                                 ledger=ledger, max_workers=2)
+
+        self.assertEqual(results['failed'], [])
+        generated = sorted((tenant, no) for tenant, no, _ in results['generated'])
+        self.assertEqual(generated, [("Ana Lopez", '29'), ("Hector Garcia", '29'), ("Maria Mercedes", '41')])
+        self.assertEqual(len({path for _, _, path in results['generated']}), 3)
+        for tenant in ("Ana Lopez", "Hector Garcia"):
+            self.assertIn(tenant, PdfReader(os.path.join(self.tmp.name, f"Invoice 29 - {tenant}.pdf")).pages[0].extract_text())
+        self.assertEqual(sorted((r['tenant'], r['invoice_no']) for r in ledger.records()),
+                         [("Ana Lopez", 29), ("Hector Garcia", 29), ("Maria Mercedes", 41)])
+
+        # Both invoices numbered 30 make it into a combined statement
+        results = generate_statement(TEMPLATE, datetime(2024, 11, 1), os.path.join(self.tmp.name, 'statement.pdf'),
+                                     store=JsonStore(self.data_file))
+        self.assertEqual([(tenant, no) for tenant, no, _ in results['generated']],
+                         [("Hector Garcia", '30'), ("Maria Mercedes", '42'), ("Ana Lopez", '30')])
+
+    def test_ledger_error_doesnt_stop_the_run(self):
+        """Test that a failed ledger append is logged and the remaining invoices are still collected"""
+        ledger = Mock()
+        ledger.append.side_effect = [OSError("disk full"), None, None]
+        with self.assertLogs(level='ERROR') as logs:
+            results = generate_batch(TEMPLATE, datetime(2024, 10, 1), self.tmp.name, store=JsonStore(self.data_file),
+                                     ledger=ledger, max_workers=2)
+        self.assertEqual(len(results['generated']), 2)
+        self.assertEqual(len(results['failed']), 1)
+        self.assertEqual(ledger.append.call_count, 2)
+        self.assertTrue(any("in ledger: disk full" in line for line in logs.output))
+
+    def test_stream_memory_and_descriptors_stay_flat(self):
+        """Test that 10,000 streamed invoices hold no memory or file descriptors per invoice"""
+        fd_dir = '/proc/self/fd'
+        if not os.path.isdir(fd_dir):
+            self.skipTest("needs /proc to count file descriptors")
+
+        def records():
+            for n in range(1, 10001):
+                yield {"invoice_no": str(n), "date": "10-01-2024", "to_renter": f"Tenant {n}",
+                       "line_items": [["Monthly Rent", "$1,000.00"]], "total": "$1,000.00"}
+
+        def render(template_path, output_pdf, invoice_data, optimize, engine, output_cache):
+            # Same file handling as a real render, without the cost of 10,000 PDFs
+            with open(output_pdf, 'wb') as f:
+                f.write(json.dumps(invoice_data).encode('utf-8'))
+            os.remove(output_pdf)
+            return True, 1, 1
+
+        samples = {}
+
+        def progress(done, total, invoice_no, ok):
+            if done in (1000, 10000):
+                samples[done] = (tracemalloc.get_traced_memory()[0], len(os.listdir(fd_dir)))
+
+        tracemalloc.start()
+        try:
+            results = generate_stream(TEMPLATE, records(), self.tmp.name, progress=progress, render=render)
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(results['generated'], 10000)
+        self.assertLess(samples[10000][0] - samples[1000][0], 64 * 1024)
+        self.assertEqual(samples[10000][1], samples[1000][1])
+
+    def test_stream_real_renders_stay_flat(self):
+        """Test that a few hundred real renders hold no more memory or descriptors at the end than early on"""
+        fd_dir = '/proc/self/fd'
+        if not os.path.isdir(fd_dir):
+            self.skipTest("needs /proc to count file descriptors")
+
+        def records():
+            for n in range(1, 201):
+                yield {"invoice_no": str(n), "date": "10-01-2024", "to_renter": f"Tenant {n}",
+                       "property_address1": "3175 Seminole Ave", "line_items": [["Monthly Rent", "$1,000.00"]],
+                       "total": "$1,000.00"}
+
+        samples = {}
+
+        def progress(done, total, invoice_no, ok):
+            if done in (20, 200):
+                # tracemalloc makes real renders several times slower, so compare the
+                # blocks still allocated once PyPDF2's cycles have been collected
+                gc.collect()
+                samples[done] = (sys.getallocatedblocks(), len(os.listdir(fd_dir)))
+
+        results = generate_stream(TEMPLATE, records(), self.tmp.name, progress=progress, engine='direct')
+
+        self.assertEqual(results['generated'], 200)
+        self.assertLess(samples[200][0] - samples[20][0], 1000)
+        self.assertEqual(samples[200][1], samples[20][1])
+
+    def test_stream_enforces_memory_limit(self):
+        """Test that real renders stay under the limit, and a run that can't is stopped"""
+        jobs = [dict(JsonStore(self.data_file).allocate_one("Hector Garcia", datetime(2024, 10, 1)),
+                     invoice_no=str(n)) for n in range(100, 104)]
+        tracemalloc.start()
+        try:
+            generate_stream(TEMPLATE, iter(jobs[:1]), self.tmp.name, engine='direct')
+            limit = tracemalloc.get_traced_memory()[0] + 8 * 2**20
+            results = generate_stream(TEMPLATE, iter(jobs), self.tmp.name, max_memory=limit, engine='direct')
+            self.assertEqual((results['generated'], results['stopped']), (4, None))
+            self.assertLessEqual(results['peak_memory'], limit)
+
+            pulled = []
+            results = generate_stream(TEMPLATE, (pulled.append(job) or job for job in jobs), self.tmp.name,
+                                      max_memory=1, engine='direct')
+        finally:
+            tracemalloc.stop()
+        # The limit is checked before a record is pulled, so nothing was rendered over it
+        self.assertEqual(results['generated'], 0)
+        self.assertIn("limit", results['stopped'])
+        self.assertEqual(pulled, [])
+
+if __name__ == '__main__':
+    unittest.main()
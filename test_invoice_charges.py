@@ -0,0 +1,149 @@
+import unittest
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from invoice_charges import RateTable, split_cents, load_rates
+from invoice_data import Cents, parse_cents
+from invoice_ledger import ledger_record
+from invoice_store import JsonStore, SqliteStore
+
+RATES = {
+    "properties": {
+        "3175 Seminole Ave": {"utilities": {"Water": "$100.00", "Electric": "$250.01"},
+                              "fees": {"Internet": "$18.00"}, "tax_rate": "0.0825"}
+    },
+    "tenants": {
+        "Hector Garcia": {"property": "3175 Seminole Ave", "rent": "$1,312.50", "units": 2,
+                          "move_in": "01-01-2024", "fees": {"Parking": "$25.00"}, "discount": "$50.00"},
+        "Ana Lopez": {"property": "3175 Seminole Ave", "rent": "$900.00", "units": 1,
+                      "move_in": "09-16-2024"},
+        "Old Tenant": {"property": "3175 Seminole Ave", "rent": "$800.00", "move_in": "01-01-2023",
+                       "move_out": "08-31-2024"}
+    }
+}
+
+class TestInvoiceCharges(unittest.TestCase):
+    def test_split_cents_is_exact(self):
+        """Test that shares always add up to the bill"""
+        self.assertEqual(split_cents(100, [1, 1, 1]), [34, 33, 33])
+        self.assertEqual(sum(split_cents(25001, [60, 15, 7])), 25001)
+        self.assertEqual(split_cents(500, [0, 0]), [0, 0])
+
+    def test_month_charges(self):
+        """Test proration, utility splits, fees, discount and tax for one month"""
+        charges = RateTable(RATES).month(datetime(2024, 9, 1))
+
+        # Hector: 2 units x 30 days; Ana: 1 unit x 15 days (Sept 16-30) -> 60:15 split
+        ana = charges["Ana Lopez"]
+        self.assertEqual(ana['line_items'][0], ["Rent (15/30 days)", 45000])
+        self.assertEqual(ana['line_items'][1:3], [["Water", 2000], ["Electric", 5000]])
+
+        hector = charges["Hector Garcia"]
+        self.assertEqual(hector['line_items'][:3], [["Monthly Rent", 131250], ["Water", 8000], ["Electric", 20001]])
+        self.assertEqual(hector['line_items'][3:], [["Internet", 1800], ["Parking", 2500]])
+        self.assertEqual(hector['subtotal'], 159251)
+        self.assertEqual(hector['tax'], 13138)   # 8.25% of $1,592.51 = $131.382
+        self.assertEqual(hector['total'], 159251 - 5000 + 4300 + 13138)
+        self.assertEqual(str(hector['total']), "$1,716.89")
+
+        # Moved out before the month: nothing to bill
+        self.assertEqual(charges["Old Tenant"]['line_items'], [])
+        self.assertEqual(charges["Old Tenant"]['total'], 0)
+        self.assertEqual(RateTable(RATES).vacant(datetime(2024, 9, 1)), {"Old Tenant"})
+        self.assertEqual(RateTable(RATES).vacant(datetime(2024, 8, 1)), {"Ana Lopez"})
+
+    def test_amounts_become_strings_when_stored(self):
+        """Test that computed amounts are written to the ledger as stored strings"""
+        charges = RateTable(RATES).month(datetime(2024, 9, 1))["Ana Lopez"]
+        invoice_data = dict(charges, invoice_no="29", date="09-01-2024", to_renter="Ana Lopez")
+        record = json.loads(json.dumps(ledger_record(invoice_data)))
+        self.assertEqual(record['line_items'][0], ["Rent (15/30 days)", "$450.00"])
+        self.assertEqual(record['total'], str(charges['total']))
+        self.assertEqual(parse_cents(record['total']), charges['total'])
+        self.assertEqual(repr(Cents(5)), "Cents(5)")
+
+    def test_store_prices_allocations(self):
+        """Test that allocated invoices carry computed charges and the data file keeps its own"""
+        with tempfile.TemporaryDirectory() as tmp:
+            data_file = os.path.join(tmp, 'properties_data.json')
+            rates_file = os.path.join(tmp, 'invoice_rates.json')
+            with open(data_file, 'w') as f:
+                json.dump({"properties": [
+                    {"to_renter": "Ana Lopez", "property_address1": "3175 Seminole Ave", "invoice_no": 3,
+                     "date": "08-01-2024", "line_items": [["Rent", "$1.00"]], "total": "$1.00"}]}, f)
+            with open(rates_file, 'w') as f:
+                json.dump(RATES, f)
+
+            invoice_data = JsonStore(data_file, rates_file).allocate_one("Ana Lopez", datetime(2024, 9, 1))
+            self.assertEqual(invoice_data['invoice_no'], "4")
+            self.assertEqual(invoice_data['line_items'][0], ["Rent (15/30 days)", 45000])
+            with open(data_file) as f:
+                self.assertEqual(json.load(f)['properties'][0]['total'], "$1.00")
+
+    def test_vacant_tenants_use_no_number(self):
+        """Test that tenants out of residence all month are left out of allocation in both stores"""
+        with tempfile.TemporaryDirectory() as tmp:
+            data_file = os.path.join(tmp, 'properties_data.json')
+            rates_file = os.path.join(tmp, 'invoice_rates.json')
+            with open(data_file, 'w') as f:
+                json.dump({"properties": [
+                    {"to_renter": name, "property_address1": "3175 Seminole Ave", "invoice_no": [no],
+                     "date": "08-01-2024", "line_items": [["Rent", "$1.00"]], "total": "$1.00"}
+                    for name, no in (("Hector Garcia", 28), ("Old Tenant", 7))]}, f)
+            with open(rates_file, 'w') as f:
+                json.dump(RATES, f)
+
+            sqlite_store = SqliteStore(os.path.join(tmp, 'properties_data.db'), rates_file)
+            sqlite_store.import_json(data_file)
+            try:
+                for store in (JsonStore(data_file, rates_file), sqlite_store):
+                    with self.assertLogs(level='INFO') as logs:
+                        jobs = store.allocate(datetime(2024, 9, 1))
+                    self.assertEqual([job['to_renter'] for job in jobs], ["Hector Garcia"])
+                    self.assertIn("Old Tenant has no days in residence in September 2024", logs.output[0])
+                    with self.assertRaisesRegex(ValueError, "no days in residence"):
+                        store.allocate_one("Old Tenant", datetime(2024, 9, 1))
+                    self.assertEqual(store.next_invoice_number("Old Tenant"), 8)
+            finally:
+                sqlite_store.close()
+
+    def test_portfolio_in_one_pass(self):
+        """Test that a month for thousands of units is priced quickly and cached"""
+        spec = {"properties": {}, "tenants": {}}
+        for p in range(500):
+            spec["properties"][f"{p} Main St"] = {"utilities": {"Water": "$333.33", "Gas": "$101.01"},
+                                                   "fees": {"Trash": "$12.00"}, "tax_rate": "0.07"}
+            for t in range(8):
+                spec["tenants"][f"Tenant {p}-{t}"] = {"property": f"{p} Main St", "rent": "$1,234.56",
+                                                       "units": t % 3 + 1, "move_in": f"09-{t * 3 + 1:02d}-2024"}
+        table = RateTable(spec)
+
+        start = time.perf_counter()
+        charges = table.month(datetime(2024, 9, 15))
+        elapsed = time.perf_counter() - start
+        self.assertEqual(len(charges), 4000)
+        self.assertLess(elapsed, 0.5)
+        self.assertIs(table.month(datetime(2024, 9, 30)), charges)
+
+        water = sum(items[1][1] for name, c in charges.items() if name.startswith("Tenant 7-")
+                    for items in [c['line_items']])
+        self.assertEqual(water, 33333)
+
+    def test_load_rates_follows_file(self):
+        """Test that the compiled table is reused until the file changes"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'invoice_rates.json')
+            self.assertIsNone(load_rates(path))
+            with open(path, 'w') as f:
+                json.dump(RATES, f)
+            table = load_rates(path)
+            self.assertIs(load_rates(path), table)
+            with open(path, 'w') as f:
+                json.dump({"properties": {}, "tenants": {}}, f)
+            os.utime(path, ns=(0, 0))
+            self.assertIsNot(load_rates(path), table)
+
+if __name__ == '__main__':
+    unittest.main()
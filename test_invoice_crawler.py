@@ -0,0 +1,68 @@
+import unittest
+import os
+import tempfile
+from invoice_generator import fill_invoice
+from invoice_crawler import PdfIndex, extract_invoice, open_pdf_index
+from invoice_handler import InvoiceNumbers
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Invoice Master.pdf')
+
+class TestInvoiceCrawler(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, 'Properties')
+        self.index_file = os.path.join(self.tmp.name, 'invoice_pdf_index.json')
+        self.tenant_dir = os.path.join(self.root, '3175 Seminole Ave, SouthGate Property', 'tenants', 'Hector Garcia')
+        os.makedirs(self.tenant_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_invoice(self, invoice_no, billing_date="10-01-2024", total="$1,368.00"):
+        output_pdf = os.path.join(self.tenant_dir, f"Invoice {invoice_no}.pdf")
+        self.assertTrue(fill_invoice(TEMPLATE, output_pdf, {
+            "date": billing_date, "invoice_no": str(invoice_no), "to_renter": "Hector Garcia",
+            "property_address1": "3175 Seminole Ave", "total": total, "tax": "$0.00",
+            "line_items": [["Monthly Rent", total]]}))
+        return output_pdf
+
+    def test_extract_invoice(self):
+        """Test reading number, date and total back from a generated invoice"""
+        path = self.make_invoice(29, "09-13-2024", "$1,368.00")
+        self.assertEqual(extract_invoice(path), {'date': "09-13-2024", 'invoice_no': 29, 'total': "$1,368.00"})
+
+    def test_rescan_only_reads_changed_files(self):
+        """Test that the index survives sessions and only re-extracts what changed"""
+        self.make_invoice(28)
+        changed = self.make_invoice(29)
+
+        stats = open_pdf_index(self.root, self.index_file).scan(max_workers=2)
+        self.assertEqual((stats['files'], stats['extracted']), (2, 2))
+
+        index = open_pdf_index(self.root, self.index_file)
+        self.assertEqual(index.scan(max_workers=2)['unchanged'], 2)
+
+        # Regenerate one invoice with a different total and delete the other
+        self.make_invoice(29, total="$1,400.00")
+        os.utime(changed, ns=(0, os.stat(changed).st_mtime_ns + 10**9))
+        os.remove(os.path.join(self.tenant_dir, "Invoice 28.pdf"))
+        stats = index.scan(max_workers=2)
+        self.assertEqual((stats['extracted'], stats['unchanged'], stats['removed']), (1, 0, 1))
+        self.assertEqual([e['total'] for e in index.search(tenant="Hector Garcia")], ["$1,400.00"])
+
+    def test_reconcile(self):
+        """Test comparing filed PDFs with the issued invoice numbers"""
+        self.make_invoice(28)
+        self.make_invoice(40)
+        index = PdfIndex(self.root, self.index_file)
+        index.scan(max_workers=1)
+
+        issued = {"Hector Garcia": InvoiceNumbers.from_value({"ranges": [[27, 29]], "high_water": 29}),
+                  "Maria Mercedes": InvoiceNumbers.from_value([5])}
+        self.assertEqual(index.reconcile(issued), {
+            "Hector Garcia": {'missing': [[27, 27], [29, 29]], 'unexpected': [40]},
+            "Maria Mercedes": {'missing': [[5, 5]], 'unexpected': []},
+        })
+
+if __name__ == '__main__':
+    unittest.main()
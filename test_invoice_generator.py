@@ -0,0 +1,148 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from PyPDF2 import PdfReader
+from invoice_generator import fill_invoice, TemplateCache, template_cache
+from invoice_layout import get_layout, paginate, _content_data, DIRECT_FONT, LINE_ITEMS_PER_PAGE
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Invoice Master.pdf')
+
+def drawn_text(page):
+    """(text, x, y, base font, size) of every string drawn on a page"""
+    drawn = []
+
+    def visit(text, cm, tm, font, size):
+        if text.strip():
+            base_font = font.get('/BaseFont') if font else None
+            drawn.append((text, round(tm[4] + cm[4], 3), round(tm[5] + cm[5], 3), base_font, size))
+
+    page.extract_text(visitor_text=visit)
+    return sorted(drawn)
+
+class TestInvoiceGenerator(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data = {
+            "date": "09-13-2024",
+            "invoice_no": "29",
+            "to_renter": "Hector Garcia",
+            "property_address1": "3175 Seminole Ave",
+            "total": "$1,368.00",
+            "line_items": [["Monthly Rent", "$1,312.50"], ["Water", "$37.50"]]
+        }
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_fill_invoice_reuses_template(self):
+        """Test that repeated invoices don't accumulate each other's overlays"""
+        for i in range(3):
+            output_pdf = os.path.join(self.tmp.name, f"Invoice {i}.pdf")
+            self.assertTrue(fill_invoice(TEMPLATE, output_pdf, self.data))
+
+        text = PdfReader(output_pdf).pages[0].extract_text()
+        self.assertEqual(text.count("Hector Garcia"), 1)
+
+    def test_paginate(self):
+        """Test splitting line items into pages with the last page flagged"""
+        self.assertEqual(list(paginate([], 3)), [([], True)])
+        self.assertEqual(list(paginate(range(6), 3)), [([0, 1, 2], False), ([3, 4, 5], True)])
+        self.assertEqual(list(paginate(iter(range(4)), 3)), [([0, 1, 2], False), ([3], True)])
+
+    def test_long_statement_continues_on_more_pages(self):
+        """Test that long line-item lists paginate with totals only on the last page"""
+        count = LINE_ITEMS_PER_PAGE * 2 + 3
+        self.data['line_items'] = ((f"Meter {i}", f"${i}.00") for i in range(count))
+        output_pdf = os.path.join(self.tmp.name, "Invoice 29.pdf")
+        self.assertTrue(fill_invoice(TEMPLATE, output_pdf, self.data))
+
+        pages = [page.extract_text() for page in PdfReader(output_pdf).pages]
+        self.assertEqual(len(pages), 3)
+        self.assertEqual([("$1,368.00" in text) for text in pages], [False, False, True])
+        self.assertIn("Continued on page 2", pages[0])
+        self.assertTrue(all("Hector Garcia" in text for text in pages))
+        self.assertIn(f"Meter {count - 1}", pages[2])
+
+    def test_direct_engine_matches_reportlab(self):
+        """Test that the direct engine draws exactly what the reportlab engine draws"""
+        self.data['to_renter'] = "Hector (Garcia) \\ Café"
+        self.data['line_items'] = [(f"Meter {i}", f"${i}.00") for i in range(LINE_ITEMS_PER_PAGE + 3)]
+
+        # The text operators are byte-for-byte the ones reportlab writes
+        layout = get_layout()
+        for page_no, (line_items, is_last) in enumerate(layout.paginate(self.data['line_items']), 1):
+            rendered = _content_data(PdfReader(layout.render(self.data, line_items, page_no, is_last)).pages[0])
+            direct = layout.direct_content(self.data, line_items, page_no, is_last)
+            self.assertEqual([line for line in direct.splitlines() if line.startswith(b"BT 1 0 0 1")],
+                             [line for line in rendered.splitlines() if line.startswith(b"BT 1 0 0 1")])
+            self.assertIn(b"BT /F1 10 Tf 12 TL ET", rendered)
+            self.assertTrue(direct.startswith(b"BT " + DIRECT_FONT.encode() + b" 10 Tf 12 TL ET"))
+
+        # And the finished pages show the same strings in the same places and font
+        pages = {}
+        for engine in ('reportlab', 'direct'):
+            output_pdf = os.path.join(self.tmp.name, f"Invoice {engine}.pdf")
+            self.assertTrue(fill_invoice(TEMPLATE, output_pdf, self.data, engine))
+            pages[engine] = [drawn_text(page) for page in PdfReader(output_pdf).pages]
+        self.assertEqual(len(pages['direct']), 2)
+        self.assertEqual(pages['direct'], pages['reportlab'])
+
+    def test_direct_engine_falls_back(self):
+        """Test that text outside WinAnsi goes through reportlab instead"""
+        self.data['to_renter'] = "Hector 日本"
+        self.assertIsNone(get_layout().direct_content(self.data, self.data['line_items']))
+        output_pdf = os.path.join(self.tmp.name, "Invoice 29.pdf")
+        self.assertTrue(fill_invoice(TEMPLATE, output_pdf, self.data, 'direct'))
+        self.assertIn("$1,368.00", PdfReader(output_pdf).pages[0].extract_text())
+        self.assertFalse(fill_invoice(TEMPLATE, output_pdf, self.data, 'typewriter'))
+
+    def test_template_cache_invalidation(self):
+        """Test that the cache re-parses only when the template's content changes"""
+        cache = TemplateCache()
+        template = os.path.join(self.tmp.name, 'template.pdf')
+        shutil.copy(TEMPLATE, template)
+
+        reader = cache.reader(template)
+        self.assertIs(cache.reader(template), reader)
+
+        # Touching the file keeps the parse because the hash is unchanged
+        stat = os.stat(template)
+        os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertIs(cache.reader(template), reader)
+
+        # Changing the content forces a re-parse
+        with open(template, 'ab') as f:
+            f.write(b"\n% changed\n")
+        self.assertIsNot(cache.reader(template), reader)
+        self.assertNotEqual(cache.template_hash(template), template_cache.template_hash(TEMPLATE))
+
+    def test_template_cache_across_threads(self):
+        """Test that threads rendering from a cold cache all produce the same invoice"""
+        template_cache.clear()
+        errors = []
+        start = threading.Barrier(6)
+
+        def render(n):
+            start.wait()
+            for i in range(3):
+                if not fill_invoice(TEMPLATE, os.path.join(self.tmp.name, f"Invoice {n}-{i}.pdf"), self.data,
+                                    engine=('direct', 'reportlab')[n % 2]):
+                    errors.append((n, i))
+
+        threads = [threading.Thread(target=render, args=(n,)) for n in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        expected = drawn_text(PdfReader(os.path.join(self.tmp.name, "Invoice 0-0.pdf")).pages[0])
+        for n in range(6):
+            for i in range(3):
+                page = PdfReader(os.path.join(self.tmp.name, f"Invoice {n}-{i}.pdf")).pages[0]
+                self.assertEqual(drawn_text(page), expected)
+
+if __name__ == '__main__':
+    unittest.main()
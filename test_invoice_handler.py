@@ -0,0 +1,82 @@
+import unittest
+import random
+import time
+from invoice_handler import InvoiceNumbers, update_invoice_numbers, reserve_invoice_numbers
+
+class TestInvoiceNumbers(unittest.TestCase):
+    def test_migrate_legacy_list(self):
+        """Test migrating the old list format, including gaps and duplicates"""
+        numbers = InvoiceNumbers.from_value([1, 2, 3, 7, 8, 3, 5])
+        self.assertEqual(numbers.ranges, [[1, 3], [5, 5], [7, 8]])
+        self.assertEqual(numbers.high_water, 8)
+        self.assertEqual(numbers.duplicates, [3])
+        self.assertEqual(numbers.gaps(), [[4, 4], [6, 6]])
+        self.assertEqual(list(numbers), [1, 2, 3, 5, 7, 8])
+        self.assertIn(5, numbers)
+        self.assertNotIn(6, numbers)
+
+    def test_update_invoice_numbers(self):
+        """Test allocating from legacy, single-number and range formats"""
+        property_data = {'invoice_no': [28]}
+        self.assertEqual(update_invoice_numbers(property_data), "29")
+        self.assertEqual(property_data['invoice_no'], {'ranges': [[28, 29]], 'high_water': 29})
+
+        property_data = {'invoice_no': "12"}
+        self.assertEqual(update_invoice_numbers(property_data), "13")
+
+        # Unsorted legacy lists no longer trust the last element
+        property_data = {'invoice_no': [30, 10]}
+        self.assertEqual(update_invoice_numbers(property_data), "31")
+
+    def test_reserve_block(self):
+        """Test reserving a block of numbers for a batch run"""
+        property_data = {'invoice_no': {'ranges': [[1, 5], [9, 10]], 'high_water': 10}}
+        self.assertEqual(reserve_invoice_numbers(property_data, 3), ["11", "12", "13"])
+        self.assertEqual(property_data['invoice_no'], {'ranges': [[1, 5], [9, 13]], 'high_water': 13})
+
+    def test_reserve_rejects_empty_blocks(self):
+        """Test that reserving zero or fewer numbers raises and leaves the numbers alone"""
+        for count in (0, -2):
+            numbers = InvoiceNumbers()
+            with self.assertRaises(ValueError):
+                numbers.reserve(count)
+            self.assertEqual((numbers.ranges, numbers.high_water), ([], 0))
+
+        property_data = {'invoice_no': {'ranges': [[1, 5]], 'high_water': 5}}
+        with self.assertRaises(ValueError):
+            reserve_invoice_numbers(property_data, 0)
+        self.assertEqual(property_data['invoice_no'], {'ranges': [[1, 5]], 'high_water': 5})
+
+    def test_compact_after_many_allocations(self):
+        """Test that sequential allocation keeps a single range"""
+        property_data = {'invoice_no': []}
+        for _ in range(1000):
+            update_invoice_numbers(property_data)
+        self.assertEqual(property_data['invoice_no'], {'ranges': [[1, 1000]], 'high_water': 1000})
+
+    def test_scattered_adds(self):
+        """Test that out-of-order adds merge ranges correctly and don't slow down as ranges pile up"""
+        numbers = list(range(1, 40001, 2)) + list(range(2, 40001, 2))
+        random.Random(7).shuffle(numbers)
+        issued = InvoiceNumbers()
+        start = time.perf_counter()
+        for n in numbers[:20000]:
+            issued.add(n)
+        checked = sum(1 for n in range(1, 40001) if n in issued)
+        elapsed = time.perf_counter() - start
+
+        expected = set(numbers[:20000])
+        self.assertEqual(checked, len(expected))
+        self.assertEqual(list(issued), sorted(expected))
+        self.assertEqual(issued._starts, [r[0] for r in issued.ranges])
+        self.assertLess(elapsed, 1.0)
+
+        for n in numbers[20000:]:
+            issued.add(n)
+        self.assertEqual(issued.ranges, [[1, 40000]])
+        self.assertEqual(issued._starts, [1])
+        issued.add(7)
+        self.assertEqual(issued.duplicates, [7])
+
+if __name__ == '__main__':
+    unittest.main()
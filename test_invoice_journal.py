@@ -0,0 +1,111 @@
+import unittest
+import os
+import json
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from unittest.mock import patch
+from invoice_handler import InvoiceNumbers
+from invoice_journal import DataFile, file_lock
+from invoice_store import JsonStore
+
+def allocate_many(data_file, count):
+    """Run in another process: allocate `count` invoices one at a time"""
+    store = JsonStore(data_file)
+    return [int(store.allocate_one("Hector Garcia", datetime(2024, 10, 1))['invoice_no']) for _ in range(count)]
+
+class TestDataFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.tmp.name, 'properties_data.json')
+        with open(self.data_file, 'w') as f:
+            json.dump({"properties": [
+                {"date": "09-13-2024", "invoice_no": [28], "to_renter": "Hector Garcia",
+                 "property_address1": "3175 Seminole Ave", "total": "$1,368.00"},
+                {"date": "09-13-2024", "invoice_no": [40], "to_renter": "Maria Mercedes, Unit B",
+                 "property_address1": "3306 Seminole Ave", "total": "$900.00"},
+                {"date": "09-13-2024", "invoice_no": [7], "to_renter": "John Smith",
+                 "property_address1": "10755 State St", "total": "$1,100.00"}
+            ]}, f)
+        self.store = JsonStore(self.data_file)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def on_disk(self, tenant_index=0):
+        with open(self.data_file, 'r') as f:
+            return json.load(f)['properties'][tenant_index]
+
+    def test_processes_never_share_a_number(self):
+        """Test that concurrent processes allocating for one tenant get distinct numbers"""
+        with ProcessPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(allocate_many, [self.data_file] * 4, [10] * 4))
+        numbers = sorted(n for result in results for n in result)
+        self.assertEqual(numbers, list(range(29, 69)))
+        self.assertEqual(InvoiceNumbers.from_value(self.on_disk()['invoice_no']).last, 68)
+        self.assertFalse(os.path.exists(self.data_file + '.tmp'))
+
+    def test_failed_rewrite_is_replayed(self):
+        """Test that an allocation survives a failed rewrite of the data file through the journal"""
+        with patch('invoice_data.os.replace', side_effect=OSError("file in use")):
+            invoice_data = self.store.allocate_one("Hector Garcia", datetime(2024, 10, 1))
+        self.assertEqual(invoice_data['invoice_no'], "29")
+        self.assertEqual(self.on_disk()['date'], "09-13-2024")
+        self.assertGreater(os.path.getsize(self.data_file + '.journal'), 0)
+
+        # Another process's lookups see the journaled allocation; its next write folds it into the file
+        other = JsonStore(self.data_file)
+        self.assertEqual(other.next_invoice_number("Hector Garcia"), 30)
+        self.assertEqual(self.on_disk()['date'], "09-13-2024")
+        self.assertEqual(other.allocate_one("Hector Garcia", datetime(2024, 11, 1))['invoice_no'], "30")
+        self.assertEqual(self.on_disk()['date'], "11-01-2024")
+        self.assertEqual(os.path.getsize(self.data_file + '.journal'), 0)
+
+    def test_torn_journal_line_is_ignored(self):
+        """Test that a journal group cut off mid-write is not applied"""
+        data_file = DataFile(self.data_file)
+        with open(data_file.journal_path, 'wb') as f:
+            f.write(b'[{"tenant":"Hector Garcia","property":"3175 Seminole Ave","date":"10-01-2024","invoice_no":[29]}]\n')
+            f.write(b'[{"tenant":"Hector Garcia","property":"3175 Sem')
+        self.assertEqual(data_file.read()['properties'][0]['invoice_no'], [29])
+        # Replaying again changes nothing
+        self.assertEqual(data_file.read()['properties'][0]['invoice_no'], [29])
+
+    def test_batch_is_one_group_commit(self):
+        """Test that a batch allocation costs one fsync and one rewrite, and the journal is only synced on failure"""
+        with patch('invoice_journal.os.fsync', wraps=os.fsync) as fsync:
+            jobs = self.store.allocate(datetime(2024, 10, 1))
+        self.assertEqual([job['invoice_no'] for job in jobs], ["29", "41", "8"])
+        self.assertEqual(fsync.call_count, 1)
+        self.assertEqual([self.on_disk(i)['date'] for i in range(3)], ["10-01-2024"] * 3)
+
+        with patch('invoice_journal.os.fsync', wraps=os.fsync) as fsync, \
+             patch('invoice_data.os.replace', side_effect=OSError("file in use")):
+            self.store.allocate(datetime(2024, 11, 1))
+        self.assertEqual(fsync.call_count, 2)
+        self.assertEqual(self.store.next_invoice_number("Hector Garcia"), 31)
+
+    def test_reads_share_the_lock(self):
+        """Test that lookups don't create the lock file and run alongside each other, but wait for writers"""
+        data_file = DataFile(self.data_file)
+        self.assertEqual(data_file.read()['properties'][0]['invoice_no'], [28])
+        self.assertFalse(os.path.exists(data_file.lock_path))
+
+        self.store.allocate_one("Hector Garcia", datetime(2024, 10, 1))
+        read = threading.Thread(target=data_file.read)
+        with file_lock(data_file.lock_path, shared=True):
+            read.start()
+            read.join(timeout=5)
+            self.assertFalse(read.is_alive())
+
+        read = threading.Thread(target=data_file.read)
+        with file_lock(data_file.lock_path):
+            read.start()
+            read.join(timeout=0.2)
+            self.assertTrue(read.is_alive())
+        read.join(timeout=5)
+        self.assertFalse(read.is_alive())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import os
+import json
+import tempfile
+from unittest.mock import patch
+from PyPDF2 import PdfReader
+import invoice_layout
+from invoice_layout import Layout, STANDARD_LAYOUT, get_layout, clear_layouts
+from invoice_generator import fill_invoice
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Invoice Master.pdf')
+
+class TestInvoiceLayout(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data = {
+            "date": "09-13-2024",
+            "invoice_no": "29",
+            "to_renter": "Hector Garcia",
+            "from_company": "GenInv Property Management",
+            "property_address1": "3175 Seminole Ave",
+            "total": "$1,368.00",
+            "line_items": [["Monthly Rent", "$1,312.50"]]
+        }
+
+    def tearDown(self):
+        clear_layouts()
+        self.tmp.cleanup()
+
+    def test_static_fields_rendered_once(self):
+        """Test that static fields are cached per set of values and dynamic ones redrawn"""
+        layout = Layout('test', STANDARD_LAYOUT)
+        with patch.object(layout, 'draw_static', wraps=layout.draw_static) as draw_static:
+            first = layout.overlay(self.data, self.data['line_items'])
+            second = layout.overlay(dict(self.data, invoice_no="30"), self.data['line_items'])
+            self.assertEqual(draw_static.call_count, 1)
+            layout.overlay(dict(self.data, to_renter="Maria Mercedes"), self.data['line_items'])
+            self.assertEqual(draw_static.call_count, 2)
+
+        self.assertIn("Hector Garcia", second.extract_text())
+        self.assertIn("30", second.extract_text())
+        self.assertNotIn("30", first.extract_text())
+
+    def test_overlay_matches_full_render(self):
+        """Test that the cached overlay draws the same text as a full render"""
+        layout = Layout('test', STANDARD_LAYOUT)
+        full = PdfReader(layout.render(self.data, self.data['line_items'])).pages[0].extract_text()
+        overlay = layout.overlay(self.data, self.data['line_items']).extract_text()
+        self.assertEqual(sorted(full.split("\n")), sorted(overlay.split("\n")))
+
+    def test_layouts_file_adds_templates(self):
+        """Test that a record can pick a layout (and its template) declared in the layouts file"""
+        spec = dict(STANDARD_LAYOUT, template=TEMPLATE, font=['Courier', 9])
+        layouts_file = os.path.join(self.tmp.name, 'invoice_layouts.json')
+        with open(layouts_file, 'w') as f:
+            json.dump({'compact': spec}, f)
+
+        with patch.object(invoice_layout, 'LAYOUTS_FILE', layouts_file):
+            self.assertEqual(get_layout('compact').font, ('Courier', 9))
+            self.assertIs(get_layout('compact'), get_layout('compact'))
+            self.assertEqual(get_layout('compact').template_for('other.pdf'), TEMPLATE)
+
+            output_pdf = os.path.join(self.tmp.name, "Invoice 29.pdf")
+            self.assertTrue(fill_invoice('missing.pdf', output_pdf, dict(self.data, layout='compact')))
+            self.assertIn("Hector Garcia", PdfReader(output_pdf).pages[0].extract_text())
+
+            # An unknown layout fails the invoice like any other render error
+            self.assertFalse(fill_invoice(TEMPLATE, output_pdf, dict(self.data, layout='nope')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import os
+import tempfile
+import multiprocessing
+from datetime import date
+from unittest.mock import Mock, patch
+from invoice_ledger import InvoiceLedger, ledger_record, INDEX_ENTRY
+
+def append_many(path, first, count):
+    ledger = InvoiceLedger(path)
+    for n in range(first, first + count):
+        ledger.append({'invoice_no': n, 'date': "10-01-2024", 'property': "3175 Seminole Ave",
+                       'tenant': f"Tenant {n}", 'total': "$1,000.00"})
+
+def seed_history(path, barrier):
+    barrier.wait()
+    return InvoiceLedger(path).seed(lambda: [{"date": "09-13-2024", "invoice_no": n, "property": "3175 Seminole Ave",
+                                             "tenant": "Hector Garcia", "amount": "$1,368.00"} for n in range(50)])
+
+class TestInvoiceLedger(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.ledger = InvoiceLedger(os.path.join(self.tmp.name, 'invoice_ledger.jsonl'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def invoice(self, invoice_no, billing_date, total):
+        return {"invoice_no": str(invoice_no), "date": billing_date, "to_renter": "Hector Garcia, Unit A",
+                "property_address1": "3175 Seminole Ave", "total": total,
+                "line_items": [["Monthly Rent", total]]}
+
+    def test_append_and_stream(self):
+        """Test that each invoice keeps its own date and total"""
+        self.ledger.append(ledger_record(self.invoice(28, "09-01-2024", "$1,000.00"), "Invoice 28.pdf", "abc"))
+        self.ledger.append(ledger_record(self.invoice(29, "10-01-2024", "$1,100.00"), "Invoice 29.pdf", "abc"))
+
+        records = list(self.ledger.records())
+        self.assertEqual([(r['invoice_no'], r['date'], r['total']) for r in records],
+                         [(28, "09-01-2024", "$1,000.00"), (29, "10-01-2024", "$1,100.00")])
+        self.assertEqual(records[0]['tenant'], "Hector Garcia")
+        self.assertEqual(records[1]['output_pdf'], "Invoice 29.pdf")
+        self.assertEqual([row['invoice_no'] for row in self.ledger.history()], [29, 28])
+
+    def test_appends_from_several_processes(self):
+        """Test that every index entry points at its own record when processes append at once"""
+        workers = [multiprocessing.Process(target=append_many, args=(self.ledger.path, first, 200))
+                   for first in range(0, 800, 200)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        with open(self.ledger.index_path, 'rb') as f:
+            offsets = [offset for _, offset in INDEX_ENTRY.iter_unpack(f.read())]
+        self.assertEqual(len(offsets), 800)
+        self.assertEqual(offsets, sorted(set(offsets)))
+        ends = [end for end, _ in self.ledger.tail()]
+        self.assertEqual(offsets, [0] + ends[:-1])
+        numbers = sorted(record['invoice_no'] for record in self.ledger.between(date(2024, 10, 1), date(2024, 10, 1)))
+        self.assertEqual(numbers, list(range(800)))
+
+    def test_between_uses_index(self):
+        """Test seeking records by billing date range"""
+        for month in range(1, 13):
+            self.ledger.append(ledger_record(self.invoice(month, f"{month:02d}-01-2024", "$1.00")))
+
+        found = list(self.ledger.between(date(2024, 3, 1), date(2024, 5, 31)))
+        self.assertEqual([r['invoice_no'] for r in found], [3, 4, 5])
+        self.assertEqual(list(self.ledger.between(date(2025, 1, 1), date(2025, 12, 31))), [])
+
+    def test_seed(self):
+        """Test seeding a new ledger from existing history rows, and only a new one"""
+        self.assertTrue(self.ledger.seed(lambda: [{"date": "09-13-2024", "invoice_no": 28, "property": "3175 Seminole Ave",
+                                                   "tenant": "Hector Garcia", "amount": "$1,368.00"}]))
+        self.assertEqual(self.ledger.history()[0]['amount'], "$1,368.00")
+
+        history = Mock(return_value=[])
+        self.assertFalse(self.ledger.seed(history))
+        history.assert_not_called()
+        self.assertEqual(len(self.ledger.history()), 1)
+
+    def test_seeding_from_several_processes(self):
+        """Test that processes starting together seed the ledger exactly once"""
+        with multiprocessing.Manager() as manager:
+            barrier = manager.Barrier(4)
+            with multiprocessing.Pool(4) as pool:
+                seeded = pool.starmap(seed_history, [(self.ledger.path, barrier)] * 4)
+        self.assertEqual(seeded.count(True), 1)
+        self.assertEqual(sorted(record['invoice_no'] for record in self.ledger.records()), list(range(50)))
+
+    def test_cached_history(self):
+        """Test that the history snapshot is reused and only newer records are added to it"""
+        self.ledger.append(ledger_record(self.invoice(28, "09-01-2024", "$1,000.00")))
+        self.assertEqual([row['invoice_no'] for row in self.ledger.cached_history()], [28])
+        self.assertTrue(os.path.exists(self.ledger.history_path))
+
+        self.ledger.append(ledger_record(self.invoice(29, "10-01-2024", "$1,100.00")))
+        with patch.object(self.ledger, 'records', side_effect=AssertionError("full rescan")):
+            rows = self.ledger.cached_history()
+        self.assertEqual([row['invoice_no'] for row in rows], [29, 28])
+        self.assertEqual(rows, self.ledger.history())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import io
+import os
+import tempfile
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import NameObject
+from invoice_generator import fill_invoice
+from invoice_optimize import optimize_file, optimize_pdf
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Invoice Master.pdf')
+
+class TestInvoiceOptimize(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output_pdf = os.path.join(self.tmp.name, "Invoice 29.pdf")
+        data = {
+            "date": "09-13-2024",
+            "invoice_no": "29",
+            "to_renter": "Hector Garcia",
+            "total": "$1,368.00",
+            "line_items": [[f"Charge {i}", "$10.00"] for i in range(25)]
+        }
+        self.assertTrue(fill_invoice(TEMPLATE, self.output_pdf, data))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_optimize_shrinks_and_keeps_content(self):
+        """Test that an optimized invoice is smaller and reads the same"""
+        before_text = [page.extract_text() for page in PdfReader(self.output_pdf).pages]
+
+        before, after = optimize_file(self.output_pdf)
+
+        self.assertLess(after, before)
+        self.assertEqual(os.path.getsize(self.output_pdf), after)
+        reader = PdfReader(self.output_pdf)
+        self.assertEqual([page.extract_text() for page in reader.pages], before_text)
+
+        # The overlay font each page brought along is stored once
+        fonts = {page['/Resources']['/Font'].raw_get(name).idnum
+                 for page in reader.pages for name in page['/Resources']['/Font']
+                 if page['/Resources']['/Font'][name].get('/BaseFont') == '/Helvetica'}
+        self.assertEqual(len(fonts), 1)
+
+    def test_blank_fields_and_their_font_are_dropped(self):
+        """Test that a real invoice loses the template's blank form fields and the font only they used"""
+        before_text = [page.extract_text() for page in PdfReader(self.output_pdf).pages]
+
+        before, after = optimize_file(self.output_pdf)
+
+        # The embedded form font is most of the file
+        self.assertLess(after, before * 0.3)
+        reader = PdfReader(self.output_pdf)
+        self.assertEqual([page.extract_text() for page in reader.pages], before_text)
+        for page in reader.pages:
+            # The labels, masking strokes and link are still there
+            self.assertEqual(sorted(annotation.get_object()['/Subtype'] for annotation in page['/Annots']),
+                             ['/FreeText'] * 3 + ['/Ink'] * 4 + ['/Link'])
+
+    def test_fields_kept_without_drop_fields(self):
+        """Test that the other steps leave the form fields, and with them most of the size"""
+        with open(self.output_pdf, 'rb') as f:
+            content = f.read()
+        optimized = optimize_pdf(content, ('compress', 'dedupe', 'drop_unused'))
+        self.assertGreater(len(optimized), len(content) * 0.9)
+        self.assertIn('/Widget', [annotation.get_object()['/Subtype']
+                                  for annotation in PdfReader(io.BytesIO(optimized)).pages[0]['/Annots']])
+
+    def test_drop_unused_resources(self):
+        """Test that resources no content refers to are dropped"""
+        writer = PdfWriter()
+        writer.add_page(PdfReader(self.output_pdf).pages[0])
+        fonts = writer.pages[0]['/Resources']['/Font']
+        fonts[NameObject('/Unused')] = fonts.raw_get(next(iter(fonts)))
+        content = io.BytesIO()
+        writer.write(content)
+
+        optimized = optimize_pdf(content.getvalue(), ('drop_unused',))
+
+        fonts = PdfReader(io.BytesIO(optimized)).pages[0]['/Resources']['/Font']
+        self.assertNotIn('/Unused', fonts)
+        self.assertTrue(len(fonts) > 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import unittest
+import os
+import json
+import tempfile
+from unittest.mock import patch
+import invoice_generator
+from invoice_data import Cents
+from invoice_generator import fill_invoice
+from invoice_layout import get_layout
+from invoice_output_cache import OutputCache
+from geninv import main
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Invoice Master.pdf')
+
+DATA = {"invoice_no": "29", "date": "10-01-2024", "to_renter": "Hector Garcia",
+        "property_address1": "3175 Seminole Ave", "line_items": [["Monthly Rent", "$1,312.50"]],
+        "total": "$1,312.50"}
+
+class TestOutputCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = OutputCache(os.path.join(self.tmp.name, 'cache'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def output(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_hit_reuses_rendered_pdf(self):
+        """Test that the same invoice is linked from the cache and changed data is rendered"""
+        self.assertTrue(fill_invoice(TEMPLATE, self.output('first.pdf'), DATA, output_cache=self.cache))
+        self.assertTrue(fill_invoice(TEMPLATE, self.output('again.pdf'), dict(DATA, unused_field="x"),
+                                     output_cache=self.cache))
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.read(self.output('again.pdf')), self.read(self.output('first.pdf')))
+        self.assertEqual(os.stat(self.output('again.pdf')).st_ino, os.stat(self.output('first.pdf')).st_ino)
+
+        # A drawn field or the engine changing is a different invoice
+        fill_invoice(TEMPLATE, self.output('changed.pdf'), dict(DATA, total="$1,312.51"), output_cache=self.cache)
+        fill_invoice(TEMPLATE, self.output('engine.pdf'), DATA, engine='reportlab', output_cache=self.cache)
+        self.assertEqual(self.cache.stats()['misses'], 3)
+        self.assertEqual(self.cache.size()[0], 3)
+
+    def test_hit_skips_rendering_and_failures_leave_no_temp_file(self):
+        """Test that a hit never builds a writer, and a failed write cleans up after itself"""
+        fill_invoice(TEMPLATE, self.output('a.pdf'), DATA, output_cache=self.cache)
+        with patch.object(invoice_generator, 'PdfWriter') as writer:
+            self.assertTrue(fill_invoice(TEMPLATE, self.output('b.pdf'), DATA, output_cache=self.cache))
+        writer.assert_not_called()
+
+        with patch.object(invoice_generator.PdfWriter, 'write', side_effect=OSError("disk full")):
+            self.assertFalse(fill_invoice(TEMPLATE, self.output('c.pdf'), dict(DATA, total="$2.00"),
+                                          output_cache=self.cache))
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ['a.pdf', 'b.pdf', 'cache'])
+
+    def test_line_item_iterator_is_rendered_and_cached_whole(self):
+        """Test that line items given as a generator are both hashed and rendered"""
+        from PyPDF2 import PdfReader
+
+        items = [(f"Meter {i}", f"${i}.00") for i in range(30)]
+        self.assertTrue(fill_invoice(TEMPLATE, self.output('a.pdf'), dict(DATA, line_items=(item for item in items)),
+                                     output_cache=self.cache))
+        pages = [page.extract_text() for page in PdfReader(self.output('a.pdf')).pages]
+        self.assertEqual(len(pages), 3)
+        self.assertIn("Meter 29", pages[2])
+
+        # Stored under the key of the full list, so the same items as a list hit it
+        self.assertTrue(fill_invoice(TEMPLATE, self.output('b.pdf'), dict(DATA, line_items=items),
+                                     output_cache=self.cache))
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.read(self.output('b.pdf')), self.read(self.output('a.pdf')))
+
+    def test_rewriting_an_output_leaves_the_cache_alone(self):
+        """Test that rendering over a hard-linked output replaces it instead of writing through the link"""
+        fill_invoice(TEMPLATE, self.output('a.pdf'), DATA, output_cache=self.cache)
+        cached = self.read(self.output('a.pdf'))
+        fill_invoice(TEMPLATE, self.output('a.pdf'), dict(DATA, total="$9.99"), output_cache=self.cache)
+        self.assertNotEqual(self.read(self.output('a.pdf')), cached)
+
+        fill_invoice(TEMPLATE, self.output('b.pdf'), DATA, output_cache=self.cache)
+        self.assertEqual(self.read(self.output('b.pdf')), cached)
+
+    def test_key_covers_template_layout_and_amounts(self):
+        """Test that the key changes with the template hash and layout version, not with amount types"""
+        layout = get_layout()
+        key = self.cache.key("abc", layout, 'direct', DATA)
+        self.assertNotEqual(key, self.cache.key("abd", layout, 'direct', DATA))
+        with patch.object(layout, 'version', layout.version + 'x'):
+            self.assertNotEqual(key, self.cache.key("abc", layout, 'direct', DATA))
+
+        computed = dict(DATA, line_items=[["Monthly Rent", Cents(131250)]], total=Cents(131250))
+        self.assertEqual(key, self.cache.key("abc", layout, 'direct', computed))
+
+    def test_lru_size_cap(self):
+        """Test that the least recently used PDFs are evicted once the cache is over its cap"""
+        cache = OutputCache(self.cache.path, max_bytes=250)
+        for n, name in enumerate(('a', 'b', 'c')):
+            with open(self.output(name), 'wb') as f:
+                f.write(b"x" * 100)
+            cache.store(name * 64, self.output(name))
+            os.utime(cache._entry(name * 64), ns=(n * 10**9, n * 10**9))
+
+        # 'c' pushed the cache over; 'a' was the least recently used
+        self.assertEqual(cache.size(), (2, 200))
+        self.assertFalse(cache.fetch('a' * 64, self.output('out')))
+        self.assertTrue(cache.fetch('b' * 64, self.output('out')))
+
+        with open(self.output('d'), 'wb') as f:
+            f.write(b"x" * 100)
+        cache.store('d' * 64, self.output('d'))
+        # 'b' was just used, so 'c' goes
+        self.assertTrue(cache.fetch('b' * 64, self.output('out')))
+        self.assertFalse(cache.fetch('c' * 64, self.output('out')))
+        self.assertEqual(cache.stats()['bytes'], 200)
+
+    def test_reprint_and_purge(self):
+        """Test that reprinting an unchanged invoice is a cache hit, and purge empties the cache"""
+        data_file = self.output('properties_data.json')
+        with open(data_file, 'w') as f:
+            json.dump({"properties": [dict(DATA, invoice_no=[28])]}, f)
+        common = ['--data-file', data_file, '--db', self.output('none.db'), '--ledger', self.output('ledger.jsonl'),
+                  '--reports', self.output('reports.json'),
+                  '--output-cache', self.cache.path]
+
+        self.assertEqual(main(common + ['generate', 'Hector Garcia', '--date', '10-01-2024',
+                                        '--template', TEMPLATE, '--output-dir', self.tmp.name]), 0)
+        original = self.read(self.output('Invoice 29 - Hector Garcia.pdf'))
+        os.remove(self.output('Invoice 29 - Hector Garcia.pdf'))
+        self.assertEqual(main(common + ['reprint', '--tenant', 'Hector Garcia', '29',
+                                        '--template', TEMPLATE, '--output-dir', self.tmp.name]), 0)
+        self.assertEqual(self.read(self.output('Invoice 29 - Hector Garcia.pdf')), original)
+        self.assertEqual((self.cache.stats()['hits'], self.cache.stats()['misses']), (1, 1))
+        self.assertEqual(main(common + ['reprint', '--tenant', 'Hector Garcia', '30']), 1)
+
+        self.assertEqual(main(common + ['cache', '--purge']), 0)
+        self.assertEqual(self.cache.size(), (0, 0))
+        self.assertEqual(self.cache.stats(), {'hits': 0, 'misses': 0, 'bytes': 0})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from unittest.mock import patch
+from invoice_layout import get_layout
+from invoice_preview import page_strings, preview_data, template_raster
+
+RECORD = {"invoice_no": "29", "date": "09-13-2024", "to_renter": "Hector Garcia",
+          "property_address1": "3175 Seminole Ave", "from_company": "GenInv LLC",
+          "line_items": [["Monthly Rent", "$1,312.50"], ["Water", "$55.50"]], "total": "$1,368.00"}
+
+class TestInvoicePreview(unittest.TestCase):
+    def test_preview_data_leaves_record_alone(self):
+        """Test that the preview stamps the date on a copy"""
+        data = preview_data(RECORD, datetime(2024, 10, 1), rates_file='missing_rates.json')
+        self.assertEqual(data['date'], "10-01-2024")
+        self.assertEqual(RECORD['date'], "09-13-2024")
+
+    def test_page_strings_match_the_layout(self):
+        """Test that the preview draws what fill_invoice draws on the first page"""
+        layout = get_layout()
+        expected = layout.static_strings(RECORD) + layout.dynamic_strings(RECORD, RECORD['line_items'])
+        self.assertEqual(page_strings(RECORD), expected)
+        self.assertIn((layout.amount_x, layout.items_top, "$1,312.50"), page_strings(RECORD))
+
+        long_record = dict(RECORD, line_items=[[f"Item {i}", "$1.00"] for i in range(30)])
+        self.assertIn("Continued on page 2", [text for _, _, text in page_strings(long_record)])
+
+    def test_refresh_is_fast(self):
+        """Test that laying out one preview stays well inside the refresh budget"""
+        start = time.perf_counter()
+        for _ in range(20):
+            page_strings(preview_data(RECORD, datetime(2024, 10, 1), rates_file='missing_rates.json'))
+        self.assertLess((time.perf_counter() - start) / 20, 0.05)
+
+    def test_no_pdf_stack(self):
+        """Test that the preview module doesn't import PyPDF2 or reportlab"""
+        code = ("import sys, invoice_preview; "
+                "print(any(m.startswith(('PyPDF2', 'reportlab')) for m in sys.modules))")
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(result.stdout.strip(), "False")
+
+    def test_template_raster_is_cached(self):
+        """Test that a template's raster is made once and reused"""
+        with tempfile.TemporaryDirectory() as tmp:
+            template = os.path.join(tmp, 'template.pdf')
+            with open(template, 'wb') as f:
+                f.write(b"%PDF-1.4 not really")
+
+            with patch('invoice_preview.shutil.which', return_value=None):
+                self.assertIsNone(template_raster(template, 32, tmp))
+
+            def fake_rasterizer(command, **kwargs):
+                # pdftoppm's last argument is the output prefix
+                with open(command[-1] + '.png', 'wb') as f:
+                    f.write(b"png")
+
+            with patch('invoice_preview.shutil.which', side_effect=lambda name: name if name == 'pdftoppm' else None), \
+                 patch('invoice_preview.subprocess.run', side_effect=fake_rasterizer) as run:
+                raster = template_raster(template, 32, tmp)
+                self.assertTrue(os.path.exists(raster))
+                self.assertEqual(template_raster(template, 32, tmp), raster)
+                self.assertEqual(run.call_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+import io
+import os
+import csv
+import json
+import tempfile
+from invoice_data import parse_cents, format_cents
+from invoice_ledger import InvoiceLedger, ledger_record
+from invoice_reports import InvoiceReports, open_reports
+
+class TestInvoiceReports(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.ledger = InvoiceLedger(os.path.join(self.tmp.name, 'invoice_ledger.jsonl'))
+        self.reports_file = os.path.join(self.tmp.name, 'invoice_reports.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def append(self, invoice_no, billing_date, total, tenant="Hector Garcia", prop="3175 Seminole Ave"):
+        self.ledger.append(ledger_record({"invoice_no": str(invoice_no), "date": billing_date, "to_renter": tenant,
+                                          "property_address1": prop, "total": total}))
+
+    def test_cents(self):
+        """Test parsing and formatting stored amounts as integer cents"""
+        self.assertEqual(parse_cents("$1,368.00"), 136800)
+        self.assertEqual(parse_cents("$0.10"), 10)
+        self.assertEqual(parse_cents("-$5.25"), -525)
+        self.assertEqual(parse_cents("($5.25)"), -525)
+        self.assertEqual(parse_cents(""), 0)
+        self.assertEqual(format_cents(136800), "$1,368.00")
+        self.assertEqual(format_cents(-525), "-$5.25")
+        with self.assertRaises(ValueError):
+            parse_cents("twelve")
+
+    def test_rollups(self):
+        """Test totals per property per month, per tenant per year, and outstanding counts"""
+        self.append(28, "09-01-2024", "$1,000.00")
+        self.append(29, "10-01-2024", "$1,100.00")
+        self.append(40, "10-01-2024", "$900.00", tenant="Maria Mercedes")
+        self.append(30, "01-01-2025", "$1,100.00")
+
+        reports = open_reports(self.ledger, self.reports_file)
+        self.assertEqual(reports.property_months("3175 Seminole Ave"), [
+            ("3175 Seminole Ave", "2024-09", 1, 100000),
+            ("3175 Seminole Ave", "2024-10", 2, 200000),
+            ("3175 Seminole Ave", "2025-01", 1, 110000),
+        ])
+        self.assertEqual(reports.tenant_years("Hector Garcia"), [
+            ("Hector Garcia", "2024", 2, 210000),
+            ("Hector Garcia", "2025", 1, 110000),
+        ])
+        self.assertEqual(reports.outstanding_count(), 4)
+
+        # Invoice numbers are per tenant: Maria has no invoice 29
+        self.assertFalse(reports.mark_paid("Maria Mercedes", 29))
+        self.assertTrue(reports.mark_paid("Hector Garcia", 29))
+        self.assertFalse(reports.mark_paid("Hector Garcia", 29))
+        self.assertEqual(reports.outstanding_by_tenant(), [
+            ("Hector Garcia", 2, 210000),
+            ("Maria Mercedes", 1, 90000),
+        ])
+
+    def test_snapshot_replays_only_new_records(self):
+        """Test that reopening resumes from the snapshot and keeps payments"""
+        self.append(28, "09-01-2024", "$1,000.00")
+        reports = open_reports(self.ledger, self.reports_file)
+        reports.mark_paid("Hector Garcia", 28)
+        reports.save()
+
+        self.append(29, "10-01-2024", "$1,100.00")
+        reopened = InvoiceReports(self.reports_file)
+        self.assertTrue(reopened.load())
+        self.assertEqual(reopened.sync(self.ledger), 1)
+        self.assertEqual(reopened.outstanding_count("Hector Garcia"), 1)
+        self.assertEqual(len(reopened.property_months()), 2)
+
+        # A replaced ledger is replayed from the start, payments included
+        os.remove(self.ledger.path)
+        self.append(28, "09-01-2024", "$1,000.00")
+        self.assertEqual(reopened.sync(self.ledger), 1)
+        self.assertEqual(reopened.outstanding_count(), 0)
+
+    def test_follows_ledger_appends(self):
+        """Test that reports opened on a ledger count new invoices as they are appended"""
+        self.append(28, "09-01-2024", "$1,000.00")
+        reports = open_reports(self.ledger, self.reports_file)
+        self.append(29, "10-01-2024", "$1,100.00")
+        self.assertEqual(reports.outstanding_by_tenant(), [("Hector Garcia", 2, 210000)])
+        self.assertEqual(reports.ledger_offset, os.path.getsize(self.ledger.path))
+
+        # Records another process appended are picked up with the next one of ours
+        InvoiceLedger(self.ledger.path).append(ledger_record({
+            "invoice_no": "40", "date": "10-01-2024", "to_renter": "Maria Mercedes",
+            "property_address1": "3306 Seminole Ave", "total": "$900.00"}))
+        self.append(30, "11-01-2024", "$1,100.00")
+        self.assertEqual(reports.outstanding_count(), 4)
+        self.assertEqual(reports.sync(self.ledger), 0)
+
+        self.assertTrue(reports.mark_paid("Maria Mercedes", 40))
+        self.assertEqual(reports.outstanding_by_tenant(), [("Hector Garcia", 3, 320000)])
+
+    def test_snapshot_stays_small_with_unpaid_history(self):
+        """Test that years of unpaid invoices are kept as ranges, not one entry each"""
+        for n in range(1, 601):
+            self.append(n, f"{n % 12 + 1:02d}-01-{2000 + n // 12}", "$1,000.00")
+        reports = open_reports(self.ledger, self.reports_file)
+        self.assertTrue(reports.mark_paid("Hector Garcia", 300))
+        reports.save()
+
+        with open(self.reports_file) as f:
+            snapshot = json.load(f)
+        self.assertEqual(snapshot['issued'], {"Hector Garcia": {"ranges": [[1, 600]], "high_water": 600}})
+        self.assertEqual(snapshot['outstanding'], {"Hector Garcia": [599, 59900000]})
+        reopened = InvoiceReports(self.reports_file)
+        self.assertTrue(reopened.load())
+        self.assertTrue(reopened.is_open("Hector Garcia", 299))
+        self.assertFalse(reopened.is_open("Hector Garcia", 300))
+
+    def test_export_csv(self):
+        """Test the streaming CSV export"""
+        self.append(28, "09-01-2024", "$1,000.00")
+        self.append(29, "10-01-2024", "$1,100.50")
+        reports = open_reports(self.ledger, self.reports_file)
+        reports.mark_paid("Hector Garcia", 28)
+
+        out = io.StringIO()
+        self.assertEqual(reports.export_csv(self.ledger, out), 2)
+        rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+        self.assertEqual([(r['invoice_no'], r['total_cents'], r['total'], r['paid']) for r in rows],
+                         [("28", "100000", "$1,000.00", "True"), ("29", "110050", "$1,100.50", "False")])
+
+if __name__ == '__main__':
+    unittest.main()
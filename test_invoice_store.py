@@ -0,0 +1,73 @@
+import unittest
+import os
+import json
+import tempfile
+from datetime import datetime
+from invoice_store import SqliteStore, JsonStore
+
+class TestSqliteStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.tmp.name, 'properties_data.json')
+        with open(self.data_file, 'w') as f:
+            json.dump({"properties": [
+                {"date": "09-13-2024", "invoice_no": [27, 28], "to_renter": "Hector Garcia",
+                 "property_address1": "3175 Seminole Ave", "from_company": "GenInv LLC", "total": "$1,368.00",
+                 "line_items": [["Monthly Rent", "$1,312.50"]]},
+                {"date": "08-01-2024", "invoice_no": [40], "to_renter": "Maria Mercedes, Unit B",
+                 "property_address1": "3306 Seminole Ave", "total": "$900.00",
+                 "line_items": [["Monthly Rent", "$900.00"]]}
+            ]}, f)
+        self.store = SqliteStore(os.path.join(self.tmp.name, 'properties_data.db'))
+        self.store.import_json(self.data_file)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_import_matches_json_history(self):
+        """Test that the imported history matches what the JSON store reports"""
+        self.assertEqual(self.store.history(), JsonStore(self.data_file).history())
+        with self.assertRaises(ValueError):
+            self.store.import_json(self.data_file)
+
+    def test_next_invoices_allocates_nothing(self):
+        """Test that both stores report the same upcoming numbers without allocating them"""
+        upcoming = self.store.next_invoices()
+        self.assertEqual(upcoming["Hector Garcia"]['invoice_no'], "29")
+        self.assertEqual(upcoming["Maria Mercedes"]['property_address1'], "3306 Seminole Ave")
+        json_upcoming = JsonStore(self.data_file).next_invoices()
+        self.assertEqual({t: r['invoice_no'] for t, r in json_upcoming.items()},
+                         {t: r['invoice_no'] for t, r in upcoming.items()})
+        self.assertEqual(self.store.next_invoice_number("Hector Garcia"), 29)
+
+    def test_issued_numbers_match_json(self):
+        """Test that both stores report the same issued numbers, including new allocations"""
+        issued = self.store.issued_numbers()
+        self.assertEqual({t: list(n) for t, n in issued.items()},
+                         {t: list(n) for t, n in JsonStore(self.data_file).issued_numbers().items()})
+        self.store.allocate_one("Hector Garcia", datetime(2024, 10, 1))
+        self.assertEqual(list(self.store.issued_numbers()["Hector Garcia"]), [27, 28, 29])
+
+    def test_allocate_one(self):
+        """Test allocating an invoice for a tenant"""
+        invoice_data = self.store.allocate_one("Hector Garcia", datetime(2024, 10, 1))
+        self.assertEqual(invoice_data['invoice_no'], "29")
+        self.assertEqual(invoice_data['date'], "10-01-2024")
+        self.assertEqual(invoice_data['from_company'], "GenInv LLC")
+        self.assertEqual(invoice_data['line_items'], [["Monthly Rent", "$1,312.50"]])
+
+        self.assertEqual(self.store.next_invoice_number("Hector Garcia"), 30)
+        self.assertEqual(self.store.latest_invoice_number("3175 Seminole Ave, SouthGate Property"), 29)
+        self.assertEqual(self.store.history()[0]['invoice_no'], 29)
+        self.assertIsNone(self.store.allocate_one("Nobody", datetime(2024, 10, 1)))
+
+    def test_allocate_batch(self):
+        """Test allocating invoices for a filtered set of properties in one transaction"""
+        jobs = self.store.allocate(datetime(2024, 10, 1), properties=["3306 Seminole Ave, Lynwood Property"])
+        self.assertEqual([job['invoice_no'] for job in jobs], ["41"])
+        jobs = self.store.allocate(datetime(2024, 11, 1))
+        self.assertEqual([job['invoice_no'] for job in jobs], ["29", "42"])
+
+if __name__ == '__main__':
+    unittest.main()
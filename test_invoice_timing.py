@@ -0,0 +1,84 @@
+import unittest
+import os
+import tempfile
+import invoice_timing
+from invoice_timing import span, record, report, reset, enable, is_enabled
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Invoice Master.pdf')
+
+class TestInvoiceTiming(unittest.TestCase):
+    def setUp(self):
+        self.was_enabled = is_enabled()
+        reset()
+
+    def tearDown(self):
+        enable(self.was_enabled)
+        reset()
+
+    def test_disabled_records_nothing(self):
+        """Test that spans and records are no-ops while timing is off"""
+        enable(False)
+        with span('pdf_write'):
+            pass
+        record('pdf_write', 0.5)
+        self.assertIs(span('a'), span('b'))
+        self.assertEqual(report(), {})
+
+    def test_enabled_span_and_record(self):
+        """Test that spans time their block and records add to the same aggregate"""
+        enable()
+        with span('pdf_write'):
+            pass
+        record('pdf_write', 0.25)
+        stats = report()['pdf_write']
+        self.assertEqual(stats['count'], 2)
+        self.assertGreaterEqual(stats['total'], 0.25)
+        self.assertEqual(stats['max'], 0.25)
+        self.assertLess(stats['min'], 0.25)
+
+    def test_report_aggregates(self):
+        """Test counters and percentiles per span"""
+        enable()
+        for ms in range(1, 101):
+            record('overlay_render', ms / 1000)
+        record('template_read', 2.0)
+
+        stats = report()
+        self.assertEqual(sorted(stats), ['overlay_render', 'template_read'])
+        overlay = stats['overlay_render']
+        self.assertEqual(overlay['count'], 100)
+        self.assertAlmostEqual(overlay['total'], 5.05)
+        self.assertAlmostEqual(overlay['mean'], 0.0505)
+        self.assertEqual((overlay['min'], overlay['max']), (0.001, 0.1))
+        self.assertEqual((overlay['p50'], overlay['p90'], overlay['p99']), (0.051, 0.09, 0.099))
+        self.assertEqual(stats['template_read']['p99'], 2.0)
+
+    def test_long_runs_keep_a_bounded_sample(self):
+        """Test that a span keeps exact counters but only a fixed-size sample"""
+        enable()
+        count = invoice_timing.RESERVOIR_SIZE * 20
+        for n in range(count):
+            record('page_merge', n / count)
+
+        self.assertEqual(len(invoice_timing._spans['page_merge'].sample), invoice_timing.RESERVOIR_SIZE)
+        stats = report()['page_merge']
+        self.assertEqual(stats['count'], count)
+        self.assertEqual((stats['min'], stats['max']), (0, (count - 1) / count))
+        self.assertAlmostEqual(stats['p50'], 0.5, delta=0.05)
+        self.assertAlmostEqual(stats['p90'], 0.9, delta=0.05)
+
+    def test_fill_invoice_stages(self):
+        """Test that a reportlab render times drawing and re-parsing the overlay as separate stages"""
+        from invoice_generator import fill_invoice
+
+        enable()
+        with tempfile.TemporaryDirectory() as tmp:
+            data = {"invoice_no": "29", "date": "10-01-2024", "to_renter": "Hector Garcia",
+                    "line_items": [["Monthly Rent", "$1,312.50"]], "total": "$1,312.50"}
+            self.assertTrue(fill_invoice(TEMPLATE, os.path.join(tmp, 'a.pdf'), data, engine='reportlab'))
+        stats = report()
+        for stage in ('overlay_render', 'overlay_parse', 'page_merge', 'pdf_write'):
+            self.assertEqual(stats[stage]['count'], 1, stage)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import threading
+from invoice_worker import JobQueue
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.jobs = JobQueue()
+
+    def tearDown(self):
+        self.jobs.shutdown()
+
+    def drain(self):
+        """Wait for everything in flight and return the queued events"""
+        self.jobs.wait(timeout=10)
+        return self.jobs.poll()
+
+    def test_submit_and_poll(self):
+        """Test that results and posted events are delivered through poll"""
+        def job(x):
+            self.jobs.post('progress', x)
+            return x * 2
+
+        self.assertTrue(self.jobs.submit("Hector Garcia", job, 21))
+        events = self.drain()
+        self.assertEqual(events[0], ('progress', 21))
+        self.assertEqual(events[1][:2], ('done', "Hector Garcia"))
+        self.assertEqual(events[1][2].result(), 42)
+        self.assertFalse(self.jobs.busy("Hector Garcia"))
+        self.assertEqual(self.jobs.poll(), [])
+
+    def test_one_job_per_key(self):
+        """Test that a key can't be submitted again until its done event is polled"""
+        release = threading.Event()
+        self.assertTrue(self.jobs.submit("batch", release.wait))
+        self.assertFalse(self.jobs.submit("batch", release.wait))
+        self.assertFalse(self.jobs.submit_background("batch", release.wait))
+        self.assertTrue(self.jobs.busy("batch"))
+        release.set()
+        self.drain()
+        self.assertFalse(self.jobs.busy("batch"))
+        self.assertTrue(self.jobs.submit("batch", lambda: None))
+
+    def test_errors_come_back_with_the_result(self):
+        """Test that an exception in a job is raised from its future, not lost"""
+        def fail():
+            raise ValueError("bad template")
+
+        self.jobs.submit("Hector Garcia", fail)
+        (_, key, future), = self.drain()
+        self.assertEqual(key, "Hector Garcia")
+        with self.assertRaisesRegex(ValueError, "bad template"):
+            future.result()
+
+    def test_generation_doesnt_wait_behind_background_jobs(self):
+        """Test that generation runs while every background worker is busy"""
+        release = threading.Event()
+        for n in range(4):
+            self.jobs.submit_background(("raster", n), release.wait, 10)
+        try:
+            self.assertTrue(self.jobs.submit("Hector Garcia", threading.current_thread))
+            future = self.jobs._in_flight["Hector Garcia"]
+            self.assertTrue(future.result(timeout=5).name.startswith('geninv_'))
+        finally:
+            release.set()
+        self.drain()
+
+    def test_shutdown_waits_for_jobs(self):
+        """Test that shutdown lets running jobs finish"""
+        finished = []
+        release = threading.Event()
+        self.jobs.submit("batch", lambda: finished.append(release.wait(10)))
+        self.jobs.submit_background("history", lambda: finished.append(True))
+        release.set()
+        self.jobs.shutdown()
+        self.assertEqual(finished.count(True), 2)
+        self.assertEqual(len(self.jobs.poll()), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+import os
+import tempfile
+from tenant_index import TenantIndex
+
+class TestTenantIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tenants_path = os.path.join(self.tmp.name, "3175 Seminole Ave", "tenants")
+        os.makedirs(os.path.join(self.tenants_path, "Hector Garcia"))
+        # Plain files are not tenants
+        open(os.path.join(self.tenants_path, "notes.txt"), 'w').close()
+        self.index = TenantIndex(self.tmp.name, ["3175 Seminole Ave", "Missing Property"])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_lookup_and_missing_folder(self):
+        """Test tenant lookup and a property without a tenants folder"""
+        self.assertEqual(self.index.tenants("3175 Seminole Ave"), ["Hector Garcia"])
+        self.assertIsNone(self.index.tenants("Missing Property"))
+
+    def test_revalidate_on_mtime_change(self):
+        """Test that cached results are served until the folder's mtime changes"""
+        self.index.tenants("3175 Seminole Ave")
+        os.makedirs(os.path.join(self.tenants_path, "Maria Mercedes"))
+        stat = os.stat(self.tenants_path)
+        os.utime(self.tenants_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        # Still served from the cache until revalidated
+        self.assertEqual(self.index.tenants("3175 Seminole Ave"), ["Hector Garcia"])
+        self.index.revalidate("3175 Seminole Ave")
+        self.assertEqual(sorted(self.index.tenants("3175 Seminole Ave")), ["Hector Garcia", "Maria Mercedes"])
+
+if __name__ == '__main__':
+    unittest.main()